@@ -0,0 +1,158 @@
+"""Run PBA tools on one or more logfiles without any prompts.
+
+Example:
+    python batch.py logs/cs10a.csv logs/cs10b.csv --labs all --tools roster anomaly incdev
+
+Each logfile's output is written to its own folder, e.g. `output/cs10a/roster.csv`.
+"""
+
+import argparse
+import contextlib
+import os
+
+import tools.utilities as util
+from tools.runner import INTERACTIVE_TOOLS, TOOLS, ToolContext, run_tool
+
+BATCH_TOOLS = [name for name in TOOLS if name not in INTERACTIVE_TOOLS]
+# The tools shown in the interactive menu. The cpplint style checker needs cpplint installed.
+DEFAULT_TOOLS = ['quick_analysis', 'roster', 'anomaly', 'auto_anomaly', 'incdev', 'hardcoding']
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parses command-line arguments for a batch run."""
+    parser = argparse.ArgumentParser(description='Run PBA tools on zyBooks logfiles without prompts.')
+    parser.add_argument('logfiles', nargs='+', help='Paths to zyBooks logfiles (.csv)')
+    parser.add_argument(
+        '--labs',
+        nargs='+',
+        default=['all'],
+        help="Lab IDs (e.g. 3.12) or captions (e.g. 'Mad Lib') to evaluate, or 'all'. Default: all",
+    )
+    parser.add_argument(
+        '--tools',
+        nargs='+',
+        choices=BATCH_TOOLS,
+        default=DEFAULT_TOOLS,
+        help=f'Tools to run, in order. Default: {" ".join(DEFAULT_TOOLS)}',
+    )
+    parser.add_argument('--output', default='output', help="Folder for output files. Default: 'output'")
+    parser.add_argument(
+        '--max-downloads',
+        type=int,
+        help='Most code downloads in flight at once. PBA backs off below this if the server throttles. Default: 64',
+    )
+    parser.add_argument(
+        '--cache-size',
+        help='Evict the least recently used code once the download cache is bigger than this, e.g. 500M or 2G',
+    )
+    parser.add_argument('--compress-cache', action='store_true', help='Compress newly downloaded code in the cache')
+    parser.add_argument(
+        '--telemetry',
+        metavar='PATH',
+        help="Where to write the run's download telemetry as JSON. Default: downloads/telemetry.json",
+    )
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Analyze each student on a process pool as soon as their code downloads (anomaly, auto_anomaly, '
+        'incdev and hardcoding), instead of after the whole class downloads',
+    )
+    parser.add_argument('--processes', type=int, help='Worker processes for --pipeline. Default: one per CPU')
+    parser.add_argument(
+        '--code-from',
+        metavar='SOURCE',
+        help='A folder or .zip archive of submission zips (e.g. a bulk export) to read code from before downloading',
+    )
+    return parser.parse_args(argv)
+
+
+def run_logfile(
+    logfile_path: str,
+    labs: list[str],
+    tool_names: list[str],
+    output_dir: str,
+    downloader,
+    pipeline: bool = False,
+    num_processes: int | None = None,
+    code_from: str | None = None,
+    executor=None,
+) -> None:
+    """Runs each tool on a logfile and writes each tool's output to `output_dir`.
+
+    Args:
+        logfile_path (str): The path to a zyBooks logfile.
+        labs (list[str]): Lab IDs or captions to evaluate, or ['all'].
+        tool_names (list[str]): Names of tools in `TOOLS` to run.
+        output_dir (str): The folder to write output files to.
+        downloader (Downloader): The downloader shared by every logfile in the run.
+        pipeline (bool): Analyze each student's code on a process pool as it downloads. See `Pipeline`.
+        num_processes (int | None): Worker processes for the pipeline. Defaults to the number of CPUs.
+        code_from (str | None): A folder or archive of submission zips to fill the code store from. See `ingest`.
+        executor (ProcessPoolExecutor | None): The pipeline's process pool, created before any threads started.
+    """
+    import tools.loader as loader
+    from tools.catalog import LabCatalog
+    from tools.prefetch import Prefetcher
+
+    os.makedirs(output_dir, exist_ok=True)
+    logfile = loader.read_logfile(logfile_path)
+    if code_from:
+        from tools.ingest import ingest
+
+        print(f'Ingested {code_from}: {ingest(logfile.zip_location, code_from, downloader.store)}')
+    catalog = LabCatalog(logfile[logfile.role == 'Student'])  # Filter by students only
+    selected_labs = util.resolve_lab_selection(catalog, labs)
+
+    solution_url = util.get_solution_url(logfile)
+    # Code for later tools downloads in the background while earlier tools run
+    prefetcher = Prefetcher(downloader)
+    try:
+        context = ToolContext(logfile_path, catalog, selected_labs, solution_url, downloader, output_dir, prefetcher)
+        context.prefetch(tool_names)
+        if pipeline:
+            context.run_pipeline(tool_names, num_processes, executor)
+        for name in tool_names:
+            tool_result = {}
+            output_file_name = run_tool(name, context, tool_result)
+            if len(tool_result) != 0:
+                util.write_output_to_csv(tool_result, output_file_name, output_dir)
+            print(f'Done! Wrote {name} output to {output_dir}/{output_file_name}')
+    finally:
+        prefetcher.stop(wait=True)
+
+
+def main(argv: list[str] | None = None) -> None:
+    from tools.codestore import parse_size
+    from tools.downloader import Downloader
+    from tools.pipeline import create_executor
+
+    args = parse_args(argv)
+    downloader_options = {'compress_cache': args.compress_cache}
+    if args.max_downloads:
+        downloader_options['max_workers'] = args.max_downloads
+    if args.cache_size:
+        downloader_options['max_cache_bytes'] = parse_size(args.cache_size)
+    if args.telemetry:
+        downloader_options['telemetry_path'] = args.telemetry
+    # The pipeline's process pool starts before the downloader's and prefetcher's threads. See `create_executor`.
+    executor = create_executor(args.processes) if args.pipeline else None
+    with executor or contextlib.nullcontext(), Downloader(**downloader_options) as downloader:
+        for logfile_path in args.logfiles:
+            logfile_name = os.path.splitext(os.path.basename(logfile_path))[0]
+            print(f'\nLogfile: {logfile_path}')
+            output_dir = os.path.join(args.output, logfile_name)
+            run_logfile(
+                logfile_path,
+                args.labs,
+                args.tools,
+                output_dir,
+                downloader,
+                args.pipeline,
+                args.processes,
+                args.code_from,
+                executor,
+            )
+
+
+if __name__ == '__main__':
+    main()
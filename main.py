@@ -1,20 +1,30 @@
-from tkinter import filedialog
-
-import pandas as pd
-
-import tools.devtools.eval_hardcoding
-import tools.hardcoding
 import tools.utilities as util
-from tools.anomaly import anomaly
-from tools.auto_anomaly import auto_anomaly
-from tools.incdev import run
-from tools.quickanalysis import quick_analysis
-from tools.roster import roster
-from tools.stylechecker import stylechecker
+from tools.runner import ALL_CODE, TOOL_NEEDS, ToolContext, run_tool
+
+# Menu option number -> tool name. Options 8 and 9 are dev tools, not shown in the menu.
+MENU_TOOLS = {
+    1: 'quick_analysis',
+    2: 'roster',
+    3: 'anomaly',
+    4: 'auto_anomaly',
+    5: 'incdev',
+    6: 'hardcoding',
+    8: 'hardcoding_test',
+    9: 'stylechecker',
+}
+QUIT_OPTION = 7
+# The most highest-scoring runs to download before the user has chosen labs and tools
+MAX_SPECULATIVE_DOWNLOADS = 1000
 
 
 def main():
-    logger = util.setup_logger(__name__)  # DEBUGGING
+    # tkinter and pandas are only imported once PBA starts, not when main.py is imported
+    from tkinter import filedialog
+
+    import tools.loader as loader
+    from tools.catalog import LabCatalog
+    from tools.downloader import Downloader
+    from tools.prefetch import NORMAL, Prefetcher
 
     # Read logfile into a Pandas DataFrame
     logfile_path = filedialog.askopenfilename(filetypes=[('CSV files', '*.csv')])
@@ -22,251 +32,64 @@ def main():
         print('No file selected. Goodbye!')
         exit(0)
 
-    logfile = pd.read_csv(logfile_path)
-    logfile = util.standardize_columns(logfile)
-    solution_code = util.download_solution(logfile)
-    selected_labs = util.get_selected_labs(logfile)
-    logfile = logfile[logfile.role == 'Student']  # Filter by students only
-
-    submissions = {}
-    tool_result = {}
-    output_file_name = 'roster.csv'
-    menu_options = [
-        'Quick Analysis (averages for all labs)',
-        'Basic Statistics (roster for selected labs)',
-        'Style Anomalies (selected labs)',
-        'Automatic Anomaly Detection (selected labs)',
-        'Incremental Development Trails (all labs)',
-        'Hardcoding Detection (selected labs)',
-        'Quit',
-    ]
-
-    while True:
-        tool_result = {}
-        util.print_menu(menu_options, selected_labs)
-        input_list = util.get_list_of_int_choices(min=1, max=len(menu_options))
-
-        for i in input_list:
-            if i != 7 and submissions == {}:
-                logfile_with_code = util.download_code(logfile)
-                submissions = util.create_data_structure(logfile_with_code)
-
-            # Quick analysis for every lab
-            if i == 1:
-                output_file_name = 'quick_analysis.csv'
-                quick_analysis(logfile_with_code)  # TODO: this should return something
-
-            # Roster for selected labs
-            elif i == 2:
-                output_file_name = 'roster.csv'
-                tool_result = roster(logfile_with_code, selected_labs)
-
-            # Anomalies for selected labs
-            elif i == 3:
-                output_file_name = 'anomalies.csv'
-                anomaly_detection_output = anomaly(submissions, selected_labs)
-                for user_id in anomaly_detection_output:
-                    for lab in anomaly_detection_output[user_id]:
-                        anomalies_found = anomaly_detection_output[user_id][lab][0]
-                        anomaly_score = anomaly_detection_output[user_id][lab][1]
-                        if user_id in tool_result:
-                            tool_result[user_id][f'Lab {lab} anomalies found'] = anomalies_found
-                            tool_result[user_id][f'Lab {lab} anomaly score'] = anomaly_score
-                            tool_result[user_id][f'{lab} Student code'] = anomaly_detection_output[user_id][lab][2]
-                        else:
-                            tool_result[user_id] = {
-                                'User ID': user_id,
-                                'Last Name': submissions[user_id][lab][0].last_name[0],
-                                'First Name': submissions[user_id][lab][0].first_name[0],
-                                'Email': submissions[user_id][lab][0].email[0],
-                                'Role': 'Student',
-                                'Lab ' + str(lab) + ' anomalies found': anomalies_found,
-                                'Lab ' + str(lab) + ' anomaly score': anomaly_score,
-                                str(lab) + ' Student code': anomaly_detection_output[user_id][lab][2],
-                            }
-
-            # TODO: Clean this up, move to a module
-            # Automatic anomaly detection for selected labs
-            elif i == 4:
-                output_file_name = 'auto_anomaly.csv'
-                tool_result = {}  # TODO: reset roster, fix later
-                # Count of anomaly instances per-user, per-lab, per-anomaly, @ index 0
-                anomaly_detection_output = auto_anomaly(submissions, selected_labs)
-
-                # Populate anomaly counts for every user, for each lab
-                for user_id in anomaly_detection_output:
-                    if user_id not in tool_result:
-                        tool_result[user_id] = {'User ID': user_id}  # Populate column of user IDs
-                    for lab in anomaly_detection_output[user_id]:
-                        # Instance count of every anomaly for [user_id][lab]
-                        anomalies_found = anomaly_detection_output[user_id][lab][0]
-                        # Create a column for each anomaly with the anomaly's count
-                        for found_anomaly in anomalies_found:
-                            tool_result[user_id][f'Lab {str(lab)} {found_anomaly}'] = anomalies_found[found_anomaly]
-
-                # Count of users that use each anomaly, per-lab
-                num_users_per_anomaly = {}
-                for found_anomaly in anomalies_found:
-                    num_users_per_anomaly[found_anomaly] = {}
-
-                # Count the *number of students* that used each anomaly, per-lab
-                for user_id in tool_result:
-                    for lab in anomaly_detection_output[user_id]:
-                        for found_anomaly in num_users_per_anomaly:
-                            # Need to consider anomalies from every lab
-                            if lab not in num_users_per_anomaly[found_anomaly]:
-                                num_users_per_anomaly[found_anomaly][lab] = 0
-                            anomaly_count = tool_result[user_id][f'Lab {str(lab)} {found_anomaly}']
-                            if anomaly_count > 0:
-                                num_users_per_anomaly[found_anomaly][lab] += 1
-
-                # Append a row at bottom for "totals"
-                tool_result['Status'] = {}
-                tool_result['Status']['User ID'] = 'Is Anomaly?'
-                for found_anomaly in num_users_per_anomaly:
-                    for lab in num_users_per_anomaly[found_anomaly]:
-                        anomaly_count = num_users_per_anomaly[found_anomaly][lab]
-                        total_users = len(submissions)
-                        # If a clear majority uses an "anomaly", it's not anomalous
-                        if anomaly_count / total_users >= 0.8:
-                            tool_result['Status'][f'Lab {str(lab)} {found_anomaly}'] = 'No'
-                        else:
-                            tool_result['Status'][f'Lab {str(lab)} {found_anomaly}'] = 'Yes'
-
-                # Outputs to its own file for now
-                util.write_output_to_csv(tool_result, 'anomaly_counts.csv')
-
-            # Inc. development coding trails for all labs
-            elif i == 5:
-                output_file_name = 'incdev.csv'
-                # Generate nested dict of IncDev results
-                incdev_output = run(submissions)
-                for user_id in incdev_output:
-                    for lab_id in incdev_output[user_id]:
-                        lid = str(lab_id)
-                        score = incdev_output[user_id][lab_id]['incdev_score']
-                        score_trail = incdev_output[user_id][lab_id]['incdev_score_trail']
-                        loc_trail = incdev_output[user_id][lab_id]['loc_trail']
-                        time_trail = incdev_output[user_id][lab_id]['time_trail']
-                        code = incdev_output[user_id][lab_id]['Highest_code']
-                        if user_id in tool_result:
-                            tool_result[user_id][lid + ' incdev_score'] = score
-                            tool_result[user_id][lid + ' incdev_score_trail'] = score_trail
-                            tool_result[user_id][lid + ' loc_trail'] = loc_trail
-                            tool_result[user_id][lid + ' time_trail'] = time_trail
-                            tool_result[user_id][str(lid) + ' Student code'] = code
-                        else:
-                            tool_result[user_id] = {
-                                'User ID': user_id,
-                                'Last Name': submissions[user_id][lab_id][0].last_name[0],
-                                'First Name': submissions[user_id][lab_id][0].first_name[0],
-                                'Email': submissions[user_id][lab_id][0].email[0],
-                                'Role': 'Student',
-                                lid + ' incdev_score': score,
-                                lid + ' incdev_score_trail': score_trail,
-                                lid + ' loc_trail': loc_trail,
-                                lid + ' time_trail': time_trail,
-                                str(lab_id) + ' Student code': code,
-                            }
+    # Timestamps are parsed and code is downloaded in the background while the user chooses labs and tools
+    logfile = loader.read_logfile(logfile_path, parse_dates=False)
+    downloader = Downloader()
+    prefetcher = Prefetcher(downloader)
+    try:
+        solution_url = util.get_solution_url(logfile)
+        catalog = LabCatalog(logfile[logfile.role == 'Student'])  # Filter by students only
 
-            # Hardcode detection for selected labs
-            elif i == 6:
-                output_file_name = 'hardcoding.csv'
+        def prefetch_max_score_code(timestamps) -> None:
+            # Most tools read the highest-scoring code. Ordered by time, since equal scores go to the oldest run.
+            runs = util.max_score_runs(catalog.logfile.assign(date_submitted=timestamps), list(catalog))
+            prefetcher.download(runs['zip_location'].head(MAX_SPECULATIVE_DOWNLOADS), NORMAL)
 
-                # Dictionary of testcases, e.g. `lab_id : [('in1', 'out1'), ('in2', 'out2')]`
-                testcases = util.get_testcases(logfile_with_code, selected_labs)
+        prefetcher.parse_timestamps(logfile['date_submitted'], then=prefetch_max_score_code)
+        selected_labs = util.get_selected_labs(catalog)
 
-                try:
-                    if testcases and solution_code:
-                        print('Case 1: testcases and solution')
-                        hardcoding_results = tools.hardcoding.hardcoding_analysis_1(
-                            submissions, selected_labs, testcases, solution_code
-                        )
-                    elif testcases and not solution_code:
-                        print('Case 2: testcases, no solution')
-                        hardcoding_results = tools.hardcoding.hardcoding_analysis_2(
-                            submissions, selected_labs, testcases
-                        )
-                    elif not testcases and not solution_code:
-                        print('Case 3: no testcases or solution')
-                        hardcoding_results = tools.hardcoding.hardcoding_analysis_3(submissions, selected_labs)
+        context = ToolContext(logfile_path, catalog, selected_labs, solution_url, downloader, prefetcher=prefetcher)
+        # The selected labs' highest-scoring code. Every run's code is only queued once a tool that reads it is chosen.
+        context.prefetch(name for name in MENU_TOOLS.values() if ALL_CODE not in TOOL_NEEDS[name])
+        tool_result = {}
+        output_file_name = 'roster.csv'
+        menu_options = [
+            'Quick Analysis (averages for all labs)',
+            'Basic Statistics (roster for selected labs)',
+            'Style Anomalies (selected labs)',
+            'Automatic Anomaly Detection (selected labs)',
+            'Incremental Development Trails (all labs)',
+            'Hardcoding Detection (selected labs)',
+            'Quit',
+        ]
+
+        while True:
+            tool_result = {}
+            util.print_menu(menu_options, selected_labs)
+            input_list = util.get_list_of_int_choices(min=1, max=len(menu_options))
+            # Code for later tools downloads in the background while earlier tools run
+            context.prefetch(MENU_TOOLS[i] for i in input_list if i in MENU_TOOLS)
+
+            for i in input_list:
+                if i == QUIT_OPTION:
+                    print('\nGoodbye!')
+                    exit(0)
+                elif i in MENU_TOOLS:
+                    file_name = run_tool(MENU_TOOLS[i], context, tool_result)
+                    if MENU_TOOLS[i] == 'quick_analysis':  # Writes its own file, apart from the other tools' rows
+                        print(f'\nDone! Wrote output to output/{file_name}')
                     else:
-                        raise Exception('Unexpected input during hardcode analysis')
-                except Exception as e:
-                    logger.error(f'Error: {e}')
-                    exit(1)
-
-                for user_id in hardcoding_results:
-                    for lab in hardcoding_results[user_id]:
-                        hardcoding_score = hardcoding_results[user_id][lab][0]
-                        student_code = hardcoding_results[user_id][lab][1]
-                        if user_id in tool_result:
-                            tool_result[user_id]['Lab ' + str(lab) + ' hardcoding score'] = hardcoding_score
-                            tool_result[user_id][str(lab) + ' Student code'] = student_code
-                        else:
-                            tool_result[user_id] = {
-                                'User ID': user_id,
-                                'Last Name': submissions[user_id][lab][0].last_name[0],
-                                'First Name': submissions[user_id][lab][0].first_name[0],
-                                'Email': submissions[user_id][lab][0].email[0],
-                                'Role': 'Student',
-                                'Lab ' + str(lab) + ' hardcoding score': hardcoding_score,
-                                str(lab) + ' Student code': student_code,
-                            }
-
-            elif i == 7:
-                print('\nGoodbye!')
-                exit(0)
-
-            elif i == 8:
-                output_file_name = 'hardcoding-test.csv'
-                test_results = tools.devtools.eval_hardcoding.manual_test(submissions, selected_labs)
-                for user_id in test_results:
-                    for lab in test_results[user_id]:
-                        hardcoding_score = test_results[user_id][lab][0]
-                        student_code = test_results[user_id][lab][1]
-                        if user_id in tool_result:
-                            tool_result[user_id]['Lab ' + str(lab) + ' hardcoded?'] = hardcoding_score
-                            tool_result[user_id][str(lab) + ' Student code'] = student_code
-                        else:
-                            tool_result[user_id] = {
-                                'User ID': user_id,
-                                'Last Name': submissions[user_id][lab][0].last_name[0],
-                                'First Name': submissions[user_id][lab][0].first_name[0],
-                                'Email': submissions[user_id][lab][0].email[0],
-                                'Role': 'Student',
-                                'Lab ' + str(lab) + ' hardcoded?': hardcoding_score,
-                                str(lab) + ' Student code': student_code,
-                            }
-
-            # Style anomalies for selected labs using cpplint
-            elif i == 9:
-                output_file_name = 'cpp_style.csv'
-                stylechecker_output = stylechecker(submissions, selected_labs)
-                for user_id in stylechecker_output:
-                    for lab_id in stylechecker_output[user_id]:
-                        if user_id in tool_result:
-                            tool_result[user_id][f'{lab_id} Style score'] = stylechecker_output[user_id][lab_id][0]
-                            tool_result[user_id][f'{lab_id} Style output'] = stylechecker_output[user_id][lab_id][1]
-                            tool_result[user_id][f'{lab_id} Student code'] = stylechecker_output[user_id][lab_id][2]
-                        else:
-                            tool_result[user_id] = {
-                                'User ID': user_id,
-                                'Last Name': submissions[user_id][lab_id][0].last_name[0],
-                                'First Name': submissions[user_id][lab_id][0].first_name[0],
-                                'Email': submissions[user_id][lab_id][0].email[0],
-                                'Role': 'Student',
-                                str(lab_id) + '  Style score': stylechecker_output[user_id][lab_id][0],
-                                str(lab_id) + '  Style output': stylechecker_output[user_id][lab_id][1],
-                                str(lab_id) + ' Student code': stylechecker_output[user_id][lab_id][2],
-                            }
+                        output_file_name = file_name
+                else:
+                    print('Please select a valid option')
 
-            else:
-                print('Please select a valid option')
+            if len(tool_result) != 0:
+                util.write_output_to_csv(tool_result, output_file_name)
+                print(f'\nDone! Wrote output to output/{output_file_name}')
 
-        if len(tool_result) != 0:
-            util.write_output_to_csv(tool_result, output_file_name)
-            print(f'\nDone! Wrote output to output/{output_file_name}')
+    finally:  # Also on Ctrl-C
+        prefetcher.stop(wait=True)
+        downloader.close()  # Also writes the run's download telemetry and the code store's usage
 
 
 if __name__ == '__main__':
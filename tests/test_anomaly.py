@@ -2,6 +2,7 @@ import textwrap
 
 from tools import anomaly
 from tools.anomaly import StyleAnomaly
+from tools.submission import Submission
 
 
 class TestPointersAnomaly:
@@ -1281,3 +1282,13 @@ class TestCinInsideWhileAnomaly:
         code = 'while (VarWith_cin_InName == 1) {'
         result = anomaly.get_single_anomaly_score(code, self.a)
         assert result == (0, 0)
+
+
+class TestAnomaly:
+    def test_identical_code_scored_once(self, monkeypatch):
+        scored = []
+        monkeypatch.setattr(anomaly, 'get_total_anomaly_score', lambda code: scored.append(code) or (0, 0))
+        data = {user_id: {3.2: [Submission(user_id, 3.2, 1, 'int main() {}', None, '', 10.0)]} for user_id in (1, 2, 3)}
+        output = anomaly.anomaly(data, [3.2])
+        assert scored == ['int main() {}']
+        assert output[3][3.2] == [0, 0, 'int main() {}']
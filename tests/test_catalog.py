@@ -0,0 +1,40 @@
+import pandas as pd
+
+from tools.catalog import LabCatalog
+
+
+def make_logfile() -> pd.DataFrame:
+    """Rows for two labs, interleaved, including a solution row."""
+    return pd.DataFrame(
+        {
+            'lab_id': [123, 124, 123, 124, 123],
+            'content_section': [3.2, 3.12, 3.2, 3.12, 3.2],
+            'caption': ['How many digits', 'Mad Lib', 'How many digits', 'Mad Lib', 'How many digits'],
+            'user_id': [-1, 345, 345, 346, 346],
+            'is_submission': [None, 1.0, 0.0, 1.0, 1.0],
+        }
+    )
+
+
+class TestLabCatalog:
+    def test_labs_in_order_of_appearance(self):
+        catalog = LabCatalog(make_logfile())
+        assert list(catalog) == [3.2, 3.12]
+
+    def test_lab_info(self):
+        lab = LabCatalog(make_logfile())[3.2]
+        assert lab.caption == 'How many digits'
+        assert lab.crid == 123
+        assert lab.num_runs == 3
+        assert lab.num_students == 2  # Solution isn't a student
+        assert lab.num_submissions == 1
+
+    def test_rows_are_grouped_by_lab(self):
+        catalog = LabCatalog(make_logfile())
+        assert list(catalog.rows(3.2).index) == [0, 2, 4]
+        assert list(catalog.rows(3.12).index) == [1, 3]
+
+    def test_contains(self):
+        catalog = LabCatalog(make_logfile())
+        assert 3.12 in catalog
+        assert 4.1 not in catalog
@@ -0,0 +1,162 @@
+import os
+import socket
+import subprocess
+import sys
+
+from tools.codestore import CodeStore, parse_size, submission_key
+
+
+class TestSubmissionKey:
+    def test_removes_suffix_only(self):
+        assert submission_key('https://example.com/a/63880560-9d25.zip') == '63880560-9d25'
+        assert submission_key('https://example.com/zip-0001-pz.zip') == 'zip-0001-pz'
+
+
+class TestParseSize:
+    def test_units(self):
+        assert parse_size('1048576') == 1048576
+        assert parse_size('800K') == 800 * 1024
+        assert parse_size('500M') == 500 * 1024**2
+        assert parse_size('1.5gb') == int(1.5 * 1024**3)
+
+
+class TestCodeStore:
+    def test_put_and_get(self, tmp_path):
+        with CodeStore(str(tmp_path)) as store:
+            store.put('a', 'int main() {}')
+            store.put('b', 'int x = 1;\n')
+            store.put('empty', '')
+            assert store.get('a') == 'int main() {}'
+            assert store.get('b') == 'int x = 1;\n'
+            assert store.get('empty') == ''
+            assert store.get('c') is None
+            assert 'a' in store
+            assert len(store) == 3
+
+    def test_survives_reopening(self, tmp_path):
+        with CodeStore(str(tmp_path)) as store:
+            store.put('a', 'cout << "é";')
+        with CodeStore(str(tmp_path)) as store:
+            assert store.get('a') == 'cout << "é";'
+            store.put('b', 'int y;')  # Appends after reopening
+            assert store.get('b') == 'int y;'
+
+    def test_identical_code_is_stored_once(self, tmp_path):
+        with CodeStore(str(tmp_path)) as store:
+            store.put('a', 'int main() {}')
+            store.put('b', 'int main() {}')
+            assert store.get('b') == 'int main() {}'
+        assert (tmp_path / 'code.pack').stat().st_size == len('int main() {}')
+
+    def test_ignores_torn_index(self, tmp_path):
+        with CodeStore(str(tmp_path)) as store:
+            store.put('a', 'int main() {}')
+        with open(tmp_path / 'code.idx', 'a') as file:
+            file.write('b\tdeadbeef\t13\t50')  # Interrupted while writing, and points past the pack
+        with CodeStore(str(tmp_path)) as store:
+            assert 'b' not in store
+            store.put('c', 'int z;')
+        with CodeStore(str(tmp_path)) as store:
+            assert store.get('a') == 'int main() {}'
+            assert store.get('c') == 'int z;'
+
+    def test_sees_code_stored_by_another_process(self, tmp_path):
+        with CodeStore(str(tmp_path)) as first, CodeStore(str(tmp_path)) as second:
+            first.put('a', 'int a;')
+            second.put('b', 'int b;')
+            first.put('c', 'int b;')  # Same code as `b`, written by the other store
+            assert second.get('a') == 'int a;'
+            assert first.get('b') == 'int b;'
+            assert second.get('c') == 'int b;'
+        assert (tmp_path / 'code.pack').read_text() == 'int a;int b;'
+
+
+class TestInFlightMarkers:
+    def test_claim_is_exclusive(self, tmp_path):
+        with CodeStore(str(tmp_path)) as first, CodeStore(str(tmp_path)) as second:
+            assert first.claim('a')
+            assert not second.claim('a')
+            first.release('a')
+            assert second.claim('a')
+
+    def test_wait_for_finished_download(self, tmp_path):
+        with CodeStore(str(tmp_path)) as first, CodeStore(str(tmp_path)) as second:
+            first.claim('a')
+            first.put('a', 'int a;')
+            assert second.wait_for('a', poll_interval=0.01)
+
+    def test_wait_for_abandoned_download(self, tmp_path):
+        with CodeStore(str(tmp_path)) as store:
+            process = subprocess.Popen([sys.executable, '-c', 'pass'])
+            process.wait()
+            with open(os.path.join(store.inflight_dir, 'a'), 'w') as file:
+                file.write(f'{socket.gethostname()} {process.pid}')  # Owner has exited
+            assert not store.wait_for('a', poll_interval=0.01)
+            assert store.claim('a')
+
+    def test_wait_for_stale_marker(self, tmp_path):
+        with CodeStore(str(tmp_path), stale_after=0) as store:
+            open(os.path.join(store.inflight_dir, 'a'), 'w').close()
+            assert not store.wait_for('a', poll_interval=0.01)
+
+
+class TestEviction:
+    def test_evicts_least_recently_used(self, tmp_path):
+        with CodeStore(str(tmp_path)) as store:
+            for key in 'abcd':
+                store.put(key, key * 100)
+        with CodeStore(str(tmp_path)) as store:
+            store.get('a')  # Used more recently than b, c and d
+        with CodeStore(str(tmp_path)) as store:
+            assert store.evict(max_bytes=120) == 3
+            assert store.get('a') == 'a' * 100
+            assert 'b' not in store and 'c' not in store and 'd' not in store
+            assert os.path.getsize(store.pack_path) == 100
+        assert len(list(tmp_path.glob('*.pack'))) == 1
+
+    def test_within_budget(self, tmp_path):
+        with CodeStore(str(tmp_path)) as store:
+            store.put('a', 'a' * 100)
+            assert store.evict(max_bytes=100) == 0
+
+    def test_other_process_sees_eviction(self, tmp_path):
+        with CodeStore(str(tmp_path)) as first, CodeStore(str(tmp_path)) as second:
+            first.put('a', 'a' * 100)
+            first.put('b', 'b' * 100)
+            second.get('b')
+            second.evict(max_bytes=150)
+            assert first.get('b') == 'b' * 100  # Still readable from the old pack
+            first.put('c', 'c' * 10)  # Reloads the new index and appends to the new pack
+            assert 'a' not in first
+            assert first.get('b') == 'b' * 100
+            assert second.get('c') == 'c' * 10
+
+
+class TestCompression:
+    def test_compressed_code_reads_back(self, tmp_path):
+        code = '#include <iostream>\nint main() {\n    return 0;\n}\n' * 50
+        with CodeStore(str(tmp_path), compress=True) as store:
+            store.put('a', code)
+            assert store.get('a') == code
+        assert (tmp_path / 'code.pack').stat().st_size < len(code) / 5
+        with CodeStore(str(tmp_path)) as store:  # Compression off, can still read compressed code
+            store.put('b', 'int b;')
+            assert store.get('a') == code
+            assert store.get('b') == 'int b;'
+            assert store.stats()['compressed'] == 1
+
+
+class TestStats:
+    def test_totals_across_runs(self, tmp_path):
+        with CodeStore(str(tmp_path)) as store:
+            store.put('a', 'int a;')
+            store.get('a')
+            store.get('b')
+        with CodeStore(str(tmp_path)) as store:
+            store.get('a')
+            stats = store.stats()
+        assert stats['entries'] == 1
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+        assert stats['hit_ratio'] == 2 / 3
+        assert stats['live_bytes'] == len('int a;')
@@ -0,0 +1,240 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tools.codestore import CodeStore
+from tools.downloader import Downloader
+from tools.manifest import FAILED, OK, PENDING, DownloadManifest
+
+CODE = '#include <iostream>\nint main() { return 0; }\n'
+
+
+class ZipHandler(BaseHTTPRequestHandler):
+    """Serves CODE zipped for every path, and counts requests and connections."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):  # noqa: N802
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delay)
+        if self.server.throttle > 0:
+            self.server.throttle -= 1
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.server.status != 200:
+            body = b'<html><body>Not found</body></html>'
+            self.send_response(self.server.status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as zfile:
+            zfile.writestr('main.cpp', CODE)
+        body = buffer.getvalue()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ZipHandler)
+    server.connections = 0
+    server.requests = []
+    server.throttle = 0  # Number of requests to answer with 429
+    server.delay = 0  # Seconds to wait before answering
+    server.status = 200  # Answer with an HTML error page instead, if not 200
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestDownloader:
+    def test_fetch_downloads_and_caches(self, server, tmp_path):
+        url = f'{server.url}/0001-000002-abc.zip'
+        with Downloader(max_workers=2, download_dir=str(tmp_path)) as downloader:
+            assert downloader.fetch(url) == (url, CODE)
+            assert downloader.fetch(url) == (url, CODE)
+        assert len(server.requests) == 1  # Second fetch is read from the download folder
+
+    def test_fetch_all_reuses_connections(self, server, tmp_path):
+        urls = [f'{server.url}/0001-{i:06d}-abc.zip' for i in range(20)]
+        with Downloader(max_workers=2, download_dir=str(tmp_path)) as downloader:
+            results = downloader.fetch_all(urls)
+        assert results == {url: CODE for url in urls}
+        assert server.connections <= 2
+
+    def test_fetch_all_downloads_each_url_once(self, server, tmp_path):
+        url = f'{server.url}/0001-000002-abc.zip'
+        with Downloader(max_workers=2, download_dir=str(tmp_path)) as downloader:
+            assert downloader.fetch_all([url, url, float('nan'), url]) == {url: CODE}
+        assert len(server.requests) == 1
+
+    def test_stream_bounds_urls_in_flight(self, server, tmp_path, monkeypatch):
+        server.delay = 0.01
+        urls = [f'{server.url}/0001-{i:06d}-abc.zip' for i in range(20)]
+        with Downloader(max_workers=4, download_dir=str(tmp_path)) as downloader:
+            submitted = []
+            fetch = downloader.fetch
+            monkeypatch.setattr(downloader, 'fetch', lambda url: submitted.append(url) or fetch(url))
+            results = downloader.stream(urls, max_in_flight=3)
+            first = next(results)
+            assert len(submitted) <= 6  # The first 3, plus one more for each that finished
+            assert dict([first, *results]) == {url: CODE for url in urls}
+
+    def test_stream_stops_early(self, server, tmp_path):
+        urls = [f'{server.url}/0001-{i:06d}-abc.zip' for i in range(20)]
+        with Downloader(max_workers=2, download_dir=str(tmp_path)) as downloader:
+            results = downloader.stream(urls, max_in_flight=2)
+            next(results)
+            results.close()
+            assert PENDING not in downloader.manifest.states.values()  # Downloads in flight finished
+        assert len(server.requests) < len(urls)
+
+    def test_plan_skips_cached(self, server, tmp_path):
+        cached, missing = f'{server.url}/0001-000002-abc.zip', f'{server.url}/0001-000003-abc.zip'
+        with CodeStore(str(tmp_path)) as store:
+            store.put('0001-000002-abc', CODE)
+        downloader = Downloader(download_dir=str(tmp_path))
+        plan = downloader.plan([missing, cached, missing])
+        assert plan.cached == [cached]
+        assert plan.missing == [missing]
+        assert downloader.fetch_all([cached]) == {cached: CODE}
+        assert server.requests == []
+
+    def test_retries_when_throttled(self, server, tmp_path):
+        server.throttle = 2
+        url = f'{server.url}/0001-000002-abc.zip'
+        with Downloader(max_workers=4, download_dir=str(tmp_path), initial_workers=4) as downloader:
+            assert downloader.fetch(url) == (url, CODE)
+            assert downloader.limiter.throttled == 2
+            assert downloader.limiter.limit == 2
+
+    def test_writes_telemetry(self, server, tmp_path):
+        server.throttle = 1
+        urls = [f'{server.url}/0001-000002-abc.zip', f'{server.url}/0001-000003-abc.zip']
+        with Downloader(download_dir=str(tmp_path)) as downloader:
+            downloader.fetch_all(urls)
+            downloader.fetch(urls[0])
+        with open(tmp_path / 'telemetry.json') as file:
+            report = json.load(file)
+        assert (report['requests'], report['retries']) == (3, 1)
+        assert report['statuses'] == {'200': 2, '429': 1}
+        assert report['errors'] == {'HTTP 429': 1}
+        assert report['bytes'] > 0
+        # Reading urls[0] again isn't another hit: each URL counts once per run
+        assert report['cache'] == {'hits': 0, 'misses': 2, 'hit_ratio': 0.0, 'skipped': 0}
+        assert sum(report['latency_seconds']['histogram'].values()) == 3
+        assert report['concurrency']['throttled'] == 1
+
+    def test_gives_up_after_retries(self, server, tmp_path):
+        server.throttle = 10
+        url = f'{server.url}/0001-000002-abc.zip'
+        with Downloader(download_dir=str(tmp_path), retries=1) as downloader:
+            assert downloader.fetch(url) == (url, None)
+            assert downloader.manifest.failures[url]['reason'] == (
+                'Max number of retries met while retrieving student code.'
+            )
+        assert len(server.requests) == 2
+
+    def test_not_found(self, server, tmp_path):
+        server.status = 404
+        url = f'{server.url}/0001-000002-abc.zip'
+        with Downloader(download_dir=str(tmp_path)) as downloader:
+            assert downloader.fetch_all([url]) == {url: None}
+            assert downloader.manifest.failures[url]['reason'] == 'HTTP 404 while retrieving student code.'
+            assert downloader.plan([url]).skipped == [url]
+        assert len(server.requests) == 1
+
+    def test_refused_connection(self, tmp_path):
+        with socket.socket() as sock:  # A port that nothing listens on
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        url = f'http://127.0.0.1:{port}/0001-000002-abc.zip'
+        with Downloader(download_dir=str(tmp_path), retries=0) as downloader:
+            assert downloader.fetch_all([url]) == {url: None}
+            assert downloader.manifest.failures[url]['reason'] == 'ConnectionError while retrieving student code.'
+            assert downloader.manifest.states == {url: FAILED}
+
+    def test_skips_recent_failures(self, server, tmp_path):
+        server.throttle = 10
+        url = f'{server.url}/0001-000002-abc.zip'
+        with Downloader(download_dir=str(tmp_path), retries=0) as downloader:
+            downloader.fetch(url)
+        server.throttle = 0
+        with Downloader(download_dir=str(tmp_path)) as downloader:
+            assert downloader.plan([url]).skipped == [url]
+            assert downloader.fetch_all([url]) == {url: None}
+        assert len(server.requests) == 1
+
+    def test_retries_failures_after_ttl(self, server, tmp_path):
+        server.throttle = 1
+        url = f'{server.url}/0001-000002-abc.zip'
+        with Downloader(download_dir=str(tmp_path), retries=0) as downloader:
+            downloader.fetch(url)
+        with Downloader(download_dir=str(tmp_path), failure_ttl=0) as downloader:
+            assert downloader.fetch_all([url]) == {url: CODE}
+
+    def test_records_states_in_manifest(self, server, tmp_path):
+        server.throttle = 10
+        failed, ok = f'{server.url}/0001-000002-abc.zip', f'{server.url}/0001-000003-abc.zip'
+        with Downloader(download_dir=str(tmp_path), retries=0) as downloader:
+            downloader.fetch(failed)
+            server.throttle = 0
+            downloader.fetch(ok)
+            assert downloader.manifest.states == {failed: FAILED, ok: OK}
+
+    def test_migrates_legacy_files(self, server, tmp_path):
+        done, interrupted = f'{server.url}/zip-0001-pz.zip', f'{server.url}/0001-000003-abc.zip'
+        (tmp_path / '-0001-.cpp').write_text(CODE)  # Named with the old `strip('.zip')`
+        (tmp_path / '0001-000003-abc.cpp').write_text('#include <ios')  # Partial file from an interrupted run
+        with DownloadManifest(str(tmp_path / 'manifest.jsonl')) as manifest:
+            manifest.record(done, OK)
+            manifest.record(interrupted, PENDING)
+        with Downloader(download_dir=str(tmp_path)) as downloader:
+            assert downloader.plan([done, interrupted]).missing == [interrupted]
+            assert downloader.fetch_all([done, interrupted]) == {done: CODE, interrupted: CODE}
+        assert len(server.requests) == 1
+        assert not list(tmp_path.glob('*.cpp'))
+
+    def test_processes_share_downloads(self, server, tmp_path):
+        server.delay = 0.05
+        urls = [f'{server.url}/0001-{i:06d}-abc.zip' for i in range(10)]
+        script = (
+            'import sys\n'
+            'from tools.downloader import Downloader\n'
+            'with Downloader(download_dir=sys.argv[1]) as downloader:\n'
+            '    code = downloader.fetch_all(sys.argv[2:])\n'
+            f'assert all(c == {CODE!r} for c in code.values()), code\n'
+        )
+        processes = [
+            subprocess.Popen([sys.executable, '-c', script, str(tmp_path), *urls], stdout=subprocess.DEVNULL)
+            for _ in range(3)
+        ]
+        assert [process.wait() for process in processes] == [0, 0, 0]
+        assert sorted(server.requests) == sorted(f'/0001-{i:06d}-abc.zip' for i in range(10))
+        assert os.listdir(tmp_path / 'inflight') == []
@@ -0,0 +1,48 @@
+import pytest
+
+from tools.incdev import get_diff, get_line_diff, get_run_diff, strip_blank_lines
+from tools.submission import Submission, line_fingerprints
+
+CODE = 'int main() {\n\n    int x = 0;\n    cin >> x;\n    \n    return 0;\n}\n'
+
+
+def make_run(code: str) -> Submission:
+    return Submission(1, 3.2, 0, code, None, '', 0.0)
+
+
+class TestLineFingerprints:
+    def test_non_blank_lines(self):
+        fingerprints = line_fingerprints(CODE)
+        assert len(fingerprints) == 5
+        assert fingerprints[0] == line_fingerprints('int main() {')[0]
+        assert line_fingerprints('\n  \n').tolist() == []
+
+    def test_recomputed_when_code_changes(self):
+        run = make_run(CODE)
+        assert len(run.fingerprints) == 5
+        run.code = 'int x;'
+        assert len(run.fingerprints) == 1
+
+
+class TestGetLineDiff:
+    @pytest.mark.parametrize(
+        'curr',
+        [
+            CODE,
+            CODE.replace('int x = 0;', 'int x = 1;'),
+            CODE + 'int f() {\n    return 1;\n}\n',
+            'int main() {\n    int x = 0;\n}\n',
+            '}\nint main() {\n',  # The first sample's last line, but no longer last
+            '',
+        ],
+    )
+    def test_same_as_get_diff(self, curr):
+        change = get_line_diff(line_fingerprints(CODE), line_fingerprints(curr))
+        assert change == get_diff(strip_blank_lines(CODE), strip_blank_lines(curr))
+
+    def test_long_code_with_frequent_lines(self):
+        # '}' is frequent enough in 200+ lines to be ignored, so Differ may pair up the '}'s in a changed block
+        prev = 'int f() {\n' + 'x = 1;\n}\n' * 100
+        curr = 'int g() {\n' + 'x = 2;\n}\n' * 100
+        assert get_line_diff(line_fingerprints(prev), line_fingerprints(curr)) is None
+        assert get_run_diff(make_run(prev), make_run(curr)) == get_diff(prev.rstrip(), curr.rstrip())
@@ -0,0 +1,57 @@
+import zipfile
+
+import pytest
+
+from tests.test_zips import make_zip
+from tools.codestore import CodeStore
+from tools.ingest import ingest, main
+
+URLS = ['https://example.com/a.zip', 'https://example.com/b.zip', 'https://example.com/c.zip', float('nan')]
+
+
+@pytest.fixture
+def export(tmp_path):
+    """A folder of submission zips: 'a' and 'b' are in the logfile, 'x' isn't, and 'c' is missing."""
+    folder = tmp_path / 'export'
+    (folder / 'lab1').mkdir(parents=True)
+    (folder / 'lab1' / 'a.zip').write_bytes(make_zip({'main.cpp': 'int a;\n'}))
+    (folder / 'b.zip').write_bytes(make_zip({'main.cpp': 'int b;\n', 'util.h': 'int f();'}))
+    (folder / 'x.zip').write_bytes(make_zip({'main.cpp': 'int x;\n'}))
+    return folder
+
+
+class TestIngest:
+    def test_folder(self, tmp_path, export):
+        with CodeStore(str(tmp_path / 'downloads')) as store:
+            summary = ingest(URLS, str(export), store, num_threads=2)
+            assert store.get('a') == 'int a;\n'
+            assert store.get('b') == '// main.cpp\nint b;\n// util.h\nint f();\n'
+            assert 'x' not in store
+        assert (summary.ingested, summary.not_found, summary.unmatched) == (2, 1, 1)
+
+    def test_archive_of_zips(self, tmp_path, export):
+        archive = tmp_path / 'export.zip'
+        with zipfile.ZipFile(archive, 'w') as zfile:
+            for path in export.rglob('*.zip'):
+                zfile.write(path, path.relative_to(export).as_posix())
+        with CodeStore(str(tmp_path / 'downloads')) as store:
+            summary = ingest(URLS, str(archive), store, num_threads=2)
+            assert store.get('a') == 'int a;\n'
+        assert summary.ingested == 2
+
+    def test_skips_cached_and_unreadable(self, tmp_path, export):
+        (export / 'c.zip').write_bytes(b'not a zip')
+        with CodeStore(str(tmp_path / 'downloads')) as store:
+            store.put('a', 'downloaded')
+            summary = ingest(URLS, str(export), store)
+            assert store.get('a') == 'downloaded'
+            assert 'c' not in store
+        assert (summary.ingested, summary.cached, summary.unreadable) == (1, 1, 1)
+
+    def test_main(self, tmp_path, export, capsys):
+        logfile = tmp_path / 'log.csv'
+        logfile.write_text('user_id,zip_location\n1,https://example.com/a.zip\n2,https://example.com/b.zip\n')
+        main([str(logfile), str(export), '--dir', str(tmp_path / 'downloads')])
+        assert '2 ingested' in capsys.readouterr().out
+        with CodeStore(str(tmp_path / 'downloads')) as store:
+            assert store.get('a') == 'int a;\n'
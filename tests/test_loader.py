@@ -0,0 +1,113 @@
+import textwrap
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from tools import loader
+
+LOGFILE = textwrap.dedent(
+    """\
+    zybook_code,content_resource_id,content_section,caption,user_id,first_name,last_name,email,role,date_submitted(UTC),zip_location,submission,score,max_score,result
+    CS1,123,3.2,How many digits,-1,Solution,Solution,,,,url1,,,,
+    CS1,123,3.2,How many digits,345,Ben,Denz,bdenz001@ucr.edu,Student,4/24/2023 3:47,url2,1.0,0.0,10.0,{}
+    CS1,124,3.12,Mad Lib,345,Ben,Denz,bdenz001@ucr.edu,Student,4/24/2023 3:49,url3,0.0,,10.0,
+    """
+)
+
+
+def write_logfile(tmp_path) -> str:
+    path = tmp_path / 'logfile.csv'
+    path.write_text(LOGFILE)
+    return str(path)
+
+
+class TestStandardizeColumnName:
+    def test_date_submitted(self):
+        assert loader.standardize_column_name('date_submitted(UTC)') == 'date_submitted'
+
+    def test_submission(self):
+        assert loader.standardize_column_name('submission') == 'is_submission'
+
+    def test_content_resource_id(self):
+        assert loader.standardize_column_name('content_resource_id') == 'lab_id'
+
+    def test_unchanged(self):
+        assert loader.standardize_column_name('caption') == 'caption'
+
+
+class TestReadLogfile:
+    def test_standardized_columns(self, tmp_path):
+        logfile = loader.read_logfile(write_logfile(tmp_path))
+        assert 'date_submitted' in logfile
+        assert 'is_submission' in logfile
+        assert 'lab_id' in logfile
+
+    def test_skips_unused_columns(self, tmp_path):
+        logfile = loader.read_logfile(write_logfile(tmp_path))
+        assert 'zybook_code' not in logfile
+        assert 'result' not in logfile
+
+    def test_optional_columns(self, tmp_path):
+        logfile = loader.read_logfile(write_logfile(tmp_path), optional_columns=['result'])
+        assert logfile['result'][1] == '{}'
+
+    def test_compact_dtypes(self, tmp_path):
+        logfile = loader.read_logfile(write_logfile(tmp_path))
+        assert logfile['lab_id'].dtype == 'int32'
+        assert logfile['content_section'].dtype == 'category'
+        assert logfile['email'].dtype == 'category'
+        assert logfile['score'].dtype == 'float32'
+
+    def test_lab_ids_compare_as_floats(self, tmp_path):
+        logfile = loader.read_logfile(write_logfile(tmp_path))
+        assert list(logfile.content_section.unique()) == [3.2, 3.12]
+        assert len(logfile[logfile.content_section == 3.12]) == 1
+
+
+class TestReadColumn:
+    def test_aligns_with_logfile(self, tmp_path):
+        path = write_logfile(tmp_path)
+        logfile = loader.read_logfile(path)
+        students = logfile[logfile.role == 'Student']
+        students = students.assign(result=loader.read_column(path, 'result'))
+        assert students['result'][1] == '{}'
+
+
+class TestParseTimestamps:
+    def test_detected_format(self):
+        timestamps = pd.Series(['4/24/2023 3:47', '4/24/2023 13:05'])
+        parsed = loader.parse_timestamps(timestamps)
+        assert list(parsed) == [datetime(2023, 4, 24, 3, 47), datetime(2023, 4, 24, 13, 5)]
+
+    def test_fallback_for_other_formats(self):
+        timestamps = pd.Series(['2023-04-24 03:47:00', 'April 25, 2023 10:00 AM'])
+        parsed = loader.parse_timestamps(timestamps)
+        assert list(parsed) == [datetime(2023, 4, 24, 3, 47), datetime(2023, 4, 25, 10, 0)]
+
+    def test_formats_sampled_from_both_ends(self):
+        timestamps = pd.Series(['4/24/2023 3:47', '4/24/2023 13:05', '2023-04-25 10:00:00'])
+        assert loader.detect_timestamp_formats(timestamps, sample_size=1) == ['%m/%d/%Y %H:%M', '%Y-%m-%d %H:%M:%S']
+
+    def test_unsampled_formats_parsed_together(self, monkeypatch):
+        monkeypatch.setattr(loader, 'get_valid_datetime', lambda timestamp: pytest.fail('Parsed one at a time'))
+        timestamps = pd.Series(
+            ['4/24/2023 3:47', '2023-04-25T12:00:00+02:00', 'April 25, 2023 10:00 AM', '4/26/2023 1:00']
+        )
+        parsed = loader.parse_timestamps(timestamps)
+        assert list(parsed) == [
+            datetime(2023, 4, 24, 3, 47),
+            datetime(2023, 4, 25, 10, 0),  # In UTC
+            datetime(2023, 4, 25, 10, 0),
+            datetime(2023, 4, 26, 1, 0),
+        ]
+
+    def test_blank_is_nat(self):
+        timestamps = pd.Series([None, '2023-04-24 03:47:00'])
+        parsed = loader.parse_timestamps(timestamps)
+        assert pd.isna(parsed[0])
+        assert parsed[1] == datetime(2023, 4, 24, 3, 47)
+
+    def test_read_logfile_parses_dates(self, tmp_path):
+        logfile = loader.read_logfile(write_logfile(tmp_path))
+        assert logfile['date_submitted'][1] == datetime(2023, 4, 24, 3, 47)
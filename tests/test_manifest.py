@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from tools.manifest import FAILED, OK, PENDING, DownloadManifest, write_atomic
+
+
+class TestDownloadManifest:
+    def test_states_survive_reopening(self, tmp_path):
+        path = str(tmp_path / 'manifest.jsonl')
+        with DownloadManifest(path) as manifest:
+            manifest.record('a', PENDING)
+            manifest.record('b', PENDING)
+            manifest.record('a', OK)
+        with DownloadManifest(path) as manifest:
+            assert manifest.states == {'a': OK, 'b': PENDING}
+
+    def test_torn_last_line_is_ignored(self, tmp_path):
+        path = tmp_path / 'manifest.jsonl'
+        path.write_text('{"url": "a", "state": "ok"}\n{"url": "b", "sta')
+        with DownloadManifest(str(path)) as manifest:
+            assert manifest.states == {'a': OK}
+            manifest.record('c', FAILED)
+        with DownloadManifest(str(path)) as manifest:
+            assert manifest.states == {'a': OK, 'c': FAILED}
+
+    def test_compacts_superseded_lines(self, tmp_path):
+        path = str(tmp_path / 'manifest.jsonl')
+        with DownloadManifest(path) as manifest:
+            for state in [PENDING, FAILED, PENDING, OK]:
+                manifest.record('a', state)
+        DownloadManifest(path).close()
+        with open(path) as file:
+            assert file.read() == '{"url": "a", "state": "ok"}\n'
+
+    def test_summary(self, tmp_path):
+        with DownloadManifest(str(tmp_path / 'manifest.jsonl')) as manifest:
+            manifest.record('a', OK)
+            manifest.record('b', OK)
+            manifest.record('c', PENDING)
+            assert manifest.summary(['a', 'b', 'c', 'd']) == '1 pending, 2 ok'
+
+
+class TestWriteAtomic:
+    def test_writes_file(self, tmp_path):
+        path = str(tmp_path / 'code.cpp')
+        write_atomic(path, 'int main() {}')
+        with open(path) as file:
+            assert file.read() == 'int main() {}'
+
+    def test_leaves_nothing_on_failure(self, tmp_path):
+        path = str(tmp_path / 'code.cpp')
+        with pytest.raises(TypeError):
+            write_atomic(path, None)
+        assert os.listdir(tmp_path) == []
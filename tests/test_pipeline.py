@@ -0,0 +1,54 @@
+from tests.test_runner import FakeDownloader, make_context
+from tools.anomaly import anomaly
+from tools.auto_anomaly import auto_anomaly
+from tools.hardcoding import hardcoding_analysis_1
+from tools.incdev import run
+from tools.pipeline import Pipeline, create_executor
+
+
+class TestPipeline:
+    def test_same_output_as_tools(self):
+        context = make_context(FakeDownloader())
+        output = Pipeline(context, ['roster', 'anomaly', 'auto_anomaly', 'incdev'], num_processes=2).run()
+        assert set(output) == {'anomaly', 'auto_anomaly', 'incdev'}
+        assert output['anomaly'] == anomaly(context.submissions, [3.2])
+        assert output['auto_anomaly'] == auto_anomaly(context.submissions, [3.2])
+        assert output['incdev'] == run(context.submissions)
+
+    def test_shared_executor(self):
+        context = make_context(FakeDownloader())
+        with create_executor(1) as executor:
+            output = Pipeline(context, ['anomaly'], executor=executor).run()
+            assert output['anomaly'] == anomaly(context.submissions, [3.2])
+            assert executor.submit(abs, -1).result() == 1  # Still open for the next logfile
+
+    def test_only_highest_scoring_code(self):
+        downloader = FakeDownloader(failing={'a'})
+        context = make_context(downloader)
+        output = Pipeline(context, ['anomaly'], num_processes=1).run()
+        assert sorted(downloader.fetched) == ['a', 'b', 'c']  # Falls back to 'b' when 'a' fails
+        assert output['anomaly'][1][3.2][2] == 'code from b'
+        assert output['anomaly'] == anomaly(context.submissions, [3.2])
+
+    def test_identical_code_shared(self, monkeypatch):
+        downloader = FakeDownloader()
+        monkeypatch.setattr(downloader, 'fetch', lambda url: (url, 'int main() {}'))
+        context = make_context(downloader)
+        output = Pipeline(context, ['anomaly', 'auto_anomaly'], num_processes=1).run()
+        assert output['anomaly'] == anomaly(context.submissions, [3.2])
+        assert output['auto_anomaly'] == auto_anomaly(context.submissions, [3.2])
+
+    def test_hardcoding_needs_testcases(self, monkeypatch):
+        context = make_context(FakeDownloader())
+        monkeypatch.setattr(context, 'load_testcases', lambda: {})
+        assert Pipeline(context, ['hardcoding']).tools == []
+
+    def test_hardcoding(self, monkeypatch):
+        context = make_context(FakeDownloader())
+        testcases = {3.2: {('123', 'code from a')}}
+        monkeypatch.setattr(context, 'load_testcases', lambda: testcases)
+        context.testcases = testcases
+        output = Pipeline(context, ['hardcoding'], num_processes=1).run()
+        assert output['hardcoding'] == hardcoding_analysis_1(
+            context.submissions, [3.2], testcases, 'code from solution'
+        )
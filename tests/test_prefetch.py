@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pandas as pd
+
+from tools.prefetch import HIGH, LOW, NORMAL, Prefetcher
+
+
+class RecordingDownloader:
+    """Records the URLs fetched, in order."""
+
+    max_workers = 4
+
+    def __init__(self) -> None:
+        self.fetched = []
+        self.lock = threading.Lock()
+
+    def fetch(self, url: str) -> tuple[str, str]:
+        with self.lock:
+            self.fetched.append(url)
+        return url, 'code'
+
+
+def wait_for(prefetcher: Prefetcher, count: int) -> None:
+    for _ in range(500):
+        if prefetcher.fetched >= count:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f'Only {prefetcher.fetched} of {count} URLs were fetched')
+
+
+class TestPrefetcher:
+    def test_highest_priority_first(self):
+        downloader = RecordingDownloader()
+        with Prefetcher(downloader, num_threads=1) as prefetcher:
+            with prefetcher.paused():
+                prefetcher.download(['a', 'b', 'c'], LOW)
+                prefetcher.download(['d'], NORMAL)
+                prefetcher.download(['c'], HIGH)
+            wait_for(prefetcher, 4)
+        assert downloader.fetched == ['c', 'd', 'a', 'b']
+
+    def test_each_url_once(self):
+        downloader = RecordingDownloader()
+        with Prefetcher(downloader) as prefetcher:
+            prefetcher.download(['a', 'b', 'a', float('nan')], LOW)
+            wait_for(prefetcher, 2)
+            prefetcher.download(['a'], HIGH)
+            prefetcher.stop(wait=True)
+        assert sorted(downloader.fetched) == ['a', 'b']
+
+    def test_paused(self):
+        downloader = RecordingDownloader()
+        with Prefetcher(downloader) as prefetcher:
+            with prefetcher.paused():
+                prefetcher.download(['a', 'b'])
+                threading.Event().wait(0.05)
+                assert downloader.fetched == []
+            wait_for(prefetcher, 2)
+
+    def test_stop(self):
+        downloader = RecordingDownloader()
+        prefetcher = Prefetcher(downloader)
+        with prefetcher.paused():
+            prefetcher.download(['a', 'b'])
+            prefetcher.stop(wait=True)
+        assert downloader.fetched == []
+
+    def test_parse_timestamps(self):
+        with Prefetcher(RecordingDownloader(), num_threads=1) as prefetcher:
+            assert prefetcher.timestamps() is None
+            prefetcher.parse_timestamps(pd.Series(['4/24/2023 3:12', None]))
+            timestamps = prefetcher.timestamps()
+        assert timestamps[0] == pd.Timestamp('2023-04-24 03:12')
+        assert pd.isna(timestamps[1])
+
+    def test_then_queues_downloads_once_parsed(self):
+        downloader = RecordingDownloader()
+        with Prefetcher(downloader, num_threads=1) as prefetcher:
+            prefetcher.parse_timestamps(
+                pd.Series(['4/24/2023 3:12', '4/24/2023 3:10']),
+                then=lambda timestamps: prefetcher.download([f'oldest-{timestamps.idxmin()}']),
+            )
+            while prefetcher.fetched < 1:
+                time.sleep(0.01)
+        assert downloader.fetched == ['oldest-1']
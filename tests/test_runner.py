@@ -0,0 +1,123 @@
+import time
+
+import pandas as pd
+import pytest
+
+from tools import runner
+from tools.catalog import LabCatalog
+from tools.prefetch import Prefetcher
+
+
+class FakeDownloader:
+    """Returns made-up code for each URL and records every URL it was asked for."""
+
+    def __init__(self, failing: set[str] = frozenset()) -> None:
+        self.failing = failing
+        self.fetched = []
+
+    def fetch(self, url: str) -> tuple[str, str | None]:
+        self.fetched.append(url)
+        return url, None if url in self.failing else f'code from {url}'
+
+    def stream(self, urls):
+        for url in dict.fromkeys(urls):
+            yield self.fetch(url)
+
+
+def make_context(downloader: FakeDownloader, solution_url: str | None = 'solution') -> runner.ToolContext:
+    logfile = pd.DataFrame(
+        {
+            'lab_id': [123, 123, 123, 124],
+            'content_section': [3.2, 3.2, 3.2, 3.12],
+            'caption': ['How many digits', 'How many digits', 'How many digits', 'Mad Lib'],
+            'user_id': [1, 1, 2, 1],
+            'first_name': ['Ada', 'Ada', 'Alan', 'Ada'],
+            'last_name': ['Lovelace', 'Lovelace', 'Turing', 'Lovelace'],
+            'email': ['a@b.c', 'a@b.c', 'd@e.f', 'a@b.c'],
+            'zip_location': ['a', 'b', 'c', 'd'],
+            'is_submission': [1.0, 1.0, 0.0, 1.0],
+            'score': [10.0, 5.0, 0.0, 7.0],
+            'date_submitted': pd.to_datetime(['2023-04-24'] * 4),
+        }
+    )
+    return runner.ToolContext('log.csv', LabCatalog(logfile), [3.2], solution_url, downloader)
+
+
+class TestToolContext:
+    @pytest.mark.parametrize('name', ['quick_analysis', 'roster'])
+    def test_metadata_tools_download_nothing(self, name):
+        downloader = FakeDownloader()
+        context = make_context(downloader)
+        context.prepare(runner.TOOL_NEEDS[name])
+        assert downloader.fetched == []
+        assert context.submissions == {}
+
+    def test_max_score_code_for_selected_labs(self):
+        downloader = FakeDownloader()
+        submissions = make_context(downloader).load_submissions([3.2])
+        assert sorted(downloader.fetched) == ['a', 'c']
+        assert [sub.code for sub in submissions[1][3.2]] == ['code from a', None]
+        assert submissions[1][3.12][0].code is None
+
+    def test_falls_back_when_download_fails(self):
+        downloader = FakeDownloader(failing={'a'})
+        make_context(downloader).load_submissions([3.2])
+        assert sorted(downloader.fetched) == ['a', 'b', 'c']
+
+    def test_all_code_downloads_the_rest_once(self):
+        downloader = FakeDownloader()
+        context = make_context(downloader)
+        context.prepare({runner.MAX_SCORE_CODE, runner.ALL_CODE})
+        submissions = context.load_submissions()
+        assert sorted(downloader.fetched) == ['a', 'b', 'c', 'd']
+        assert submissions[1][3.12][0].code == 'code from d'
+
+    def test_solution_downloaded_once(self):
+        downloader = FakeDownloader()
+        context = make_context(downloader)
+        assert context.load_solution() == 'code from solution'
+        assert context.load_solution() == 'code from solution'
+        assert downloader.fetched == ['solution']
+
+    def test_no_solution(self):
+        downloader = FakeDownloader()
+        assert make_context(downloader, solution_url=None).load_solution() is None
+        assert downloader.fetched == []
+
+    def test_timestamps_parsed_in_background(self):
+        downloader = FakeDownloader()
+        context = make_context(downloader)
+        logfile = context.logfile.assign(date_submitted='4/24/2023 3:12')
+        with Prefetcher(downloader, num_threads=1) as prefetcher:
+            prefetcher.parse_timestamps(logfile['date_submitted'])
+            context = runner.ToolContext('log.csv', LabCatalog(logfile), [3.2], None, downloader, prefetcher=prefetcher)
+            context.prepare(runner.TOOL_NEEDS['roster'])
+        assert (context.catalog.logfile['date_submitted'] == pd.Timestamp('2023-04-24 03:12')).all()
+        assert context.logfile is context.catalog.logfile
+
+    def test_prefetch_selected_tools(self):
+        downloader = FakeDownloader()
+        with Prefetcher(downloader, num_threads=1) as prefetcher:
+            context = runner.ToolContext(
+                'log.csv', make_context(downloader).catalog, [3.2], 'solution', downloader, prefetcher=prefetcher
+            )
+            context.prefetch(['roster', 'hardcoding'])
+            while prefetcher.fetched < 3:
+                time.sleep(0.01)
+        assert sorted(downloader.fetched) == ['a', 'c', 'solution']
+
+    def test_quick_analysis_output_file(self, tmp_path):
+        context = make_context(FakeDownloader())
+        context.output_dir = str(tmp_path)
+        output_file_name = runner.run_tool('quick_analysis', context, {})
+        assert (tmp_path / output_file_name).exists()
+
+    def test_empty_pipelined_result_used(self, monkeypatch):
+        import tools.anomaly
+
+        monkeypatch.setattr(tools.anomaly, 'anomaly', lambda *args: pytest.fail('Ran again'))
+        context = make_context(FakeDownloader())
+        context.pipelined['anomaly'] = {}  # No student's code was downloaded
+        tool_result = {}
+        assert runner.run_tool('anomaly', context, tool_result) == 'anomalies.csv'
+        assert tool_result == {}
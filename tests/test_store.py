@@ -0,0 +1,115 @@
+import pickle
+
+import pandas as pd
+
+from tools.store import SubmissionStore
+from tools.submission import Submission
+
+
+def make_logfile() -> pd.DataFrame:
+    """Runs of two students in two labs, interleaved like a real logfile."""
+    return pd.DataFrame(
+        {
+            'lab_id': [124, 123, 123, 124, 123],
+            'content_section': pd.Categorical([3.12, 3.2, 3.2, 3.12, 3.2]),
+            'caption': pd.Categorical(['Mad Lib', 'How many digits', 'How many digits', 'Mad Lib', 'How many digits']),
+            'user_id': [2, 1, 2, 2, 1],
+            'first_name': pd.Categorical(['Alan', 'Ada', 'Alan', 'Alan', 'Ada']),
+            'last_name': pd.Categorical(['Turing', 'Lovelace', 'Turing', 'Turing', 'Lovelace']),
+            'email': pd.Categorical(['d@e.f', 'a@b.c', 'd@e.f', 'd@e.f', 'a@b.c']),
+            'zip_location': ['https://x/a.zip', 'https://x/b.zip', None, 'https://x/d.zip', 'https://x/b.zip'],
+            'is_submission': [0.0, 1.0, 0.0, 1.0, 1.0],
+            'score': [0.0, 5.0, 0.0, 7.0, 10.0],
+            'date_submitted': pd.to_datetime(['2023-04-24 03:0' + str(i) for i in range(5)]),
+        }
+    )
+
+
+class TestSubmissionStore:
+    def test_groups_in_order_of_first_appearance(self):
+        store = SubmissionStore(make_logfile())
+        assert list(store.groups()) == [(2, 3.12, 0, 2), (2, 3.2, 2, 3), (1, 3.2, 3, 5)]
+        data = store.nested()
+        assert list(data) == [2, 1]
+        assert list(data[2]) == [3.12, 3.2]
+        assert [sub.zip_location for sub in data[2][3.12]] == ['https://x/a.zip', 'https://x/d.zip']
+
+    def test_views_read_like_submissions(self):
+        sub = SubmissionStore(make_logfile()).nested()[1][3.2][1]
+        assert (sub.student_id, sub.lab_id) == (1, 3.2)
+        assert (sub.type, sub.max_score, sub.code) == (1.0, 10.0, None)
+        assert sub.sub_time == pd.Timestamp('2023-04-24 03:04')
+        assert sub.submission_id == 'b.zip'
+
+    def test_code_is_set_once_per_url(self):
+        store = SubmissionStore(make_logfile())
+        data = store.nested()
+        store.set_code('https://x/b.zip', 'int b;')
+        store.set_code('https://x/unknown.zip', 'ignored')
+        assert [sub.code for sub in data[1][3.2]] == ['int b;', 'int b;']
+        data[2][3.2][0].code = 'not downloadable'  # No URL
+        assert data[2][3.2][0].code is None
+
+    def test_identical_code_stored_once(self):
+        store = SubmissionStore(make_logfile())
+        store.set_code('https://x/a.zip', 'int main() {}')
+        store.set_code('https://x/d.zip', 'int main() {}')
+        store.set_code('https://x/b.zip', 'int b;')
+        assert store.body_id(0) == store.body_id(1) != store.body_id(3)
+        assert store.bodies == ['int main() {}', 'int b;']
+
+    def test_fingerprints_kept_per_body(self):
+        store = SubmissionStore(make_logfile())
+        store.set_code('https://x/a.zip', 'int a;\n\nint b;')
+        store.set_code('https://x/d.zip', 'int a;\n\nint b;')
+        assert len(store.fingerprints(0)) == 2
+        assert store.fingerprints(0) is store.fingerprints(1)
+        assert store.fingerprints(2) is None
+
+    def test_students_stored_once(self):
+        students = SubmissionStore(make_logfile()).students
+        assert list(students) == [2, 1]
+        assert (students[1].first_name, students[1].last_name, students[1].email) == ('Ada', 'Lovelace', 'a@b.c')
+
+    def test_student_code_column(self):
+        logfile = make_logfile().assign(student_code=['a', 'b', None, 'd', 'b'])
+        assert [sub.code for sub in SubmissionStore(logfile).nested()[2][3.12]] == ['a', 'd']
+
+    def test_pickles_as_submissions(self):
+        store = SubmissionStore(make_logfile())
+        store.set_code('https://x/d.zip', 'int d;')
+        runs = pickle.loads(pickle.dumps(store.nested()[2][3.12]))
+        assert isinstance(runs, list)
+        assert all(isinstance(sub, Submission) for sub in runs)
+        assert [sub.code for sub in runs] == [None, 'int d;']
+        assert runs[1].zip_location == 'https://x/d.zip'
+
+    def test_runs_sorted_by_time(self):
+        logfile = make_logfile()
+        logfile.loc[4, 'date_submitted'] = pd.Timestamp('2023-04-24 02:00')  # Before the row above it
+        logfile.loc[0, 'date_submitted'] = pd.NaT
+        store = SubmissionStore(logfile)
+        data = store.nested()
+        assert [sub.max_score for sub in data[1][3.2]] == [10.0, 5.0]
+        assert [sub.zip_location for sub in data[2][3.12]] == ['https://x/d.zip', 'https://x/a.zip']  # NaT last
+        assert store.group_first_time[0] == pd.Timestamp('2023-04-24 03:03')
+        assert store.group_last_time[2] == pd.Timestamp('2023-04-24 03:01')
+        assert store.group_num_runs.tolist() == [2, 1, 2]
+        assert store.group_num_submissions.tolist() == [1, 0, 2]
+
+    def test_max_score_code(self):
+        logfile = make_logfile().assign(score=[0.0, 10.0, 0.0, 0.0, 10.0])
+        store = SubmissionStore(logfile)
+        data = store.nested()
+        assert data[1][3.2].max_score_code() is None
+        store.set_code('https://x/b.zip', 'first')
+        assert data[1][3.2].max_score_code() == 'first'
+        store.set_code('https://x/a.zip', 'a')  # Neither of student 2's runs scored, so the last one with code
+        assert data[2][3.12].max_score_code() == 'a'
+        store.set_code('https://x/d.zip', 'd')
+        assert data[2][3.12].max_score_code() == 'd'
+
+    def test_empty_logfile(self):
+        store = SubmissionStore(make_logfile().iloc[:0])
+        assert len(store) == 0
+        assert store.nested() == {}
@@ -0,0 +1,49 @@
+import math
+
+from tools.telemetry import DownloadTelemetry, percentile
+
+
+class TestPercentile:
+    def test_nearest_rank_bucket(self):
+        bounds = (1.0, 2.0, 3.0)
+        assert percentile([50, 40, 10, 0], bounds, 0.5) == 1.0
+        assert percentile([50, 40, 10, 0], bounds, 0.9) == 2.0
+        assert percentile([50, 40, 9, 1], bounds, 1.0) == math.inf
+        assert percentile([0, 0, 0, 0], bounds, 0.5) is None
+
+
+class TestDownloadTelemetry:
+    def test_report(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr('tools.telemetry.time.monotonic', lambda: now[0])
+        telemetry = DownloadTelemetry()
+        for latency, status in [(0.02, 200), (0.3, 200), (45.0, 503)]:
+            now[0] += latency
+            telemetry.record_request(now[0] - latency, status, num_bytes=100)
+        telemetry.record_request(now[0], None, retry=True)
+        telemetry.record_error('ConnectionError')
+        telemetry.record_fetch('a', hit=False)  # Prefetched
+        telemetry.record_fetch('a', hit=True)  # Then read by a tool
+        telemetry.record_fetch('b', hit=True)
+        telemetry.record_skip('c')
+
+        report = telemetry.report()
+        assert (report['requests'], report['retries'], report['bytes']) == (4, 1, 300)
+        assert report['latency_seconds']['histogram']['<=0.05s'] == 1
+        assert report['latency_seconds']['histogram']['<=0.5s'] == 1
+        assert report['latency_seconds']['histogram']['>30s'] == 1
+        assert report['latency_seconds']['max'] == 45.0
+        assert report['latency_seconds']['p99'] == 45.0
+        assert 0.3 <= report['latency_seconds']['p50'] <= 0.33
+        assert report['statuses'] == {'200': 2, '503': 1}
+        assert report['errors'] == {'ConnectionError': 1}
+        assert report['cache'] == {'hits': 1, 'misses': 1, 'hit_ratio': 0.5, 'skipped': 1}
+        assert round(report['throughput']['bytes_per_second'], 3) == round(300 / 45.32, 3)
+
+    def test_summary(self):
+        telemetry = DownloadTelemetry()
+        assert telemetry.summary() == 'Cache: n/a hit ratio (0 hits, 0 misses)'
+        telemetry.record_fetch('a', hit=True)
+        assert telemetry.summary() == 'Cache: 100.0% hit ratio (1 hits, 0 misses)'
+        telemetry.record_skip('b')
+        assert telemetry.summary() == 'Cache: 100.0% hit ratio (1 hits, 0 misses), 1 skipped as recently failed'
@@ -0,0 +1,64 @@
+import time
+
+from tools.throttle import AdaptiveLimiter, parse_retry_after
+
+
+def finish_round(limiter: AdaptiveLimiter, latency: float = 0.01, status: int = 200) -> None:
+    """Sends and finishes as many requests as the limit allows."""
+    for _ in range(limiter.limit):
+        limiter.acquire()
+        limiter.release(latency, status)
+
+
+class TestParseRetryAfter:
+    def test_seconds(self):
+        assert parse_retry_after('3') == 3.0
+
+    def test_http_date_in_past(self):
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+    def test_missing_or_invalid(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after('soon') is None
+
+
+class TestAdaptiveLimiter:
+    def test_grows_while_latency_is_flat(self):
+        limiter = AdaptiveLimiter(initial=2, max_limit=4)
+        finish_round(limiter)
+        assert limiter.limit == 3
+        for _ in range(5):
+            finish_round(limiter)
+        assert limiter.limit == 4  # Never above max_limit
+        assert limiter.peak == 4
+
+    def test_stops_growing_when_latency_rises(self):
+        limiter = AdaptiveLimiter(initial=2, max_limit=10)
+        finish_round(limiter, latency=0.01)
+        for _ in range(5):
+            finish_round(limiter, latency=1.0)
+        assert limiter.limit == 3
+
+    def test_halves_once_per_round_when_throttled(self):
+        limiter = AdaptiveLimiter(initial=8, max_limit=8)
+        for _ in range(3):
+            limiter.acquire()
+        for _ in range(3):
+            limiter.release(0.01, 429)
+        assert limiter.limit == 4
+        assert limiter.throttled == 3
+        for _ in range(10):
+            finish_round(limiter, status=503)
+        assert limiter.limit == 1  # Never below min_limit
+
+    def test_retry_after_pauses_new_requests(self):
+        limiter = AdaptiveLimiter(initial=2, max_limit=2)
+        limiter.acquire()
+        limiter.release(0.01, 429, retry_after=0.2)
+        start = time.monotonic()
+        limiter.acquire()
+        assert time.monotonic() - start >= 0.15
+
+    def test_summary(self):
+        limiter = AdaptiveLimiter(initial=2, max_limit=4)
+        assert limiter.summary() == 'Settled on 2 concurrent downloads (peak 2, 0 throttled responses)'
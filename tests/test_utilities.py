@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+
+from tools import utilities
+from tools.catalog import LabCatalog
+from tools.submission import Submission
+
+
+def make_catalog() -> LabCatalog:
+    logfile = pd.DataFrame(
+        {
+            'lab_id': [123, 123, 124],
+            'content_section': [3.2, 3.2, 3.12],
+            'caption': ['How many digits', 'How many digits', 'Mad Lib'],
+            'user_id': [345, 346, 345],
+            'is_submission': [1.0, 0.0, 1.0],
+        }
+    )
+    return LabCatalog(logfile)
+
+
+class TestResolveLabSelection:
+    def test_all(self):
+        assert utilities.resolve_lab_selection(make_catalog(), ['all']) == [3.2, 3.12]
+
+    def test_lab_ids(self):
+        assert utilities.resolve_lab_selection(make_catalog(), ['3.12', '3.2']) == [3.12, 3.2]
+
+    def test_captions(self):
+        assert utilities.resolve_lab_selection(make_catalog(), ['mad lib']) == [3.12]
+
+    def test_unknown_lab(self):
+        with pytest.raises(ValueError):
+            utilities.resolve_lab_selection(make_catalog(), ['4.1'])
+
+    def test_unknown_caption(self):
+        with pytest.raises(ValueError):
+            utilities.resolve_lab_selection(make_catalog(), ['Hello World'])
+
+
+def make_run(code: str | None, max_score: int) -> Submission:
+    return Submission(1, 3.2, 0, code, None, '', max_score)
+
+
+class TestGetCodeWithMaxScore:
+    def test_first_highest_score(self):
+        submissions = {1: {3.2: [make_run('a', 5), make_run('b', 10), make_run('c', 10)]}}
+        assert utilities.get_code_with_max_score(1, 3.2, submissions) == 'b'
+
+    def test_ignores_code_that_was_not_downloaded(self):
+        submissions = {1: {3.2: [make_run('a', 5), make_run(None, 10), make_run(None, 0)]}}
+        assert utilities.get_code_with_max_score(1, 3.2, submissions) == 'a'
+
+    def test_no_code_downloaded(self):
+        submissions = {1: {3.2: [make_run(None, 10)]}}
+        assert utilities.get_code_with_max_score(1, 3.2, submissions) is None
+
+
+def make_runs_logfile() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            'user_id': [1, 1, 1, 2, 2, 1],
+            'content_section': [3.2, 3.2, 3.2, 3.2, 3.2, 3.12],
+            'score': [5.0, 10.0, 10.0, 0.0, 0.0, 7.0],
+            'zip_location': ['a', 'b', 'c', 'd', 'e', 'f'],
+        }
+    )
+
+
+class TestMaxScoreRuns:
+    def test_first_highest_score_or_last_run(self):
+        runs = utilities.max_score_runs(make_runs_logfile(), [3.2])
+        assert sorted(runs['zip_location']) == ['b', 'e']
+
+    def test_only_selected_labs(self):
+        runs = utilities.max_score_runs(make_runs_logfile(), [3.12])
+        assert list(runs['zip_location']) == ['f']
+
+    def test_skips_missing_code(self):
+        runs = utilities.max_score_runs(make_runs_logfile(), [3.2], missing={'b', 'e'})
+        assert sorted(runs['zip_location']) == ['c', 'd']
+
+    def test_matches_get_code_with_max_score(self):
+        logfile = make_runs_logfile()
+        runs = utilities.max_score_runs(logfile, [3.2], missing={'b'})
+        submissions = {1: {3.2: [make_run(url, score) for url, score in [('a', 5), (None, 10), ('c', 10)]]}}
+        assert utilities.get_code_with_max_score(1, 3.2, submissions) in set(runs['zip_location'])
+
+    def test_oldest_first_when_timestamps_are_parsed(self):
+        logfile = make_runs_logfile().assign(
+            date_submitted=pd.to_datetime(['2023-04-24 03:0' + str(i) for i in [0, 5, 1, 0, 1, 0]])
+        )
+        runs = utilities.max_score_runs(logfile, [3.2])
+        assert sorted(runs['zip_location']) == ['c', 'e']
@@ -0,0 +1,24 @@
+import io
+import zipfile
+
+from tools.zips import extract_code
+
+
+def make_zip(files: dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zfile:
+        for name, code in files.items():
+            zfile.writestr(name, code)
+    return buffer.getvalue()
+
+
+class TestExtractCode:
+    def test_one_file(self):
+        assert extract_code(make_zip({'main.cpp': 'int main() {}'})) == 'int main() {}'
+
+    def test_several_files(self):
+        files = {'util.h': 'int f();', 'main.cpp': 'int main() {}\n', '__MACOSX/._main.cpp': 'junk'}
+        assert extract_code(make_zip(files)) == '// main.cpp\nint main() {}\n// util.h\nint f();\n'
+
+    def test_no_files(self):
+        assert extract_code(make_zip({})) is None
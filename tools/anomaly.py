@@ -1,4 +1,5 @@
 import re
+from functools import cached_property
 
 from tools.utilities import (
     get_code_with_max_score,
@@ -12,7 +13,8 @@ class StyleAnomaly:
 
     Attributes:
         name (str): The name of the style anomaly.
-        regex (str): The regular expression used to match the anomaly in code.
+        pattern (str): The regular expression used to match the anomaly in code.
+        regex (re.Pattern): `pattern` compiled on first use, so importing this module stays fast.
         is_active (bool): Whether to check for the anomaly in code.
         weight (int): The points per instance of anomaly.
         max_instances (int): The maximum number of instances of the anomaly. -1 means no limit.
@@ -24,12 +26,18 @@ class StyleAnomaly:
         self, name: str, regex: str, is_active: bool, weight: float, max_instances: int = -1, verbose: bool = False
     ) -> None:
         self.name = name
-        self.regex = re.compile(regex, re.VERBOSE if verbose else 0)
+        self.pattern = regex
+        self.verbose = verbose
         self.is_active = is_active
         self.weight = weight
         self.num_instances = 0
         self.max_instances = max_instances
 
+    @cached_property
+    def regex(self) -> re.Pattern:
+        """The anomaly's compiled regular expression."""
+        return re.compile(self.pattern, re.VERBOSE if self.verbose else 0)
+
     def should_inc_score(self) -> bool:
         """Determines whether an anomaly score should be incremented by an anomaly's weight.
 
@@ -279,12 +287,17 @@ def anomaly(data: dict, selected_labs: list[float]) -> dict:
             }
     """
     output = {}
+    scores = {}  # Code -> its anomalies and score. Students often hand in identical code, so each is scored once.
     for lab in selected_labs:
         for user_id in data:
             if user_id not in output:
                 output[user_id] = {}
             if lab in data[user_id]:
                 code = get_code_with_max_score(user_id, lab, data)
-                anomalies_found, anomaly_score = get_total_anomaly_score(code)
+                if code is None:  # Code couldn't be downloaded
+                    continue
+                if code not in scores:
+                    scores[code] = get_total_anomaly_score(code)
+                anomalies_found, anomaly_score = scores[code]
                 output[user_id][lab] = [anomalies_found, anomaly_score, code]
     return output
@@ -54,12 +54,16 @@ def auto_anomaly(data: dict, selected_labs: list[float]) -> dict:
             }
     """
     output = {}
+    counts = {}  # Code -> its anomaly counts, so identical code is only counted once
     for lab in selected_labs:
         for user_id in data:
             if user_id not in output:
                 output[user_id] = {}
             if lab in data[user_id]:
                 code = get_code_with_max_score(user_id, lab, data)
-                anomaly_counts = get_anomaly_counts(code)
-                output[user_id][lab] = [anomaly_counts, code]
+                if code is None:  # Code couldn't be downloaded
+                    continue
+                if code not in counts:
+                    counts[code] = get_anomaly_counts(code)
+                output[user_id][lab] = [dict(counts[code]), code]
     return output
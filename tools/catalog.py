@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+class LabInfo:
+    """Summary of one lab in a logfile.
+
+    Attributes:
+        lab_id (float): The ID of the lab, e.g. 3.12 (`content_section` column).
+        caption (str): The caption (title) of the lab.
+        crid (int): The ID of the content resource on zyBooks (`lab_id` column).
+        start (int): Position of the lab's first row in the catalog's logfile.
+        stop (int): Position one past the lab's last row in the catalog's logfile.
+        num_students (int): The number of students with at least one run for the lab.
+        num_submissions (int): The number of runs that were submitted for points.
+    """
+
+    def __init__(
+        self,
+        lab_id: float,
+        caption: str,
+        crid: int,
+        start: int,
+        stop: int,
+        num_students: int,
+        num_submissions: int,
+    ) -> None:
+        self.lab_id = lab_id
+        self.caption = caption
+        self.crid = crid
+        self.start = start
+        self.stop = stop
+        self.num_students = num_students
+        self.num_submissions = num_submissions
+
+    @property
+    def num_runs(self) -> int:
+        """The number of rows (runs) for the lab."""
+        return self.stop - self.start
+
+
+class LabCatalog:
+    """Index of every lab in a logfile, built in one pass over the logfile.
+
+    The logfile's rows are reordered so that each lab's rows are next to each other,
+    keeping labs in the order they first appear and rows in their original order within a lab.
+    A lab's rows can then be sliced out without searching the whole logfile.
+
+    Attributes:
+        logfile (DataFrame): The log of submissions, with rows grouped by lab. Row labels are unchanged.
+        labs (dict[float, LabInfo]): Summary of each lab, keyed by lab ID, in order of first appearance.
+    """
+
+    def __init__(self, logfile: DataFrame) -> None:
+        lab_order, _ = pd.factorize(logfile['content_section'])
+        logfile = logfile.iloc[np.argsort(lab_order, kind='stable')]
+        positions = np.arange(len(logfile))
+        is_student = logfile['user_id'] != -1
+        summary = (
+            logfile.assign(
+                position=positions,
+                student_id=logfile['user_id'].where(is_student),
+                is_submitted=logfile['is_submission'] == 1,
+            )
+            .groupby('content_section', observed=True, sort=False)
+            .agg(
+                caption=('caption', 'first'),
+                crid=('lab_id', 'first'),
+                start=('position', 'min'),
+                stop=('position', 'max'),
+                num_students=('student_id', 'nunique'),
+                num_submissions=('is_submitted', 'sum'),
+            )
+        )
+
+        self.logfile = logfile
+        self.labs = {}
+        for lab in summary.itertuples():
+            self.labs[lab.Index] = LabInfo(
+                lab_id=lab.Index,
+                caption=lab.caption,
+                crid=int(lab.crid),
+                start=int(lab.start),
+                stop=int(lab.stop) + 1,
+                num_students=int(lab.num_students),
+                num_submissions=int(lab.num_submissions),
+            )
+
+    def __contains__(self, lab_id: float) -> bool:
+        return lab_id in self.labs
+
+    def __iter__(self):
+        return iter(self.labs)
+
+    def __len__(self) -> int:
+        return len(self.labs)
+
+    def __getitem__(self, lab_id: float) -> LabInfo:
+        return self.labs[lab_id]
+
+    def rows(self, lab_id: float) -> DataFrame:
+        """Returns all rows of the logfile for a lab."""
+        lab = self.labs[lab_id]
+        return self.logfile.iloc[lab.start : lab.stop]
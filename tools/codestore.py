@@ -0,0 +1,508 @@
+"""Packed store for downloaded student code.
+
+Usage:
+    python -m tools.codestore stats [--dir downloads]
+    python -m tools.codestore evict --max-size 500M [--dir downloads]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import socket
+import threading
+import time
+import zlib
+
+from tools.filelock import FileLock
+from tools.manifest import write_atomic
+
+# An in-flight marker older than this belongs to a download that's stuck or was abandoned, in seconds
+DEFAULT_STALE_AFTER = 10 * 60
+# Eviction shrinks the cache to this fraction of its budget, so it doesn't need to evict again on the next run
+EVICTION_TARGET = 0.9
+ZLIB = 'z'  # Codec of code stored compressed with zlib. Uncompressed code has no codec.
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3}
+
+
+class CodeStore:
+    """Packed, content-addressed store for downloaded student code, safe to share between PBA processes.
+
+    All code lives in one append-only pack file, read through a memory map.
+    An index file (`<name>.idx`) has one line per submission: `key <TAB> digest <TAB> offset <TAB> length`,
+    plus `<TAB> z` if the code is compressed. Code is stored once per unique content (SHA-1 digest of the code),
+    so identical resubmissions share their bytes.
+
+    Code is flushed to the pack before its index line is written, so the index never points at missing bytes.
+    If PBA is interrupted mid-write, the torn index line and any unindexed bytes in the pack are ignored.
+
+    Several processes (e.g. TAs running PBA on one shared machine) can use the same store at once:
+    - Writes hold an exclusive file lock (`<name>.lock`), so appends never interleave.
+    - Each process reads index lines appended by others when it can't find a key.
+    - A process claims a submission before downloading it, by creating a marker file in `inflight/`.
+      Others wait for that download to land in the store instead of starting their own.
+
+    The store can be kept under a byte budget with `evict`, which drops the least recently used submissions.
+    Eviction writes a new pack (`<name>-<id>.pack`) and then atomically replaces the index,
+    whose first line (`#pack <file>`) names the pack it points into. Other processes notice the new index and
+    reload it. Each run's hits, misses and last-used times are saved by `close`.
+
+    Attributes:
+        directory (str): The folder with the store's files.
+        name (str): The prefix of the store's files.
+        pack_path (str): The pack file with everyone's code, back to back.
+        index_path (str): The index file.
+        inflight_dir (str): The folder of markers for submissions being downloaded right now.
+        stale_after (float): Markers older than this many seconds are ignored and removed.
+        compress (bool): If True, new code is compressed with zlib. Code is read back either way.
+        hits (int): Lookups this run that found code.
+        misses (int): Lookups this run that didn't.
+        evictions (int): Submissions evicted this run.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: str = 'code',
+        stale_after: float = DEFAULT_STALE_AFTER,
+        compress: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.name = name
+        self.index_path = os.path.join(directory, name + '.idx')
+        self.inflight_dir = os.path.join(directory, 'inflight')
+        self.stale_after = stale_after
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.inflight_dir, exist_ok=True)
+        self._lru_path = os.path.join(directory, name + '.lru')
+        self._stats_path = os.path.join(directory, name + '.stats.json')
+        self._lock = FileLock(os.path.join(directory, name + '.lock'))
+        self._read_lock = threading.RLock()  # Held while reading the index or the pack it points into
+        self._map_lock = threading.Lock()
+        self._pack = self._pack_reader = self._index = self._index_reader = None
+        self._touched = set()  # Keys read or written this run
+        with self._lock:
+            with open(self.index_path, 'ab') as index:
+                if index.tell() > 0:
+                    with open(self.index_path, 'rb') as file:
+                        file.seek(-1, os.SEEK_END)
+                        if file.read(1) != b'\n':  # The last writer was interrupted. Don't append to its torn line.
+                            index.write(b'\n')
+            self._open()
+            for path in glob.glob(os.path.join(glob.escape(directory), f'{glob.escape(name)}*.pack')):
+                if os.path.abspath(path) != os.path.abspath(self.pack_path):
+                    remove_quietly(path)  # Left behind by an eviction
+
+    def __enter__(self) -> 'CodeStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (self.refresh() and key in self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def close(self) -> None:
+        """Saves this run's statistics and last-used times, then closes the store's files."""
+        with self._lock:
+            self._save_usage()
+        with self._read_lock, self._map_lock:
+            self._mmap = None
+            self._pack.close()
+            self._pack_reader.close()
+            self._index.close()
+            self._index_reader.close()
+        self._lock.close()
+
+    def refresh(self) -> bool:
+        """Reads index lines appended since the last refresh, e.g. by other processes.
+
+        Reloads the whole index if another process replaced it while evicting.
+
+        Returns:
+            bool: True if any new lines were read.
+        """
+        with self._read_lock:
+            if self._replaced():
+                with self._map_lock:
+                    self._open()
+                return True
+            return self._read_new_lines()
+
+    def get(self, key: str) -> str | None:
+        """Returns the code stored for a submission, or None if there isn't any.
+
+        Args:
+            key (str): The submission's key, from `submission_key`.
+
+        Returns:
+            str | None: The code.
+        """
+        with self._read_lock:  # So an eviction in another thread can't swap the pack between lookup and read
+            entry = self._entries.get(key)
+            if entry is None and self.refresh():
+                entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            data = self._read(entry)
+        self.hits += 1
+        self._touched.add(key)
+        return data.decode('utf-8', errors='replace')
+
+    def put(self, key: str, code: str) -> None:
+        """Stores the code for a submission. Code already in the store isn't written again.
+
+        Args:
+            key (str): The submission's key, from `submission_key`.
+            code (str): The code.
+        """
+        data = code.encode('utf-8', errors='replace')
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            self.refresh()  # Another process may have stored the same code, or replaced the index
+            blob = self._blobs.get(digest)
+            if blob is None:
+                codec = ''
+                if self.compress:
+                    data, codec = zlib.compress(data), ZLIB
+                offset = os.fstat(self._pack.fileno()).st_size  # Other processes append too
+                self._pack.write(data)
+                self._pack.flush()
+                blob = (offset, len(data), codec)
+            self._index.write(format_entry(key, digest, *blob).encode())
+            self._index.flush()
+            self.refresh()
+        self._touched.add(key)
+
+    def evict(self, max_bytes: int) -> int:
+        """Drops the least recently used submissions until the store fits in `max_bytes`.
+
+        Does nothing while the pack file is within budget. Otherwise shrinks it to `EVICTION_TARGET` of the budget,
+        also dropping bytes no submission points to any more.
+
+        Args:
+            max_bytes (int): The most bytes the pack file may take up.
+
+        Returns:
+            int: The number of submissions evicted.
+        """
+        with self._lock:
+            self.refresh()
+            if os.path.getsize(self.pack_path) <= max_bytes:
+                return 0
+            last_used = self._load_last_used()
+            now = time.time()
+            last_used.update(dict.fromkeys(self._touched, now))
+
+            refs = {}  # digest -> number of keys that point to it
+            for key, digest in self._digests.items():
+                refs[digest] = refs.get(digest, 0) + 1
+            live_bytes = sum(self._blobs[digest][1] for digest in refs)
+            keep = dict(self._digests)
+            for key in sorted(keep, key=lambda key: last_used.get(key, 0)):
+                if live_bytes <= max_bytes * EVICTION_TARGET:
+                    break
+                digest = keep.pop(key)
+                refs[digest] -= 1
+                if refs[digest] == 0:
+                    live_bytes -= self._blobs[digest][1]
+            evicted = len(self._digests) - len(keep)
+            try:
+                self._rewrite(keep)
+            except PermissionError:  # On Windows, while another process has the index open
+                return 0
+            self.evictions += evicted
+            self._save_usage()
+        return evicted
+
+    def stats(self) -> dict:
+        """Returns statistics about the store, including hits, misses and evictions from every run so far."""
+        with self._lock:
+            self.refresh()
+            totals = self._load_stats()
+        for field in ('hits', 'misses', 'evictions'):
+            totals[field] += getattr(self, field)
+        lookups = totals['hits'] + totals['misses']
+        return {
+            'pack_bytes': os.path.getsize(self.pack_path),
+            'index_bytes': os.path.getsize(self.index_path),
+            'live_bytes': sum(length for _, length, _ in self._blobs.values()),
+            'entries': len(self._entries),
+            'unique': len(self._blobs),
+            'compressed': sum(codec == ZLIB for _, _, codec in self._blobs.values()),
+            'hit_ratio': totals['hits'] / lookups if lookups else None,
+            **totals,
+        }
+
+    def claim(self, key: str) -> bool:
+        """Marks a submission as being downloaded by this process, unless someone else already is.
+
+        Args:
+            key (str): The submission's key.
+
+        Returns:
+            bool: True if this process should download the submission and then call `release`.
+        """
+        try:
+            fd = os.open(self._marker_path(key), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as file:
+            file.write(f'{socket.gethostname()} {os.getpid()}')
+        return True
+
+    def release(self, key: str) -> None:
+        """Removes this process's in-flight marker for a submission."""
+        remove_quietly(self._marker_path(key))
+
+    def wait_for(self, key: str, poll_interval: float = 0.2) -> bool:
+        """Waits while another process downloads a submission.
+
+        Args:
+            key (str): The submission's key.
+            poll_interval (float): Seconds between checks.
+
+        Returns:
+            bool: True if the code is now in the store. False if the other download ended without storing code
+                or its marker went stale, so the caller may claim the submission itself.
+        """
+        path = self._marker_path(key)
+        while True:
+            if key in self:
+                return True
+            try:
+                age = time.time() - os.path.getmtime(path)
+            except FileNotFoundError:
+                return key in self
+            if age > self.stale_after or not self._owner_alive(path):
+                self.release(key)
+                return False
+            time.sleep(poll_interval)
+
+    def _open(self) -> None:
+        """(Re)opens the index and the pack it names, and reads the whole index. Must hold the file lock
+        or the read lock."""
+        for file in (self._pack, self._pack_reader, self._index, self._index_reader):
+            if file is not None:
+                file.close()
+        self._entries = {}  # key -> (offset, length, codec)
+        self._digests = {}  # key -> digest
+        self._blobs = {}  # digest -> (offset, length, codec)
+        self._mmap = None
+        self._index = open(self.index_path, 'ab')
+        self._index_reader = open(self.index_path, 'rb')
+        self._inode = os.fstat(self._index.fileno()).st_ino
+        header = self._index_reader.readline()
+        pack_name = self.name + '.pack'
+        if header.startswith(b'#pack ') and header.endswith(b'\n'):
+            pack_name = header[len(b'#pack ') :].decode().strip()
+        else:
+            self._index_reader.seek(0)
+        self.pack_path = os.path.join(self.directory, pack_name)
+        self._pack = open(self.pack_path, 'ab')
+        # Mapped from this descriptor, so the pack stays readable after another process evicts and deletes it
+        self._pack_reader = open(self.pack_path, 'rb')
+        self._read_new_lines()
+
+    def _replaced(self) -> bool:
+        try:
+            return os.stat(self.index_path).st_ino != self._inode
+        except FileNotFoundError:
+            return False
+
+    def _read_new_lines(self) -> bool:
+        data = self._index_reader.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):  # Another process is writing this line right now
+            self._index_reader.seek(end - len(data), os.SEEK_CUR)
+        if end == 0:
+            return False
+        pack_size = os.fstat(self._pack_reader.fileno()).st_size
+        for line in data[:end].decode('utf-8', errors='replace').splitlines():
+            fields = line.split('\t')
+            if len(fields) not in (4, 5) or not fields[2].isdigit() or not fields[3].isdigit():
+                continue
+            key, digest, offset, length = fields[0], fields[1], int(fields[2]), int(fields[3])
+            codec = fields[4] if len(fields) == 5 else ''
+            if offset + length > pack_size:
+                continue
+            self._entries[key] = self._blobs[digest] = (offset, length, codec)
+            self._digests[key] = digest
+        return True
+
+    def _read(self, entry: tuple[int, int, str]) -> bytes:
+        """Returns the (decompressed) bytes of a stored blob."""
+        offset, length, codec = entry
+        if length == 0:
+            return b''
+        view = self._mmap
+        if view is None or offset + length > len(view):
+            view = self._remap()
+        data = view[offset : offset + length]
+        return zlib.decompress(data) if codec == ZLIB else data
+
+    def _rewrite(self, keep: dict[str, str]) -> None:
+        """Writes a new pack with only the blobs of `keep` (key -> digest) and swaps in a new index.
+        Must hold the file lock."""
+        pack_name = f'{self.name}-{os.getpid()}-{time.time_ns()}.pack'
+        new_blobs = {}
+        lines = [f'#pack {pack_name}\n']
+        with open(os.path.join(self.directory, pack_name), 'wb') as pack:
+            for key, digest in keep.items():
+                if digest not in new_blobs:
+                    offset, length, codec = self._blobs[digest]
+                    view = self._remap() if length else b''
+                    new_blobs[digest] = (pack.tell(), length, codec)
+                    pack.write(view[offset : offset + length])
+                lines.append(format_entry(key, digest, *new_blobs[digest]))
+            pack.flush()
+            os.fsync(pack.fileno())
+        old_pack_path = self.pack_path
+        try:
+            write_atomic(self.index_path, ''.join(lines))
+        except BaseException:
+            remove_quietly(os.path.join(self.directory, pack_name))
+            raise
+        with self._read_lock, self._map_lock:
+            self._open()
+        remove_quietly(old_pack_path)  # Other processes may still have it mapped. That's fine except on Windows.
+
+    def _load_last_used(self) -> dict[str, float]:
+        last_used = {}
+        try:
+            with open(self._lru_path, encoding='utf-8') as file:
+                for line in file:
+                    key, _, timestamp = line.rstrip('\n').partition('\t')
+                    try:
+                        last_used[key] = float(timestamp)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return last_used
+
+    def _load_stats(self) -> dict[str, int]:
+        stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        try:
+            with open(self._stats_path, encoding='utf-8') as file:
+                stats.update(json.load(file))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        return stats
+
+    def _save_usage(self) -> None:
+        """Adds this run's hits, misses and evictions to the saved totals, and saves last-used times.
+        Must hold the file lock."""
+        if self._touched or self.evictions:
+            last_used = self._load_last_used()
+            last_used.update(dict.fromkeys(self._touched, time.time()))
+            lines = [f'{key}\t{last_used[key]}\n' for key in self._digests if key in last_used]
+            write_atomic(self._lru_path, ''.join(lines))
+        if self.hits or self.misses or self.evictions:
+            stats = self._load_stats()
+            stats['hits'] += self.hits
+            stats['misses'] += self.misses
+            stats['evictions'] += self.evictions
+            write_atomic(self._stats_path, json.dumps(stats))
+        self._touched = set()
+        self.hits = self.misses = self.evictions = 0
+
+    def _marker_path(self, key: str) -> str:
+        return os.path.join(self.inflight_dir, key)
+
+    def _owner_alive(self, path: str) -> bool:
+        """Returns False only if the marker was made on this machine by a process that has since exited."""
+        try:
+            with open(path) as file:
+                host, pid = file.read().split()
+            if host != socket.gethostname() or os.name == 'nt':
+                return True
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (OSError, ValueError):  # Marker is being written, or we may not signal the owner
+            pass
+        return True
+
+    def _remap(self) -> mmap.mmap:
+        """Maps the pack file again after it grew. Old maps stay valid for readers still using them."""
+        with self._map_lock:
+            size = os.fstat(self._pack_reader.fileno()).st_size
+            if size > (len(self._mmap) if self._mmap is not None else 0):
+                self._mmap = mmap.mmap(self._pack_reader.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+
+
+def format_entry(key: str, digest: str, offset: int, length: int, codec: str) -> str:
+    """Returns the index line for a submission."""
+    return f'{key}\t{digest}\t{offset}\t{length}\t{codec}\n' if codec else f'{key}\t{digest}\t{offset}\t{length}\n'
+
+
+def remove_quietly(path: str) -> None:
+    """Removes a file, ignoring files that are already gone or still open elsewhere (on Windows)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def submission_key(url: str) -> str:
+    """Returns the key of a submission in the code store: its zip file's name without `.zip`.
+
+    Example: 'https://.../63880560-9d25-4ea2-8321-df9cbb0dd278.zip' -> '63880560-9d25-4ea2-8321-df9cbb0dd278'
+    """
+    return url.rsplit('/', 1)[-1].removesuffix('.zip')
+
+
+def parse_size(size: str) -> int:
+    """Returns the number of bytes in a size like '500M', '2G', '800K' or '1048576'."""
+    size = size.strip().upper().removesuffix('B')
+    unit = size[-1:] if size[-1:] in SIZE_UNITS else ''
+    return int(float(size[: len(size) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def format_size(num_bytes: int) -> str:
+    """Returns a human-readable size, e.g. '12.3 MB'."""
+    for unit in ['B', 'KB', 'MB']:
+        if num_bytes < 1024:
+            return f'{num_bytes:.1f} {unit}' if unit != 'B' else f'{num_bytes} B'
+        num_bytes /= 1024
+    return f'{num_bytes:.1f} GB'
+
+
+def print_stats(stats: dict) -> None:
+    hit_ratio = 'n/a' if stats['hit_ratio'] is None else f'{stats["hit_ratio"]:.1%}'
+    print(f'Size on disk: {format_size(stats["pack_bytes"] + stats["index_bytes"])}', end=' ')
+    print(f'(code {format_size(stats["pack_bytes"])}, index {format_size(stats["index_bytes"])})')
+    print(f'Live code: {format_size(stats["live_bytes"])}')
+    print(f'Entries: {stats["entries"]} ({stats["unique"]} unique, {stats["compressed"]} compressed)')
+    print(f'Hit ratio: {hit_ratio} ({stats["hits"]} hits, {stats["misses"]} misses)')
+    print(f'Evictions: {stats["evictions"]}')
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect or shrink PBA's downloaded code cache.")
+    parser.add_argument('--dir', default='downloads', help="The download folder. Default: 'downloads'")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='Show size, entry count, hit ratio and evictions')
+    evict = commands.add_parser('evict', help='Evict least recently used code until the cache fits in a size')
+    evict.add_argument('--max-size', required=True, type=parse_size, help='e.g. 500M or 2G')
+    args = parser.parse_args(argv)
+
+    with CodeStore(args.dir) as store:
+        if args.command == 'evict':
+            print(f'Evicted {store.evict(args.max_size)} submissions')
+        print_stats(store.stats())
+
+
+if __name__ == '__main__':
+    main()
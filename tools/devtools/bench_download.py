@@ -0,0 +1,162 @@
+"""Compare code download throughput of the pooled Downloader against one HTTP session per URL,
+and warm-cache reads from the code store against one `.cpp` file per submission.
+
+Usage:
+    python -m tools.devtools.bench_download [--urls N] [--latency MS] [--workers N] [--cached N]
+
+Serves generated submission zips from a local HTTP server, so no network access is needed.
+Each strategy downloads into its own empty temporary folder, so nothing is read from cache.
+"""
+
+import argparse
+import io
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from urllib3 import Retry
+
+from tools.codestore import CodeStore
+from tools.downloader import DEFAULT_WORKERS, Downloader
+
+CODE = '#include <iostream>\nusing namespace std;\n\nint main() {\n    cout << "Hello" << endl;\n    return 0;\n}\n'
+
+
+def make_zip(code: str) -> bytes:
+    """Returns the bytes of a zip file holding `code` as main.cpp, like zyBooks submissions."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zfile:
+        zfile.writestr('main.cpp', code)
+    return buffer.getvalue()
+
+
+class SubmissionServer(ThreadingHTTPServer):
+    """Local stand-in for the zyBooks file server. Counts the connections it accepts."""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float) -> None:
+        super().__init__(('127.0.0.1', 0), SubmissionHandler)
+        self.latency = latency
+        self.body = make_zip(CODE * 20)
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class SubmissionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+    disable_nagle_algorithm = True  # Headers and body are sent separately; don't wait for the client's delayed ACK
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self) -> None:  # noqa: N802
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        self.wfile.write(self.server.body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def fetch_with_new_session(url: str, download_dir: str) -> tuple[str, str]:
+    """How code was downloaded before the pooled Downloader: a new session, retry policy and adapter per URL."""
+    retry_strategy = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    response = session.get(url)
+    zfile = zipfile.ZipFile(io.BytesIO(response.content))
+    result = zfile.open(zfile.namelist()[0], 'r').read().decode('utf-8')
+    with open(os.path.join(download_dir, url.split('/')[-1] + '.cpp'), 'w', encoding='utf-8') as file:
+        file.write(result)
+    return (url, result)
+
+
+def bench_new_session(urls: list[str], workers: int) -> None:
+    with tempfile.TemporaryDirectory() as download_dir:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda url: fetch_with_new_session(url, download_dir), urls))
+
+
+def bench_pooled(urls: list[str], workers: int) -> None:
+    with tempfile.TemporaryDirectory() as download_dir:
+        with Downloader(max_workers=workers, download_dir=download_dir, initial_workers=workers) as downloader:
+            downloader.fetch_all(urls, desc='Pooled downloader')
+
+
+def bench_warm_cache(num_cached: int) -> list[tuple[str, float]]:
+    """Times reading `num_cached` cached submissions from `.cpp` files and from the code store."""
+    urls = [f'https://example.com/{i:08d}-submission.zip' for i in range(num_cached)]
+    codes = [CODE.replace('Hello', f'Hello {i}') for i in range(num_cached)]  # Unique, so nothing is shared
+    results = []
+    with tempfile.TemporaryDirectory() as download_dir:
+        for url, code in zip(urls, codes):
+            with open(os.path.join(download_dir, url.split('/')[-1].strip('.zip') + '.cpp'), 'w') as file:
+                file.write(code)
+        start = time.perf_counter()
+        for url in urls:
+            path = os.path.join(download_dir, url.split('/')[-1].strip('.zip') + '.cpp')
+            if os.path.isfile(path):
+                with open(path, 'r', errors='replace') as file:
+                    file.read()
+        results.append(('One file per URL', time.perf_counter() - start))
+
+    with tempfile.TemporaryDirectory() as download_dir:
+        with CodeStore(download_dir) as store:
+            for url, code in zip(urls, codes):
+                store.put(url.split('/')[-1].removesuffix('.zip'), code)
+        start = time.perf_counter()
+        with Downloader(download_dir=download_dir) as downloader:  # Includes loading the index
+            downloader.fetch_all(urls)
+        results.append(('Code store', time.perf_counter() - start))
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark code downloads against a local HTTP server.')
+    parser.add_argument('--urls', type=int, default=2000, help='Number of submissions to download. Default: 2000')
+    parser.add_argument('--latency', type=float, default=5, help='Server delay per request in ms. Default: 5')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Download threads. Default: as PBA')
+    parser.add_argument('--cached', type=int, default=50000, help='Cached submissions to read. Default: 50000')
+    args = parser.parse_args(argv)
+
+    server = SubmissionServer(args.latency / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f'{server.url}/{i:08d}-submission.zip' for i in range(args.urls)]
+
+    results = []
+    for name, bench in [('New session per URL', bench_new_session), ('Pooled downloader', bench_pooled)]:
+        server.connections = 0
+        start = time.perf_counter()
+        bench(urls, args.workers)
+        elapsed = time.perf_counter() - start
+        results.append((name, elapsed, server.connections))
+    server.shutdown()
+
+    print(f'\n{args.urls} downloads, {args.workers} workers, {args.latency:g} ms server latency')
+    for name, elapsed, connections in results:
+        print(f'{name:<20} {elapsed:7.2f} s  {args.urls / elapsed:8.0f} downloads/s  {connections:6} connections')
+
+    print(f'\n{args.cached} cached submissions')
+    for name, elapsed in bench_warm_cache(args.cached):
+        print(f'{name:<20} {elapsed:7.2f} s  {args.cached / elapsed:8.0f} reads/s')
+
+
+if __name__ == '__main__':
+    main()
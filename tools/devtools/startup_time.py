@@ -0,0 +1,73 @@
+"""Measure how long it takes to import PBA's entry points.
+
+Usage:
+    python -m tools.devtools.startup_time [module ...] [--runs N] [--top N]
+
+Each module is imported in a fresh Python process with `-X importtime`.
+Prints the median wall time over all runs and the slowest imports from the last run.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ['main', 'batch', 'tools.anomaly', 'tools.hardcoding']
+
+
+def time_import(module: str) -> tuple[float, list[tuple[int, str]]]:
+    """Imports a module in a new Python process and returns the wall time and per-module import times.
+
+    Args:
+        module (str): The module to import, e.g. 'main'.
+
+    Returns:
+        tuple[float, list[tuple[int, str]]]: The wall time in seconds,
+            and (cumulative microseconds, module name) for every module imported.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall_time = time.perf_counter() - start
+
+    # Lines look like: `import time:       237 |      25075 |       importlib.resources`
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        imports.append((int(cumulative), name.strip()))
+    return wall_time, imports
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description='Measure the import time of PBA modules.')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help='Modules to import')
+    parser.add_argument('--runs', type=int, default=5, help='Imports per module. Default: 5')
+    parser.add_argument('--top', type=int, default=5, help='Slowest imports to show per module. Default: 5')
+    args = parser.parse_args(argv)
+
+    baseline_runs = [time_import('sys') for _ in range(args.runs)]
+    baseline = statistics.median(wall_time for wall_time, _ in baseline_runs)
+    startup_modules = {name for _, name in baseline_runs[-1][1]}  # Imported by Python itself, e.g. `site`
+    print(f'Python interpreter startup: {baseline * 1000:.0f} ms\n')
+    for module in args.modules:
+        wall_times = []
+        for _ in range(args.runs):
+            wall_time, imports = time_import(module)
+            wall_times.append(wall_time)
+        median = statistics.median(wall_times)
+        print(f'import {module}: {median * 1000:.0f} ms ({(median - baseline) * 1000:.0f} ms over startup)')
+        imports = [(cumulative, name) for cumulative, name in imports if name not in startup_modules]
+        for cumulative, name in sorted(imports, reverse=True)[: args.top]:
+            print(f'    {cumulative / 1000:8.1f} ms  {name}')
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+import os
+import time
+import zipfile
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from urllib3 import Retry
+
+from tools.codestore import CodeStore, submission_key
+from tools.manifest import EMPTY, FAILED, OK, PENDING, DownloadManifest
+from tools.telemetry import DownloadTelemetry
+from tools.throttle import THROTTLE_STATUSES, AdaptiveLimiter, parse_retry_after
+from tools.zips import extract_code
+
+# Same as ThreadPoolExecutor's default number of workers. Downloads start at this concurrency.
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# The most downloads in flight at once, if the server keeps up
+DEFAULT_MAX_WORKERS = 64
+# Failed and empty downloads aren't tried again for this long, in seconds
+DEFAULT_FAILURE_TTL = 24 * 60 * 60
+
+
+class Not200Error(Exception):
+    """Raise this custom exception if we receive a "valid" response from the server, but no data is present"""
+
+    pass
+
+
+class DownloadPlan:
+    """The unique URLs to fetch, split by whether their code is already in the code store.
+
+    Attributes:
+        cached (list[str]): URLs whose code is read from the code store.
+        missing (list[str]): URLs whose code must be downloaded.
+        skipped (list[str]): URLs that failed recently, so they aren't tried again yet.
+    """
+
+    def __init__(self, cached: list[str], missing: list[str], skipped: list[str]) -> None:
+        self.cached = cached
+        self.missing = missing
+        self.skipped = skipped
+
+    def __len__(self) -> int:
+        return len(self.cached) + len(self.missing) + len(self.skipped)
+
+
+class Downloader:
+    """Downloads student code over one pooled HTTP session shared by every worker thread.
+
+    The session keeps one connection per worker alive between requests,
+    so thousands of downloads reuse a few connections (and TLS sessions) instead of opening one each.
+
+    How many downloads are in flight adapts to the server (see `AdaptiveLimiter`):
+    it grows while latency stays flat and backs off when the server answers 429 or 5xx.
+    Throttled requests are retried here rather than inside urllib3, so the limiter sees every one.
+
+    Attributes:
+        max_workers (int): The most downloads in flight at once, and the size of the connection pool.
+        download_dir (str): The folder with the code store and the manifest.
+        store (CodeStore): Downloaded code, packed into `code.pack` in the download folder.
+            Code is only indexed once it's fully written, so an interrupted run never leaves partial code behind.
+        max_cache_bytes (int | None): If set, the least recently used code is evicted from the store
+            when the downloader is closed, until the store fits in this many bytes.
+        manifest (DownloadManifest): The state of every download, in `manifest.jsonl` in the download folder.
+        failure_ttl (float): Failed and empty downloads aren't tried again until this many seconds have passed.
+            Their code is None, so tools skip them.
+        retries (int): How many times a throttled request is retried.
+        backoff_factor (float): Retries wait `backoff_factor * 2 ** attempt` seconds, unless the server sent
+            `Retry-After`.
+        limiter (AdaptiveLimiter): Limits the downloads in flight. Kept across `stream` calls.
+        telemetry (DownloadTelemetry): Latencies, bytes, retries, errors and cache hits of this run.
+        telemetry_path (str): Where `close` writes the run's telemetry as JSON. Defaults to `telemetry.json`
+            in the download folder.
+        session (requests.Session): The HTTP session shared by all downloads.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        download_dir: str = 'downloads',
+        initial_workers: int = DEFAULT_WORKERS,
+        failure_ttl: float = DEFAULT_FAILURE_TTL,
+        max_cache_bytes: int | None = None,
+        compress_cache: bool = False,
+        retries: int = 3,
+        backoff_factor: float = 1,
+        telemetry_path: str | None = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.download_dir = download_dir
+        os.makedirs(download_dir, exist_ok=True)
+        self.manifest = DownloadManifest(os.path.join(download_dir, 'manifest.jsonl'))
+        self.store = CodeStore(download_dir, compress=compress_cache)
+        self.max_cache_bytes = max_cache_bytes
+        self._migrate_legacy_files()
+        self.failure_ttl = failure_ttl
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.limiter = AdaptiveLimiter(initial=initial_workers, max_limit=max_workers)
+        self.telemetry = DownloadTelemetry()
+        self.telemetry_path = telemetry_path or os.path.join(download_dir, 'telemetry.json')
+        self._downloading = set()  # URLs this process is downloading right now, e.g. in the background
+        # Only connection errors are retried by urllib3. Throttled responses are retried in `get`.
+        retry_strategy = Retry(total=retries, backoff_factor=backoff_factor, respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_maxsize=max_workers, pool_block=True, max_retries=retry_strategy)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __enter__(self) -> 'Downloader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes every pooled connection, the code store and the manifest, evicting code over budget first.
+
+        If anything was fetched, prints the run's telemetry and writes it to `telemetry_path`.
+        """
+        self.session.close()
+        telemetry = self.telemetry
+        if telemetry.requests or telemetry.cache_hits or telemetry.cache_misses or telemetry.skipped:
+            print(telemetry.summary())
+            concurrency = {'final': self.limiter.limit, 'peak': self.limiter.peak, 'throttled': self.limiter.throttled}
+            telemetry.write(self.telemetry_path, concurrency=concurrency)
+            print(f'Wrote download telemetry to {self.telemetry_path}')
+        if self.max_cache_bytes is not None:
+            evicted = self.store.evict(self.max_cache_bytes)
+            if evicted:
+                print(f'Evicted {evicted} least recently used submissions from the download cache')
+        self.store.close()
+        self.manifest.close()
+
+    def _migrate_legacy_files(self) -> None:
+        """Moves code cached as one `.cpp` file per submission, by older versions of PBA, into the code store.
+
+        Those files were named with `url.split('/')[-1].strip('.zip')`, which strips characters rather than
+        the suffix, so the manifest is used to find each file's URL and its correct key where possible.
+        Files from downloads that never finished are deleted.
+        """
+        keys = {}  # Legacy file name -> correct key, or None if the download never finished
+        for url, state in self.manifest.states.items():
+            keys[url.split('/')[-1].strip('.zip') + '.cpp'] = None if state == PENDING else submission_key(url)
+        num_migrated = 0
+        for entry in os.scandir(self.download_dir):
+            if not entry.name.endswith('.cpp') or not entry.is_file():
+                continue
+            key = keys.get(entry.name, entry.name.removesuffix('.cpp'))
+            try:
+                if key is not None and key not in self.store:
+                    with open(entry.path, 'r', errors='replace') as file:
+                        self.store.put(key, file.read())
+                    num_migrated += 1
+                os.remove(entry.path)
+            except FileNotFoundError:  # Another PBA process is migrating the same folder
+                continue
+        if num_migrated:
+            print(f'Moved {num_migrated} downloaded files into {self.store.pack_path}')
+
+    def is_cached(self, url: str) -> bool:
+        """Returns True if the code from `url` was fully downloaded before."""
+        return submission_key(url) in self.store
+
+    def failed_recently(self, url: str) -> bool:
+        """Returns True if the download from `url` failed or was empty less than `failure_ttl` seconds ago."""
+        return self.manifest.failed_since(url, time.time() - self.failure_ttl)
+
+    def plan(self, urls: Iterable[str]) -> DownloadPlan:
+        """De-duplicates URLs and splits them into cached, missing and skipped, without downloading anything.
+
+        Args:
+            urls (Iterable[str]): URLs to fetch, possibly repeated or missing (NaN).
+
+        Returns:
+            DownloadPlan: The unique URLs, in order of first appearance.
+        """
+        cached = []
+        missing = []
+        skipped = []
+        for url in dict.fromkeys(urls):
+            if not isinstance(url, str):
+                continue
+            if self.is_cached(url):
+                cached.append(url)
+            elif self.failed_recently(url):
+                skipped.append(url)
+            else:
+                missing.append(url)
+        return DownloadPlan(cached, missing, skipped)
+
+    def get(self, url: str) -> requests.Response:
+        """Sends a GET request once the limiter allows it, retrying while the server throttles us.
+
+        Args:
+            url (str): The URL to request.
+
+        Returns:
+            requests.Response: The response. Its status is still 429 or 5xx if every retry was throttled.
+        """
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                response = self.session.get(url)
+            except Exception as error:
+                self.limiter.release()
+                self.telemetry.record_request(start, None, retry=attempt > 0)
+                self.telemetry.record_error(type(error).__name__)
+                raise
+            self.telemetry.record_request(start, response.status_code, len(response.content), retry=attempt > 0)
+            if response.status_code >= 400:
+                self.telemetry.record_error(f'HTTP {response.status_code}')
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self.limiter.release(time.monotonic() - start, response.status_code, retry_after)
+            if response.status_code not in THROTTLE_STATUSES or attempt == self.retries:
+                break
+            if retry_after is None:  # Otherwise the limiter holds every request until then
+                time.sleep(self.backoff_factor * 2**attempt)
+        return response
+
+    def fetch(self, url: str) -> tuple[str, str | None]:
+        """Downloads student code from a given URL and returns the code with the URL.
+
+        Code is read from the code store if it was downloaded before.
+        If another PBA process sharing the download folder is downloading it right now, waits for that instead.
+        If the download fails, or failed less than `failure_ttl` seconds ago, the code is None
+        and the reason is kept in the manifest.
+
+        Args:
+            url (str): The URL from which to download the code.
+
+        Returns:
+            tuple[str, str | None]: A tuple containing the URL and the downloaded code.
+        """
+        key = submission_key(url)
+        code = self.store.get(key)
+        if code is not None:
+            self.telemetry.record_fetch(key, hit=True)
+            return (url, code)
+        if self.failed_recently(url):
+            self.telemetry.record_skip(key)
+            return (url, None)
+        self.telemetry.record_fetch(key, hit=False)  # Downloaded here, or by the thread or process already on it
+        while not self.store.claim(key):
+            if self.store.wait_for(key):
+                return (url, self.store.get(key))
+            self.manifest.refresh()  # The other process may have recorded a failure
+            if self.failed_recently(url):
+                return (url, None)
+        self._downloading.add(url)
+        try:
+            return self._download(url)
+        finally:
+            self._downloading.discard(url)
+            self.store.release(key)
+
+    def _download(self, url: str) -> tuple[str, str | None]:
+        """Downloads code that this process has claimed in the code store."""
+        if self.is_cached(url):  # Another process finished it just before we claimed it
+            return (url, self.store.get(submission_key(url)))
+        if self.failed_recently(url):
+            return (url, None)
+
+        self.manifest.record(url, PENDING)
+        try:
+            response = self.get(url)
+            if response.status_code in THROTTLE_STATUSES:
+                raise ConnectionError
+            if response.status_code >= 400:  # e.g. 403 or 404, with an HTML error page
+                self.manifest.record(url, FAILED, f'HTTP {response.status_code} while retrieving student code.')
+                return (url, None)
+            if response.status_code > 200 and response.status_code < 300:
+                raise Not200Error
+            result = extract_code(response.content)
+            if result is None:  # A zip with no files in it
+                raise Not200Error
+            self.store.put(submission_key(url), result)
+            self.manifest.record(url, OK)
+            return (url, result)
+        except Not200Error:
+            self.telemetry.record_error('empty')
+            self.manifest.record(url, EMPTY, 'Retrieved a response, but no data was received.')
+            return (url, None)
+        except ConnectionError:
+            self.manifest.record(url, FAILED, 'Max number of retries met while retrieving student code.')
+            return (url, None)
+        except requests.RequestException as error:  # e.g. refused connections and timeouts, after urllib3's retries
+            self.manifest.record(url, FAILED, f'{type(error).__name__} while retrieving student code.')
+            return (url, None)
+        except (zipfile.BadZipFile, UnicodeDecodeError) as error:
+            self.telemetry.record_error(type(error).__name__)
+            self.manifest.record(url, FAILED, f'Retrieved a response, but it is not a zip of UTF-8 code ({error}).')
+            return (url, None)
+
+    def stream(
+        self, urls: Iterable[str], desc: str = 'Downloading student code', max_in_flight: int | None = None
+    ) -> Iterator[tuple[str, str | None]]:
+        """Yields the code for every unique URL as soon as it's ready, downloading only what isn't cached.
+
+        URLs that failed recently are yielded first, then cached code, then downloads in order of completion.
+        Downloads run on `max_workers` threads, as many at once as the limiter allows, showing a progress bar
+        and the current concurrency. At most `max_in_flight` URLs are handed to the threads at once,
+        so memory stays flat however many URLs there are: the caller keeps only the code it needs.
+        If interrupted (e.g. Ctrl-C), or if the caller stops iterating, downloads in flight finish
+        and the rest are cancelled; the next call resumes with whatever is left.
+
+        Args:
+            urls (Iterable[str]): URLs from which to fetch code. Repeated and missing (NaN) URLs are fine.
+            desc (str): The label for the progress bar.
+            max_in_flight (int | None): The most URLs handed to the threads at once. Defaults to `2 * max_workers`.
+
+        Yields:
+            tuple[str, str | None]: Each unique URL and its code, or None if it couldn't be downloaded.
+
+        Note:
+            This is the fastest way to download code submissions that we found.
+            We tried AsyncIO but it turned out to be slower than multithreading.
+        """
+        plan = self.plan(urls)
+        if plan.skipped:
+            hours = self.failure_ttl / 3600
+            print(f'Skipping {len(plan.skipped)} downloads that failed in the last {hours:g} hours')
+        for url in plan.skipped:
+            self.telemetry.record_skip(submission_key(url))
+            yield (url, None)
+        for url in plan.cached:
+            yield self.fetch(url)
+        if not plan.missing:
+            return
+
+        previous = self.manifest.summary(url for url in plan.missing if url not in self._downloading)
+        if previous:
+            print(f'Resuming downloads: {len(plan.cached)} already downloaded, last run left {previous}')
+        missing = iter(plan.missing)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            tasks = {executor.submit(self.fetch, url) for url in islice(missing, max_in_flight or 2 * self.max_workers)}
+            with tqdm(total=len(plan.missing), desc=desc) as pbar:
+                while tasks:
+                    done, tasks = wait(tasks, return_when=FIRST_COMPLETED)
+                    tasks.update(executor.submit(self.fetch, url) for url in islice(missing, len(done)))
+                    for task in done:
+                        pbar.set_postfix(concurrency=self.limiter.limit, refresh=False)
+                        pbar.update(1)
+                        yield task.result()
+        except BaseException:  # Including GeneratorExit, when the caller stops iterating
+            # Wait for the downloads in flight, so they're stored before the caller closes the store
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown()
+        print(f'Downloads: {self.manifest.summary(plan.missing)}')
+        print(self.limiter.summary())
+
+    def fetch_all(self, urls: Iterable[str], desc: str = 'Downloading student code') -> dict[str, str | None]:
+        """Fetches the code for every unique URL, downloading only what isn't cached. See `stream`.
+
+        Args:
+            urls (Iterable[str]): URLs from which to fetch code. Repeated and missing (NaN) URLs are fine.
+            desc (str): The label for the progress bar.
+
+        Returns:
+            dict[str, str | None]: The code for each unique URL, or None if it couldn't be downloaded.
+        """
+        return dict(self.stream(urls, desc))
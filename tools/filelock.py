@@ -0,0 +1,64 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Exclusive lock shared by every thread and every PBA process that uses the same lock file.
+
+    Uses `flock` on Linux and macOS, and `msvcrt.locking` on Windows. The lock is released by the OS
+    if the process holding it dies, so a crashed PBA never leaves the lock stuck.
+
+    Attributes:
+        path (str): The lock file. It's created if needed and never deleted.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._thread_lock = threading.Lock()  # Threads in one process share the lock file's descriptor
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def acquire(self) -> None:
+        """Blocks until this thread holds the lock."""
+        self._thread_lock.acquire()
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                while True:
+                    try:
+                        msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # Gave up after 10 seconds, keep waiting
+                        continue
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self) -> None:
+        """Releases the lock."""
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            self._thread_lock.release()
+
+    def close(self) -> None:
+        """Closes the lock file."""
+        os.close(self._fd)
@@ -269,13 +269,17 @@ def hardcoding_analysis_1(
     """
     output = {}
     for lab in selected_labs:
+        scores = {}  # Code -> its hardcoding score for this lab, so identical code is only scored once
         for user_id in data:
             if user_id not in output:
                 output[user_id] = {}
             if lab in data[user_id]:
                 code = get_code_with_max_score(user_id, lab, data)
-                hardcode_score = get_hardcode_score_with_soln(code, testcases[lab], solution_code)
-                output[user_id][lab] = [hardcode_score, code]
+                if code is None:  # Code couldn't be downloaded
+                    continue
+                if code not in scores:
+                    scores[code] = get_hardcode_score_with_soln(code, testcases[lab], solution_code)
+                output[user_id][lab] = [scores[code], code]
     return output
 
 
@@ -301,6 +305,7 @@ def hardcoding_analysis_2(data: dict, selected_labs: list[float], testcases: dic
 
     for lab in selected_labs:
         testcase_use_counts = {testcase: 0 for testcase in testcases[lab]}
+        hardcoded = {}  # Code -> whether it hardcodes each testcase, so identical code is only checked once
 
         # Find the testcases that each student hardcodes
         # Also find number of times each testcase is hardcoded
@@ -309,9 +314,13 @@ def hardcoding_analysis_2(data: dict, selected_labs: list[float], testcases: dic
                 output[user_id] = {}
             if lab in data[user_id]:
                 code = get_code_with_max_score(user_id, lab, data)
+                if code is None:  # Code couldn't be downloaded
+                    continue
                 output[user_id][lab] = [0, code, set()]
-                for testcase in testcases[lab]:  # Track num times students hardcode testcases
-                    hardcode_score = is_testcase_hardcoded_in_if(code, testcase)
+                if code not in hardcoded:
+                    hardcoded[code] = [is_testcase_hardcoded_in_if(code, testcase) for testcase in testcases[lab]]
+                # Track num times students hardcode testcases
+                for testcase, hardcode_score in zip(testcases[lab], hardcoded[code]):
                     output[user_id][lab][0] = hardcode_score
                     if hardcode_score > 0:
                         output[user_id][lab][2].add(testcase)
@@ -320,6 +329,8 @@ def hardcoding_analysis_2(data: dict, selected_labs: list[float], testcases: dic
         # If any testcase was hardcoded by most of the class,
         # then don't consider that testcase for hardcoding for anyone
         for user_id in data:
+            if lab not in output[user_id]:
+                continue
             for testcase in testcases[lab]:
                 hardcoded_testcases = output[user_id][lab][2]
                 hardcoding_percentage = testcase_use_counts[testcase] / num_students
@@ -351,17 +362,22 @@ def hardcoding_analysis_3(data: dict, selected_labs: list[float]) -> dict:
     if_literal_threshold = 0.6
     num_students = len(data)
 
+    scores = {}  # Code -> its hardcoding score, so identical code is only scored once
     for lab in selected_labs:
         for user_id in data:
             if user_id not in output:
                 output[user_id] = {}
             if lab in data[user_id]:
                 code = get_code_with_max_score(user_id, lab, data)
-                hardcode_score = has_if_with_literal_and_cout(code)
+                if code is None:  # Code couldn't be downloaded
+                    continue
+                if code not in scores:
+                    scores[code] = has_if_with_literal_and_cout(code)
+                hardcode_score = scores[code]
                 output[user_id][lab] = [hardcode_score, code]
                 if_literal_use_count += hardcode_score
         hardcoding_percentage = if_literal_use_count / num_students
         for user_id in data:
-            if hardcoding_percentage > if_literal_threshold:
+            if hardcoding_percentage > if_literal_threshold and lab in output[user_id]:
                 output[user_id][lab][0] = 0
     return output
@@ -1,6 +1,8 @@
 import difflib
+import functools
 import os
 
+import numpy as np
 import pandas as pd
 from pandas import Timestamp
 
@@ -39,24 +41,39 @@ def run(data: dict) -> dict:
         }
     """
     incdev_data = {}
-    incdev_data_fields = ['incdev_score', 'incdev_score_trail', 'loc_trail', 'time_trail']
     for user_id in data:
         if user_id not in incdev_data:
             incdev_data[user_id] = {}
         for lab_id in data[user_id]:
-            if lab_id not in incdev_data[user_id]:
-                incdev_data[user_id][lab_id] = {}
-                for field in incdev_data_fields:
-                    incdev_data[user_id][lab_id][field] = 0
-            code = get_code_with_max_score(user_id, lab_id, data)
-            incdev_data[user_id][lab_id]['incdev_score'] = assign_inc_dev_score(data[user_id][lab_id])
-            incdev_data[user_id][lab_id]['incdev_score_trail'] = assign_inc_dev_score_trail(data[user_id][lab_id])
-            incdev_data[user_id][lab_id]['loc_trail'] = assign_loc_trail(data[user_id][lab_id])
-            incdev_data[user_id][lab_id]['time_trail'] = assign_time_trail(data[user_id][lab_id])
-            incdev_data[user_id][lab_id]['Highest_code'] = code
+            lab_data = run_lab(data[user_id][lab_id])
+            if lab_data is not None:
+                incdev_data[user_id][lab_id] = lab_data
     return incdev_data
 
 
+def run_lab(lab_runs: list[Submission]) -> dict | None:
+    """Returns the IncDev score and trails for one student's runs for one lab.
+
+    Args:
+        lab_runs (list[Submission]): All of the student's runs for the lab, in order.
+
+    Returns:
+        dict | None: The student's `incdev_score`, `incdev_score_trail`, `loc_trail`, `time_trail`
+            and `Highest_code` for the lab, or None if none of the runs' code was downloaded.
+    """
+    runs = [run for run in lab_runs if run.code is not None]  # Skip code that wasn't downloaded
+    if not runs:
+        return None
+    user_id, lab_id = lab_runs[0].student_id, lab_runs[0].lab_id
+    return {
+        'incdev_score': assign_inc_dev_score(runs),
+        'incdev_score_trail': assign_inc_dev_score_trail(runs),
+        'loc_trail': assign_loc_trail(runs),
+        'time_trail': assign_time_trail(lab_runs),
+        'Highest_code': get_code_with_max_score(user_id, lab_id, {user_id: {lab_id: lab_runs}}),
+    }
+
+
 def assign_inc_dev_score(runs: list[Submission]) -> float:
     """Returns an IncDev score for a particular student and lab.
 
@@ -70,9 +87,7 @@ def assign_inc_dev_score(runs: list[Submission]) -> float:
     prev_lines = 0
 
     for run in runs:
-        # Remove blank lines
-        code = os.linesep.join([s for s in run.code.splitlines() if s.strip()])
-        line_count = len(code.splitlines())
+        line_count = len(run.fingerprints)  # Non-blank lines
 
         # If > 20 new lines added, decrement score
         if line_count - prev_lines > 20:
@@ -112,14 +127,13 @@ def assign_inc_dev_score_trail(runs: list[Submission]) -> str:
     trail = ''
     score = 1
     prev_lines = 0
-    prev_code = ''
+    prev_run = None
 
     for run in runs:
-        code = os.linesep.join([s for s in run.code.splitlines() if s.strip()])
-        line_count = len(code.splitlines())
+        line_count = len(run.fingerprints)
 
-        if prev_code != '':
-            change = get_diff(prev_code, code)
+        if prev_lines > 0:
+            change = get_run_diff(prev_run, run)
             if change > 0.5:
                 trail += '^'
 
@@ -136,7 +150,7 @@ def assign_inc_dev_score_trail(runs: list[Submission]) -> str:
             trail += '(' + str(round(score, 2)) + '), '
 
         prev_lines = line_count
-        prev_code = code
+        prev_run = run
     trail = trail[:-2]
     return trail
 
@@ -159,19 +173,17 @@ def assign_loc_trail(runs: list[Submission]) -> str:
     """
     lines = []
     drastic_change = [0]
-    prev_code = ''
+    prev_run = None
     for run in runs:
-        code = os.linesep.join([s for s in run.code.splitlines() if s.strip()])
-
-        lines.append(len(code.splitlines()))
+        lines.append(len(run.fingerprints))
 
-        if prev_code != '':
-            diff = get_diff(prev_code, code)
+        if prev_run is not None and len(prev_run.fingerprints) > 0:
+            diff = get_run_diff(prev_run, run)
             if diff > 0.7:
                 drastic_change.append(1)
             else:
                 drastic_change.append(0)
-        prev_code = code
+        prev_run = run
 
     relevance_list = [1]
 
@@ -270,9 +282,72 @@ def assign_time_trail(runs: list[Submission]) -> str:
 ##################################################
 
 
+def get_run_diff(prev: Submission, curr: Submission) -> float:
+    """Returns the percent change from one run's code to the next, as `get_diff` calculates it
+    for their code without blank lines.
+
+    Diffs the runs' line fingerprints, and only compares the code itself when `get_line_diff` can't tell.
+
+    Args:
+        prev (Submission): The earlier run. Its code must have at least one non-blank line.
+        curr (Submission): The later run.
+
+    Returns:
+        float: Percent difference between the runs' code.
+    """
+    change = get_line_diff(prev.fingerprints, curr.fingerprints)
+    if change is None:
+        change = get_diff(strip_blank_lines(prev.code), strip_blank_lines(curr.code))
+    return change
+
+
+def get_line_diff(prev: np.ndarray, curr: np.ndarray) -> float | None:
+    """Returns `get_diff`'s percent change between two code samples, calculated from their line fingerprints.
+
+    Differ counts every line of a changed block as added or removed, unless it can pair the line with an equal
+    one in the same block. Blocks only contain equal lines when SequenceMatcher ignores lines that are frequent
+    in long code (e.g. '}'), and pairing those up depends on the text of the lines around them,
+    so then this returns None.
+
+    Args:
+        prev (ndarray): The `line_fingerprints` of the first code sample. Must not be empty.
+        curr (ndarray): The `line_fingerprints` of the second code sample.
+
+    Returns:
+        float | None: Percent difference between code samples, or None if only `get_diff` can tell.
+    """
+    if np.array_equal(prev, curr):
+        return 0.0
+    # Differ compares lines with their line endings, and the last line has none
+    a = prev.tolist()
+    a[-1] = (a[-1],)
+    b = curr.tolist()
+    if b:
+        b[-1] = (b[-1],)
+
+    line_changes = 0
+    matcher = difflib.SequenceMatcher(None, a, b)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        if tag == 'replace' and matcher.bpopular and not set(a[i1:i2]).isdisjoint(b[j1:j2]):
+            return None
+        line_changes += (i2 - i1) + (j2 - j1)
+    return line_changes / len(a)
+
+
+def strip_blank_lines(code: str) -> str:
+    """Returns code without its blank lines."""
+    return os.linesep.join([s for s in code.splitlines() if s.strip()])
+
+
+@functools.lru_cache(maxsize=1024)
 def get_diff(sub1: str, sub2: str) -> float:
     """Returns a percent change between two code samples using difflib's Differ function.
 
+    Results are cached, since both trails diff the same pairs of runs when `get_line_diff` can't.
+    Identical samples (a run repeating the run before it) aren't diffed at all.
+
     Args:
         sub1 (str): The first student code sample.
         sub2 (str): The second student code sample.
@@ -281,6 +356,8 @@ def get_diff(sub1: str, sub2: str) -> float:
         float: Percent difference between code samples.
                Calculated as (lines generated by Differ / total lines in sub2).
     """
+    if sub1 == sub2:
+        return 0.0
     line_changes = 0
     diff = difflib.Differ()
 
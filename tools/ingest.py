@@ -0,0 +1,177 @@
+"""Fill the code store from local submission zips instead of downloading them.
+
+Some courses come with a bulk export of every submission's zip, either as a folder or as one big archive of zips.
+Ingesting the export lets PBA analyze the logfile with no network access: every submission found locally is
+read from the code store, as if it had been downloaded.
+
+Usage:
+    python -m tools.ingest LOGFILE SOURCE [--dir downloads] [--threads N]
+
+SOURCE is a folder of submission zips (searched recursively) or a `.zip` archive of them. Each zip is matched
+to the logfile's rows by its submission ID, the name of the zip in the row's `zip_location`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+import zipfile
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from tools.codestore import CodeStore, submission_key
+from tools.zips import extract_code, is_code_file
+
+
+class LocalZips:
+    """The submission zips in a folder or in an archive of zips, by submission ID.
+
+    Zips are read on several threads at once. Each thread opens its own handle on the archive.
+
+    Attributes:
+        source (str): The folder or archive.
+        paths (dict[str, str]): Each submission ID's zip, as a path in the folder or a member of the archive.
+    """
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.paths = {}
+        self._local = threading.local()
+        self._handles = []
+        self._handles_lock = threading.Lock()
+        if os.path.isdir(source):
+            for directory, _, file_names in os.walk(source):
+                for file_name in file_names:
+                    if file_name.endswith('.zip'):
+                        self.paths.setdefault(submission_key(file_name), os.path.join(directory, file_name))
+        else:
+            with zipfile.ZipFile(source) as archive:
+                for info in archive.infolist():
+                    if info.filename.endswith('.zip') and is_code_file(info):
+                        self.paths.setdefault(submission_key(info.filename), info.filename)
+
+    def __enter__(self) -> LocalZips:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes every thread's handle on the archive."""
+        with self._handles_lock:
+            for handle in self._handles:
+                handle.close()
+            self._handles.clear()
+
+    def read(self, key: str) -> bytes:
+        """Returns the contents of a submission's zip file."""
+        if os.path.isdir(self.source):
+            with open(self.paths[key], 'rb') as file:
+                return file.read()
+        archive = getattr(self._local, 'archive', None)
+        if archive is None:
+            archive = self._local.archive = zipfile.ZipFile(self.source)
+            with self._handles_lock:
+                self._handles.append(archive)
+        return archive.read(self.paths[key])
+
+    def extract(self, key: str) -> tuple[str, str | None]:
+        """Returns a submission's ID and its code. The code is None if the zip is unreadable or empty."""
+        try:
+            return (key, extract_code(self.read(key)))
+        except (zipfile.BadZipFile, UnicodeDecodeError):
+            return (key, None)
+
+
+class IngestSummary:
+    """What `ingest()` found.
+
+    Attributes:
+        ingested (int): Submissions added to the code store.
+        cached (int): Submissions that were already in the code store.
+        unreadable (int): Local zips that were corrupt, empty or not UTF-8.
+        not_found (int): Submissions in the logfile with no local zip. They're downloaded as usual.
+        unmatched (int): Local zips for submissions that aren't in the logfile. They're ignored.
+    """
+
+    def __init__(self) -> None:
+        self.ingested = 0
+        self.cached = 0
+        self.unreadable = 0
+        self.not_found = 0
+        self.unmatched = 0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.ingested} ingested, {self.cached} already cached, {self.unreadable} unreadable, '
+            f'{self.not_found} not found locally, {self.unmatched} local zips not in the logfile'
+        )
+
+
+def ingest(urls: Iterable[str], source: str, store: CodeStore, num_threads: int | None = None) -> IngestSummary:
+    """Reads the code for each URL from a folder or archive of submission zips into the code store.
+
+    Zips are read and decompressed on `num_threads` threads, while this thread writes the code to the store.
+    At most `2 * num_threads` zips are read ahead, so memory stays flat however big the export is.
+
+    Args:
+        urls (Iterable[str]): The logfile's `zip_location` column. Repeated and missing (NaN) URLs are fine.
+        source (str): A folder of submission zips, or an archive of them.
+        store (CodeStore): The code store to fill, usually the downloader's.
+        num_threads (int | None): How many zips to read at once. Defaults to the number of CPUs.
+
+    Returns:
+        IngestSummary: How many submissions were ingested, already cached or not found.
+    """
+    summary = IngestSummary()
+    keys = {submission_key(url) for url in urls if isinstance(url, str)}
+    with LocalZips(source) as zips:
+        summary.unmatched = len(zips.paths.keys() - keys)
+        summary.not_found = len(keys - zips.paths.keys())
+        todo = []
+        for key in sorted(keys & zips.paths.keys()):
+            if key in store:
+                summary.cached += 1
+            else:
+                todo.append(key)
+        for key, code in read_all(zips, todo, num_threads or os.cpu_count() or 1):
+            if code is None:
+                summary.unreadable += 1
+            else:
+                store.put(key, code)
+                summary.ingested += 1
+    return summary
+
+
+def read_all(zips: LocalZips, keys: list[str], num_threads: int) -> Iterator[tuple[str, str | None]]:
+    """Yields each submission ID with its code, in order of completion, reading a bounded number ahead."""
+    pending = iter(keys)
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        tasks = {executor.submit(zips.extract, key) for key in islice(pending, 2 * num_threads)}
+        while tasks:
+            done, tasks = wait(tasks, return_when=FIRST_COMPLETED)
+            tasks.update(executor.submit(zips.extract, key) for key in islice(pending, len(done)))
+            for task in done:
+                yield task.result()
+
+
+def main(argv: list[str] | None = None) -> None:
+    import tools.loader as loader
+
+    parser = argparse.ArgumentParser(description="Fill PBA's download cache from a bulk export of submission zips.")
+    parser.add_argument('logfile', help='Path to a zyBooks logfile (.csv)')
+    parser.add_argument('source', help='A folder of submission zips, or a .zip archive of them')
+    parser.add_argument('--dir', default='downloads', help="The download folder. Default: 'downloads'")
+    parser.add_argument('--threads', type=int, help='Zips to read at once. Default: one per CPU')
+    args = parser.parse_args(argv)
+
+    logfile = loader.read_logfile(args.logfile, parse_dates=False)
+    os.makedirs(args.dir, exist_ok=True)
+    with CodeStore(args.dir) as store:
+        print(f'Ingested {args.source}: {ingest(logfile.zip_location, args.source, store, args.threads)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+from dateutil import parser
+from pandas import DataFrame, Series
+
+# Columns of a zyBooks logfile that PBA reads, keyed by their standardized name.
+# Free-text columns that repeat on every row (names, captions) are stored as categoricals,
+# numeric flags and scores as float32 since the solution row leaves them blank.
+LOGFILE_SCHEMA = {
+    'lab_id': 'int32',
+    'content_section': 'float64',
+    'caption': 'category',
+    'user_id': 'int64',
+    'first_name': 'category',
+    'last_name': 'category',
+    'email': 'category',
+    'role': 'category',
+    'date_submitted': 'object',
+    'zip_location': 'object',
+    'is_submission': 'float32',
+    'score': 'float32',
+    'max_score': 'float32',
+}
+
+# Timestamp formats seen in zyBooks logfiles, tried in order on sampled timestamps
+TIMESTAMP_FORMATS = [
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%SZ',
+]
+# How many timestamps `detect_timestamp_formats` samples from each end of a column
+TIMESTAMP_SAMPLE_SIZE = 100
+
+# Columns that are expensive to load and only read by some tools
+OPTIONAL_SCHEMA = {
+    'result': 'object',
+}
+
+
+def standardize_column_name(column: str) -> str:
+    """Returns the standardized name for a zyBooks logfile column.
+
+    Changes the following column names:
+    - date_submitted(UTC) etc. -> date_submitted
+    - submission -> is_submission
+    - content_resource_id -> lab_id
+
+    Args:
+        column (str): A column name from a zyBooks logfile header.
+
+    Returns:
+        str: The standardized column name, or the original name if it needs no change.
+    """
+    if 'date_submitted' in column:
+        return 'date_submitted'
+    elif 'submission' in column:
+        return 'is_submission'
+    elif 'content_resource_id' in column:
+        return 'lab_id'
+    return column
+
+
+def standardize_columns(logfile: DataFrame) -> DataFrame:
+    """Standardizes the column names in a zyBooks logfile (Pandas DataFrame).
+
+    Args:
+        logfile (DataFrame): The log of all student submissions.
+
+    Returns:
+        DataFrame: The DataFrame for the logfile, edited in-place.
+    """
+    logfile.rename(columns={column: standardize_column_name(column) for column in logfile.columns}, inplace=True)
+    return logfile
+
+
+def get_column_names(logfile_path: str) -> dict[str, str]:
+    """Maps each standardized column name to the raw column name in a logfile's header.
+
+    Args:
+        logfile_path (str): The path to a zyBooks logfile.
+
+    Returns:
+        dict[str, str]: A dictionary of `standardized name : raw name` for every column in the header.
+    """
+    header = pd.read_csv(logfile_path, nrows=0).columns
+    return {standardize_column_name(column): column for column in header}
+
+
+def get_valid_datetime(timestamp: str) -> datetime:
+    """Returns a datetime object for a submission timestamp.
+
+    Uses the dateutil.parser module to handle many common datetime formats.
+
+    Args:
+        timestamp (str): A timestamp, e.g. 'YYYY-MM-DD HH:MM:SS'.
+
+    Returns:
+        datetime: A datetime object representing the given timestamp.
+
+    Raises:
+        ParserError: If the datetime format cannot be recognized.
+    """
+    try:
+        return parser.parse(timestamp)
+    except parser.ParserError:
+        raise parser.ParserError(f'Cannot recognize datetime format: {timestamp}')
+
+
+def detect_timestamp_formats(timestamps: Series, sample_size: int = TIMESTAMP_SAMPLE_SIZE) -> list[str]:
+    """Returns the formats in `TIMESTAMP_FORMATS` that match timestamps sampled from the start and end of a column.
+
+    Args:
+        timestamps (Series): Timestamp strings.
+        sample_size (int): How many non-blank timestamps to sample from each end.
+
+    Returns:
+        list[str]: The matching formats, the one matching the most samples first.
+    """
+    values = timestamps.dropna()
+    sample = values
+    if len(values) > 2 * sample_size:
+        sample = pd.concat([values.head(sample_size), values.tail(sample_size)])
+    matches = {}
+    for timestamp in sample.astype(str).str.strip():
+        for timestamp_format in TIMESTAMP_FORMATS:
+            try:
+                datetime.strptime(timestamp, timestamp_format)
+            except ValueError:
+                continue
+            matches[timestamp_format] = matches.get(timestamp_format, 0) + 1
+            break
+    return sorted(matches, key=matches.get, reverse=True)
+
+
+def parse_timestamps(timestamps: Series) -> Series:
+    """Parses a column of timestamp strings into a datetime64 column.
+
+    The whole column is parsed at once with each format detected in a sample, so a logfile that switches formats
+    (e.g. one exported in parts) is still parsed quickly. Rows that match none of them are parsed together
+    as mixed formats, and only rows that pandas can't parse are parsed one at a time with `get_valid_datetime()`.
+
+    Args:
+        timestamps (Series): Timestamp strings, e.g. the `date_submitted` column. Blanks become NaT.
+
+    Returns:
+        Series: The parsed timestamps, with the same index as `timestamps`.
+
+    Raises:
+        ParserError: If a timestamp's format cannot be recognized.
+    """
+    parsed = pd.Series(pd.NaT, index=timestamps.index, dtype='datetime64[ns]')
+    for timestamp_format in detect_timestamp_formats(timestamps):
+        failed = parsed.isna() & timestamps.notna()
+        if not failed.any():
+            break
+        parsed[failed] = pd.to_datetime(timestamps[failed], format=timestamp_format, errors='coerce')
+
+    failed = parsed.isna() & timestamps.notna()
+    if failed.any():
+        print(f"{failed.sum()} timestamps don't match the sampled formats. Parsing them as mixed formats.")
+        mixed = pd.to_datetime(timestamps[failed], format='mixed', utc=True, errors='coerce')
+        parsed[failed] = mixed.dt.tz_localize(None)  # In UTC, like `get_valid_datetime()` below
+
+    # Fall back to dateutil for rows that pandas couldn't parse
+    failed = parsed.isna() & timestamps.notna()
+    for i, timestamp in timestamps[failed].items():
+        valid_datetime = get_valid_datetime(str(timestamp))
+        if valid_datetime.tzinfo:
+            valid_datetime = valid_datetime.astimezone(timezone.utc).replace(tzinfo=None)
+        parsed[i] = valid_datetime
+    return parsed
+
+
+def read_logfile(logfile_path: str, optional_columns: list[str] | None = None, parse_dates: bool = True) -> DataFrame:
+    """Reads a zyBooks logfile into a DataFrame with compact column types.
+
+    Only the columns in `LOGFILE_SCHEMA` are loaded, plus any requested `optional_columns`.
+    Columns are renamed to their standardized names, and `date_submitted` is parsed into datetimes.
+
+    Args:
+        logfile_path (str): The path to a zyBooks logfile.
+        optional_columns (list[str] | None): Names from `OPTIONAL_SCHEMA` to also load, e.g. ['result'].
+        parse_dates (bool): Parse `date_submitted`. If False, it's left as strings to parse later,
+            e.g. in the background with `Prefetcher.parse_timestamps()`.
+
+    Returns:
+        DataFrame: The log of all student submissions.
+    """
+    schema = dict(LOGFILE_SCHEMA)
+    for column in optional_columns or []:
+        schema[column] = OPTIONAL_SCHEMA[column]
+
+    raw_names = get_column_names(logfile_path)
+    columns = {raw_names[name]: name for name in schema if name in raw_names}
+    dtypes = {raw: schema[name] for raw, name in columns.items()}
+    logfile = pd.read_csv(logfile_path, usecols=list(columns), dtype=dtypes)
+    logfile.rename(columns=columns, inplace=True)
+
+    # Lab IDs are compared to floats like 3.12 throughout, so keep float categories
+    if 'content_section' in logfile:
+        logfile['content_section'] = logfile['content_section'].astype('category')
+    if parse_dates and 'date_submitted' in logfile:
+        logfile['date_submitted'] = parse_timestamps(logfile['date_submitted'])
+    return logfile
+
+
+def read_column(logfile_path: str, column: str) -> Series:
+    """Reads a single column from a logfile, indexed by row the same way as `read_logfile()`.
+
+    Useful for loading large columns like `result` only when a tool needs them.
+
+    Args:
+        logfile_path (str): The path to a zyBooks logfile.
+        column (str): The standardized name of the column to read.
+
+    Returns:
+        Series: The column's values.
+    """
+    raw_name = get_column_names(logfile_path)[column]
+    dtype = OPTIONAL_SCHEMA.get(column, LOGFILE_SCHEMA.get(column))
+    return pd.read_csv(logfile_path, usecols=[raw_name], dtype={raw_name: dtype})[raw_name].rename(column)
@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable
+
+from tools.filelock import FileLock
+
+PENDING = 'pending'  # Download started but never finished, e.g. PBA was interrupted
+OK = 'ok'  # Code downloaded and written to the download folder
+FAILED = 'failed'  # Every retry failed or was throttled
+EMPTY = 'empty'  # The server responded, but sent no code
+STATES = (PENDING, OK, FAILED, EMPTY)
+
+
+def write_atomic(path: str, text: str) -> None:
+    """Writes a text file so that it either fully exists or doesn't exist at all, even if PBA is interrupted.
+
+    Args:
+        path (str): The file to write.
+        text (str): The file's contents.
+    """
+    tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class DownloadManifest:
+    """Append-only record of the state of every download, so an interrupted run can resume where it stopped.
+
+    Each line of the manifest file is a JSON object `{"url": ..., "state": ...}`, and the last line for a URL wins.
+    Failed and empty downloads also record why they failed and when, e.g.
+    `{"url": ..., "state": "failed", "reason": "...", "time": 1700000000.0}`.
+    Every line is flushed as soon as it's written, so at most the line being written is lost
+    when PBA is interrupted. A torn last line is ignored when the manifest is read back.
+
+    Several PBA processes can share one manifest. Lines are written while holding a file lock
+    (`<path>.lock`), and `refresh` reads lines that other processes appended.
+
+    Attributes:
+        path (str): The manifest file, e.g. `downloads/manifest.jsonl`.
+        states (dict[str, str]): The latest state of each URL.
+        failures (dict[str, dict]): The manifest entry, with `reason` and `time`, of each URL that last failed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.states = {}
+        self.failures = {}
+        self._lock = FileLock(path + '.lock')
+        self._read_lock = threading.Lock()
+        self._file = None
+        self._reader = None
+        with self._lock:
+            self._open()
+            if self._file.tell() > 0:
+                with open(path, 'rb') as file:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b'\n':  # The last writer was interrupted. Don't append to its torn line.
+                        self._file.write(b'\n')
+                        self._file.flush()
+            num_lines = self._read_new_lines()
+            if num_lines > 2 * len(self.states):
+                self._compact()
+
+    def __enter__(self) -> 'DownloadManifest':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the manifest file."""
+        with self._read_lock:
+            self._file.close()
+            self._reader.close()
+        self._lock.close()
+
+    def get(self, url: str) -> str | None:
+        """Returns the latest state of a URL, or None if it was never downloaded."""
+        return self.states.get(url)
+
+    def record(self, url: str, state: str, reason: str | None = None) -> None:
+        """Records a new state for a URL and flushes it to the manifest file.
+
+        Args:
+            url (str): The URL of the download.
+            state (str): One of `STATES`.
+            reason (str | None): Why the download failed, for failed and empty downloads.
+        """
+        entry = {'url': url, 'state': state}
+        if state in (FAILED, EMPTY):
+            entry.update(reason=reason, time=time.time())
+        with self._lock, self._read_lock:
+            if self._replaced():
+                self._open()
+            self._update(entry)
+            self._file.write((json.dumps(entry) + '\n').encode('utf-8'))
+            self._file.flush()
+
+    def refresh(self) -> None:
+        """Reads lines that other processes appended since the manifest was opened or last refreshed."""
+        with self._read_lock:
+            if self._replaced():  # Another process compacted the manifest
+                self._open()
+            self._read_new_lines()
+
+    def failed_since(self, url: str, since: float) -> bool:
+        """Returns True if the download from `url` last failed or was empty at or after time `since`."""
+        failure = self.failures.get(url)
+        return failure is not None and failure.get('time', 0) >= since
+
+    def _update(self, entry: dict) -> None:
+        self.states[entry['url']] = entry['state']
+        if entry['state'] in (FAILED, EMPTY):
+            self.failures[entry['url']] = entry
+        else:
+            self.failures.pop(entry['url'], None)
+
+    def _open(self) -> None:
+        """Opens (or reopens, if another process replaced it) the manifest file for appending and reading."""
+        for file in (self._file, self._reader):
+            if file is not None:
+                file.close()
+        self._file = open(self.path, 'ab')
+        self._reader = open(self.path, 'rb')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+
+    def _replaced(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def _read_new_lines(self) -> int:
+        """Applies every complete line after the reader's position and returns how many there were."""
+        data = self._reader.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):  # Another process is writing this line right now
+            self._reader.seek(end - len(data), os.SEEK_CUR)
+        lines = data[:end].decode('utf-8', errors='replace').splitlines()
+        for line in lines:
+            try:
+                self._update(json.loads(line))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+        return len(lines)
+
+    def _compact(self) -> None:
+        """Rewrites the manifest file with one line per URL. Must hold the file lock."""
+        lines = [
+            json.dumps(self.failures.get(url, {'url': url, 'state': state})) + '\n'
+            for url, state in self.states.items()
+        ]
+        try:
+            write_atomic(self.path, ''.join(lines))
+        except PermissionError:  # On Windows, while another process has the manifest open
+            return
+        self._open()
+        self._reader.seek(0, os.SEEK_END)
+
+    def summary(self, urls: Iterable[str]) -> str:
+        """Returns a one-line count of the states of some URLs, e.g. '950 ok, 50 pending'."""
+        counts = Counter(self.states.get(url) for url in urls)
+        return ', '.join(f'{counts[state]} {state}' for state in STATES if counts[state])
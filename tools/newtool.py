@@ -30,7 +30,7 @@ def newtool(data: dict, selected_labs: list[float]) -> dict:
             if lab in data[user_id]:
                 for submission_object in data[user_id][lab]:
                     num_runs += 1
-                    if int(submission_object.submission[0]) == 1:
+                    if submission_object.type == 1:
                         num_submits += 1
                 num_develops = num_runs - num_submits
             newtool_output[user_id][lab] = [num_runs, num_develops, num_submits]
@@ -59,6 +59,12 @@ Data from create_data_structure function:
         }
     }
 
+Each Submission has only per-run fields:
+    student_id, lab_id, type (1 for submission, 0 for development run), code (None if it couldn't be downloaded),
+    sub_time, zip_location, max_score (the run's score), and the submission_id property.
+Student details (first_name, last_name, email) are kept once per student in `Student` objects
+(`SubmissionStore.students`), and lab details (caption, crid) once per lab in the `LabCatalog`.
+
 newtool_output from user defined function structure:
     newtool_output = {
         student_id : {
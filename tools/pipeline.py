@@ -0,0 +1,267 @@
+"""Overlap downloading code with analyzing it.
+
+Downloads run on the downloader's threads, and each (student, lab) is analyzed on a process pool
+as soon as the code it needs is in, instead of every tool waiting for the whole class to download.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING
+
+import tools.utilities as util
+from tools.submission import Submission
+
+if TYPE_CHECKING:
+    from tools.runner import ToolContext
+
+# Tools whose analysis of each student's highest-scoring code for a lab doesn't depend on other students
+MAX_SCORE_TOOLS = ('anomaly', 'auto_anomaly', 'hardcoding')
+# Tools whose analysis of all of a student's runs for a lab doesn't depend on other students
+ALL_RUNS_TOOLS = ('incdev',)
+PIPELINE_TOOLS = MAX_SCORE_TOOLS + ALL_RUNS_TOOLS
+
+
+def create_executor(num_processes: int | None = None) -> ProcessPoolExecutor:
+    """Returns a process pool for the pipeline.
+
+    Workers are started by a fork server (or spawned, where there is none) instead of forked from this process,
+    which by then runs download threads that may hold locks a forked child would inherit and never see released.
+    The fork server itself starts now, so create the pool before starting any threads.
+
+    Args:
+        num_processes (int | None): The number of worker processes. Defaults to the number of CPUs.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():  # Not on Windows
+        from multiprocessing import forkserver
+
+        mp_context = multiprocessing.get_context('forkserver')
+        forkserver.ensure_running()
+    else:
+        mp_context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=num_processes or os.cpu_count() or 1, mp_context=mp_context)
+
+
+def analyze_code(tool: str, code: str, testcases: set[tuple] | None = None, solution_code: str | None = None) -> list:
+    """Analyzes one student's highest-scoring code for one lab, in a worker process.
+
+    Args:
+        tool (str): One of `MAX_SCORE_TOOLS`.
+        code (str): The student's highest-scoring code for the lab.
+        testcases (set[tuple] | None): The lab's testcases, for hardcoding detection.
+        solution_code (str | None): The solution code, for hardcoding detection.
+
+    Returns:
+        list: The tool's result for the student and lab, without the code.
+    """
+    if tool == 'anomaly':
+        from tools.anomaly import get_total_anomaly_score
+
+        return list(get_total_anomaly_score(code))
+    if tool == 'auto_anomaly':
+        from tools.auto_anomaly import get_anomaly_counts
+
+        return [get_anomaly_counts(code)]
+    if tool == 'hardcoding':
+        from tools.hardcoding import get_hardcode_score_with_soln
+
+        return [get_hardcode_score_with_soln(code, testcases, solution_code)]
+    raise ValueError(f'Not a pipeline tool: {tool}')
+
+
+def analyze_runs(tool: str, runs: list[Submission]) -> dict | None:
+    """Analyzes all of one student's runs for one lab, in a worker process.
+
+    Args:
+        tool (str): One of `ALL_RUNS_TOOLS`.
+        runs (list[Submission]): The student's runs for the lab, in order.
+
+    Returns:
+        dict | None: The tool's result for the student and lab, or None if no code was downloaded.
+    """
+    if tool == 'incdev':
+        from tools.incdev import run_lab
+
+        return run_lab(runs)
+    raise ValueError(f'Not a pipeline tool: {tool}')
+
+
+class Pipeline:
+    """Downloads the code that some tools read and analyzes each (student, lab) as soon as its code is in.
+
+    Only the per-student part of a tool runs here (see `PIPELINE_TOOLS`). Hardcoding detection is only pipelined
+    when there are testcases for every selected lab and a solution, since otherwise it compares students.
+    Results have the same structure as each tool's own function, so `run_tool()` uses them in place of running it.
+
+    Identical code (e.g. students handing in the same final version) is analyzed once per tool,
+    and the result is shared by every student with that code.
+
+    Download results and analysis jobs are both bounded: once `max_pending` jobs are waiting for a process,
+    no more downloads are taken until one finishes, so memory stays flat however big the class is.
+
+    Attributes:
+        context (ToolContext): The logfile, downloader and submissions shared by every tool.
+        tools (list[str]): The selected tools that the pipeline runs.
+        num_processes (int): The number of worker processes.
+        max_pending (int): The most analysis jobs submitted but not yet finished.
+        executor (ProcessPoolExecutor | None): A pool from `create_executor()` to run on, e.g. one created before
+            any threads started. If None, the pipeline creates its own and shuts it down when done.
+    """
+
+    def __init__(
+        self,
+        context: ToolContext,
+        tool_names: list[str],
+        num_processes: int | None = None,
+        max_pending: int | None = None,
+        executor: ProcessPoolExecutor | None = None,
+    ) -> None:
+        self.context = context
+        self.tools = [name for name in tool_names if name in PIPELINE_TOOLS]
+        if 'hardcoding' in self.tools and not self._can_pipeline_hardcoding():
+            self.tools.remove('hardcoding')
+        self.num_processes = num_processes or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.num_processes
+        self._results = {}  # (tool, user ID, lab ID) -> result
+        self._jobs = {}  # Future -> [(tool, user ID, lab ID, code), ...] that share its result
+        self._shared = {}  # (tool, lab ID or None, code) -> the Future analyzing it
+        self.executor = executor
+        self._executor = None
+
+    def run(self) -> dict[str, dict]:
+        """Downloads and analyzes everything the pipeline's tools need.
+
+        Returns:
+            dict[str, dict]: Each tool's output, the same as the tool's own function would return.
+        """
+        if not self.tools:
+            return {}
+        submissions = self.context.build_submissions()
+        max_score_tools = [name for name in self.tools if name in MAX_SCORE_TOOLS]
+        all_runs_tools = [name for name in self.tools if name in ALL_RUNS_TOOLS]
+        self._executor = self.executor or create_executor(self.num_processes)
+        try:
+            if all_runs_tools:
+                # Every run of every lab is downloaded anyway, so the highest-scoring code is ready along the way
+                store = self.context.store
+                waiting = {
+                    (user_id, lab): store.zip_location[start:end].tolist()
+                    for user_id, lab, start, end in store.groups()
+                }
+                for user_id, lab in self._stream(waiting):
+                    runs = submissions[user_id][lab]
+                    for tool in all_runs_tools:
+                        self._submit(tool, user_id, lab, None, analyze_runs, tool, runs)
+                    if lab in self.context.selected_labs:
+                        self._submit_max_score(max_score_tools, user_id, lab)
+            elif max_score_tools:
+                while True:  # Until no highest-scoring run failed to download, falling back to the next best
+                    missing = {url for url, downloaded in self.context.downloaded.items() if not downloaded}
+                    rows = util.max_score_runs(self.context.logfile, self.context.selected_labs, missing)
+                    waiting = {
+                        (row.user_id, row.content_section): [row.zip_location]
+                        for row in rows.itertuples()
+                        if (max_score_tools[0], row.user_id, row.content_section) not in self._results
+                    }
+                    if not waiting:
+                        break
+                    for user_id, lab in self._stream(waiting):
+                        self._submit_max_score(max_score_tools, user_id, lab)
+            while self._jobs:
+                self._collect(wait(self._jobs, return_when=FIRST_COMPLETED).done)
+        finally:
+            if self._executor is self.executor:
+                for future in self._jobs:
+                    future.cancel()
+            else:
+                self._executor.shutdown(cancel_futures=True)
+        return {tool: self._output(tool, submissions) for tool in self.tools}
+
+    def _stream(self, waiting: dict[tuple, list[str]]) -> Iterator[tuple]:
+        """Downloads the URLs in `waiting` and yields each (user ID, lab ID) once all of its URLs are in."""
+        remaining = {}  # (user ID, lab ID) -> URLs not yet downloaded
+        pairs_by_url = {}
+        for pair, urls in waiting.items():
+            urls = {url for url in urls if isinstance(url, str) and url not in self.context.downloaded}
+            if not urls:
+                yield pair
+                continue
+            remaining[pair] = urls
+            for url in urls:
+                pairs_by_url.setdefault(url, []).append(pair)
+
+        for url, _ in self.context.stream_code(pairs_by_url):
+            for pair in pairs_by_url[url]:
+                remaining[pair].discard(url)
+                if not remaining[pair]:
+                    yield pair
+            if len(self._jobs) >= self.max_pending:  # Don't take more downloads until the processes catch up
+                self._collect(wait(self._jobs, return_when=FIRST_COMPLETED).done)
+
+    def _submit_max_score(self, tools: list[str], user_id: int, lab: float) -> None:
+        code = util.get_code_with_max_score(user_id, lab, self.context.submissions)
+        if code is None:  # Couldn't be downloaded. The next round falls back to the next best run.
+            return
+        for tool in tools:
+            if (tool, user_id, lab) in self._results:
+                continue
+            if tool == 'hardcoding':  # Depends on the lab's testcases
+                key = (tool, lab, code)
+                args = (self.context.testcases[lab], self.context.solution_code)
+            else:
+                key = (tool, None, code)
+                args = ()
+            if key in self._shared:
+                self._share(self._shared[key], tool, user_id, lab, code)
+            else:
+                self._shared[key] = self._submit(tool, user_id, lab, code, analyze_code, tool, code, *args)
+
+    def _submit(self, tool: str, user_id: int, lab: float, code: str | None, function, *args) -> Future:
+        future = self._executor.submit(function, *args)
+        self._jobs[future] = []
+        self._share(future, tool, user_id, lab, code)
+        return future
+
+    def _share(self, future: Future, tool: str, user_id: int, lab: float, code: str | None) -> None:
+        """Makes a job's result the result of (tool, user ID, lab ID) too."""
+        if future in self._jobs:
+            self._results[(tool, user_id, lab)] = None  # Submitted
+            self._jobs[future].append((tool, user_id, lab, code))
+        else:  # Already collected
+            self._set_result(future.result(), tool, user_id, lab, code)
+
+    def _collect(self, done: set[Future]) -> None:
+        for future in done:
+            result = future.result()
+            for tool, user_id, lab, code in self._jobs.pop(future):
+                self._set_result(result, tool, user_id, lab, code)
+
+    def _set_result(self, result, tool: str, user_id: int, lab: float, code: str | None) -> None:
+        self._results[(tool, user_id, lab)] = result if code is None else [*result, code]
+
+    def _output(self, tool: str, submissions: dict) -> dict:
+        """Arranges a tool's results like the tool's own function does, so output files come out the same."""
+        output = {}
+        if tool in ALL_RUNS_TOOLS:
+            for user_id in submissions:
+                output[user_id] = {}
+                for lab in submissions[user_id]:
+                    result = self._results.get((tool, user_id, lab))
+                    if result is not None:
+                        output[user_id][lab] = result
+        else:
+            for lab in self.context.selected_labs:
+                for user_id in submissions:
+                    output.setdefault(user_id, {})
+                    result = self._results.get((tool, user_id, lab))
+                    if result is not None:
+                        output[user_id][lab] = result
+        return output
+
+    def _can_pipeline_hardcoding(self) -> bool:
+        testcases = self.context.load_testcases()
+        solution_code = self.context.load_solution()
+        return bool(testcases and solution_code) and all(lab in testcases for lab in self.context.selected_labs)
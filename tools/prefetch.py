@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import contextlib
+import itertools
+import queue
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+# pandas is slow to import, so it's imported by the functions that use it
+if TYPE_CHECKING:
+    from pandas import Series
+
+    from tools.downloader import Downloader
+
+HIGH = 0  # Code the selected tools will read
+NORMAL = 1  # Code that tools often read, e.g. the highest-scoring code for every lab
+LOW = 2  # Everything else
+
+
+class Prefetcher:
+    """Downloads code and parses timestamps in the background, e.g. while the user is choosing labs and tools.
+
+    Code is downloaded into the downloader's code store, highest priority first, on background threads
+    that share the downloader's session and concurrency limit. When a tool later fetches the code,
+    it's read from the code store, or the tool waits for the download in flight instead of starting another.
+
+    Downloads pause while a tool is downloading code itself (see `paused`),
+    so the user never waits for code that no tool asked for.
+
+    Attributes:
+        downloader (Downloader): The downloader shared with the tools.
+        fetched (int): The number of URLs fetched in the background so far.
+    """
+
+    def __init__(self, downloader: Downloader, num_threads: int | None = None) -> None:
+        self.downloader = downloader
+        self.fetched = 0
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()  # Keeps URLs of the same priority in order
+        self._queued = {}  # URL -> highest priority it's queued at
+        self._done = set()  # URLs taken off the queue
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._running = threading.Event()  # Cleared while paused
+        self._running.set()
+        self._pauses = 0
+        self._timestamps = None
+        self._threads = [
+            threading.Thread(target=self._work, name=f'prefetch-{i}', daemon=True)
+            for i in range(num_threads or downloader.max_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self) -> Prefetcher:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def download(self, urls: Iterable[str], priority: int = LOW) -> None:
+        """Queues code to download in the background.
+
+        URLs that are already queued move up if `priority` is higher than before. Missing (NaN) URLs are ignored.
+
+        Args:
+            urls (Iterable[str]): URLs from which to download code.
+            priority (int): `HIGH`, `NORMAL` or `LOW`.
+        """
+        with self._lock:
+            for url in urls:
+                if not isinstance(url, str) or url in self._done:
+                    continue
+                if priority < self._queued.get(url, LOW + 1):
+                    self._queued[url] = priority
+                    self._queue.put((priority, next(self._order), url))
+
+    def parse_timestamps(self, timestamps: Series, then: Callable[[Series], None] | None = None) -> None:
+        """Starts parsing a column of timestamp strings on a background thread. See `timestamps()`.
+
+        Args:
+            timestamps (Series): The timestamp strings.
+            then (Callable[[Series], None] | None): Called with the parsed timestamps once they're ready,
+                e.g. to queue downloads whose order depends on them. Errors it raises are logged and ignored.
+        """
+        from tools.loader import parse_timestamps
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch-timestamps')
+        self._timestamps = executor.submit(parse_timestamps, timestamps)
+        if then is not None:
+            self._timestamps.add_done_callback(lambda future: then(future.result()))
+        executor.shutdown(wait=False)
+
+    def timestamps(self) -> Series | None:
+        """Waits for the timestamps from `parse_timestamps()` and returns them, or None if none were given."""
+        return None if self._timestamps is None else self._timestamps.result()
+
+    @contextlib.contextmanager
+    def paused(self) -> Iterator[None]:
+        """Pauses background downloads until the `with` block ends. Downloads in flight finish."""
+        with self._lock:
+            self._pauses += 1
+            self._running.clear()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pauses -= 1
+                if self._pauses == 0:
+                    self._running.set()
+
+    def stop(self, wait: bool = False) -> None:
+        """Stops background downloads. Downloads in flight finish.
+
+        Args:
+            wait (bool): Wait for the downloads in flight, e.g. before closing the downloader.
+        """
+        self._stopped.set()
+        self._running.set()
+        for _ in self._threads:
+            self._queue.put((HIGH - 1, next(self._order), None))  # Wakes up every idle thread
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if not self._running.is_set():  # Paused. Higher priority URLs may be queued by the time it resumes.
+                self._queue.put(item)
+                self._running.wait()
+                continue
+            if self._stopped.is_set():
+                return
+            priority, _, url = item
+            with self._lock:
+                if url in self._done or self._queued[url] != priority:  # Already fetched, or moved up the queue
+                    continue
+                self._done.add(url)
+            try:
+                self.downloader.fetch(url)
+            except Exception:  # e.g. the connection dropped. The tool that needs the code tries again.
+                continue
+            with self._lock:
+                self.fetched += 1
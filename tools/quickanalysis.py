@@ -3,20 +3,21 @@ from datetime import timedelta
 
 import pandas as pd
 
-from tools.utilities import get_valid_datetime
+from tools.catalog import LabCatalog
 
 
-def write(summary: dict) -> None:
+def write(summary: dict, output_dir: str = 'output') -> None:
     """Write the quick analysis summary dict to a CSV file.
 
     Args:
         summary (dict): A dictionary containing a quick analysis summary.
+        output_dir (str): The folder to write `quickanalysis.csv` to. Default is 'output'.
 
     Returns:
         None
     """
     try:
-        csv_file = 'output/quickanalysis.csv'
+        csv_file = f'{output_dir}/quickanalysis.csv'
         csv_columns = [
             'section',
             'name',
@@ -37,11 +38,12 @@ def write(summary: dict) -> None:
         print('IO Error')
 
 
-def quick_analysis(dataframe: dict) -> None:
+def quick_analysis(catalog: LabCatalog, output_dir: str = 'output') -> None:
     """Performs a quick analysis for every student and writes the result to a CSV.
 
     Args:
-        dataframe (dict): The log of all student submissions.
+        catalog (LabCatalog): The lab catalog for the log of all student submissions.
+        output_dir (str): The folder to write the CSV to. Default is 'output'.
 
     Returns:
         None
@@ -58,45 +60,24 @@ def quick_analysis(dataframe: dict) -> None:
             'num_of_submits': 2,
         }
     """
-    df = dataframe
     summary = {}
-    unique_lab_ids = set()
-    for lab_id in df['lab_id']:
-        unique_lab_ids.add(lab_id)
-    for lab_id in unique_lab_ids:  # This is going to be similar to the roster.py, better start with that file
-        lab = df[df['lab_id'] == lab_id].reset_index()
-        name = lab['caption'][0]
-        user_id = lab['user_id']
-        section = lab['content_section'][0]
-        unique_user_id = set()
-        for unique_id in user_id:
-            if unique_id != -1:
-                unique_user_id.add(unique_id)
-        num_of_students = len(unique_user_id)
-        num_of_runs = round(len(user_id) / len(unique_user_id))
-        num_of_submits = 0
+    for lab in catalog.labs.values():  # This is going to be similar to the roster.py, better start with that file
+        lab_df = catalog.rows(lab.lab_id)
+        students = lab_df[lab_df['user_id'] != -1]
+        name = lab.caption
+        section = lab.lab_id
+        num_of_students = lab.num_students
+        num_of_runs = round(lab.num_runs / num_of_students)
+        num_of_submits = lab.num_submissions
         total_score = 0
         time_spent = 0
-        for unique_id in unique_user_id:
-            user_df = lab[lab['user_id'] == unique_id]
-            max_score = 0
-            time_spent_by_user = 0
-            time_list = []
-            for time in user_df['date_submitted']:
-                time_list.append(time)
-            for i in range(len(time_list) - 1):
-                d1 = get_valid_datetime(str(time_list[i]))
-                d2 = get_valid_datetime(str(time_list[i + 1]))
-                diff = d2 - d1
-                diff_minutes = (diff.days * 24 * 60) + (diff.seconds / 60)
-                if diff_minutes <= 10:
-                    time_spent_by_user += diff_minutes
-            for score in user_df['score']:
-                if not pd.isna(score):
-                    max_score = max(score, max_score)
-            for submission in user_df['is_submission']:
-                if submission == 1:
-                    num_of_submits += 1
+        for _, user_df in students.groupby('user_id', sort=False):
+            # Minutes between each pair of adjacent runs, only counting gaps of 10 minutes or less
+            diff_minutes = user_df['date_submitted'].diff().dt.total_seconds().iloc[1:] / 60
+            time_spent_by_user = diff_minutes[diff_minutes <= 10].sum()
+            max_score = user_df['score'].astype('float64').max()
+            if pd.isna(max_score) or max_score < 0:
+                max_score = 0
             total_score += max_score
             time_spent += time_spent_by_user
         avg_time_spent_minutes = time_spent / num_of_students
@@ -105,9 +86,9 @@ def quick_analysis(dataframe: dict) -> None:
         td_split = td.split(':')
         avg_time_spent = td_split[1] + 'm ' + td_split[2].split('.')[0] + 's'
         avg_score = int(round(total_score / num_of_students) / 10 * 100)
-        avg_num_of_submits = round(num_of_submits / len(unique_user_id))
+        avg_num_of_submits = round(num_of_submits / num_of_students)
         num_of_develops = num_of_runs - avg_num_of_submits
-        summary[lab_id] = {
+        summary[lab.lab_id] = {
             'section': section,
             'name': name,
             'number_of_students': num_of_students,
@@ -118,4 +99,4 @@ def quick_analysis(dataframe: dict) -> None:
             'num_of_submits': avg_num_of_submits,
             'pivots': 'x',
         }
-    write(summary)
+    write(summary, output_dir)
@@ -1,7 +1,7 @@
 import math
 from datetime import datetime, timedelta
 
-from tools.utilities import get_valid_datetime
+from tools.catalog import LabCatalog
 
 
 def time_to_minutes_seconds(time_list: list[datetime]) -> str:
@@ -101,11 +101,11 @@ def get_ppm(time_spent: str, score: float) -> float:
         return round((score / (total_seconds)), 2)
 
 
-def roster(dataframe: dict, selected_labs: list[float]) -> dict:
+def roster(catalog: LabCatalog, selected_labs: list[float]) -> dict:
     """Calculates metrics for a roster for all students in a logfile.
 
     Args:
-        dataframe (dict): The logfile containing submissions.
+        catalog (LabCatalog): The lab catalog for the logfile containing submissions.
         selected_labs (list[float]): A list of lab IDs to consider.
 
     Returns:
@@ -143,26 +143,16 @@ def roster(dataframe: dict, selected_labs: list[float]) -> dict:
             ...
         }
     """
-    df = dataframe
-
-    # Identify unique labs
-    unique_lab_ids = set()
-    if 'lab_id' in df:
-        for lab_id in df['lab_id']:
-            unique_lab_ids.add(lab_id)
-
     summary_roster = {}  # final hashmap where we will be storing the whole roster
 
     for selected_lab in selected_labs:  # Iterating through the lab selected
-        lab_df = df[df['content_section'] == selected_lab].reset_index()  # Dataframe for that particular lab
-        user_id = lab_df['user_id']
-        user_id = set(user_id)  # Set does not contain duplicates so here we get all user ids without repetition
-        section = str(lab_df['content_section'][0])
-
-        for unique_id in user_id:  # Iterating through each user id in that lab
-            user_df = lab_df[lab_df['user_id'] == unique_id]  # Creating a separate dataframe for that user in that lab
-            user_id_df = user_df['user_id']
-            user_id = user_id_df.iloc[0]
+        if selected_lab not in catalog:  # No student runs for this lab
+            continue
+        lab_df = catalog.rows(selected_lab)  # Dataframe for that particular lab
+        section = str(selected_lab)
+
+        # Separate dataframe for each user in that lab, in one pass over the lab's rows
+        for user_id, user_df in lab_df.groupby('user_id', sort=False):
             first_name = user_df['first_name'].iloc[0]
             last_name = user_df['last_name'].iloc[0]
             email = user_df['email'].iloc[0]
@@ -176,14 +166,12 @@ def roster(dataframe: dict, selected_labs: list[float]) -> dict:
                     if submission == 1:
                         num_of_submits += 1
             num_of_devs = num_of_runs - num_of_submits
-            max_score = user_df['score'].max()
+            max_score = user_df['score'].astype('float64').max()
             if math.isnan(max_score):
                 max_score = 0
             time_list = []  # Contains timestamps for that user
             if 'date_submitted' in user_df:
-                for time in user_df['date_submitted']:
-                    time_list.append(get_valid_datetime(time))
-            time_list.sort()  # Sort datetimes in ascending order
+                time_list = sorted(user_df['date_submitted'])  # Sort datetimes in ascending order
             time_spent_by_user = time_to_minutes_seconds(time_list)
 
             # Points per minute, Indicates if a student scores too many points too quickly, might have copied?
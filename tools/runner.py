@@ -0,0 +1,472 @@
+import contextlib
+from collections.abc import Iterable, Iterator
+
+import tools.utilities as util
+
+# Each tool's module is imported the first time the tool runs, so starting PBA stays fast
+
+logger = util.setup_logger(__name__)  # DEBUGGING
+
+# What a tool reads besides the logfile's timestamps, scores and submission types
+MAX_SCORE_CODE = 'max_score_code'  # Each student's highest-scoring code for the selected labs
+ALL_CODE = 'all_code'  # The code of every run in every lab
+SOLUTION = 'solution'  # The solution code
+TESTCASES = 'testcases'  # The selected labs' testcases, from the logfile's `result` column
+
+
+class ToolContext:
+    """Holds the logfile and the data shared by every tool run on it.
+
+    Code, the solution and testcases are only downloaded or loaded when a tool needs them (see `TOOL_NEEDS`),
+    and only the code that the tool reads. Whatever one tool loaded is reused by every later tool.
+    With a `Prefetcher`, code can be downloaded in the background before any tool needs it (see `prefetch()`).
+
+    Attributes:
+        logfile_path (str): The path to the zyBooks logfile.
+        catalog (LabCatalog): The lab catalog for the log of all student submissions.
+        logfile (DataFrame): The log of all student submissions, students only, with rows grouped by lab.
+        selected_labs (list[float]): The lab IDs that tools should evaluate.
+        solution_url (str | None): The URL of the solution code for the logfile, if present.
+        downloader (Downloader): The downloader shared by every download for the logfile.
+        output_dir (str): The folder that tools write output files to.
+        prefetcher (Prefetcher | None): Downloads code in the background, and may be parsing the logfile's timestamps.
+        downloaded (dict[str, bool]): Whether the code at each URL fetched so far could be downloaded.
+            The code itself is only kept in the submission store, so it's held in memory once.
+        store (SubmissionStore | None): Every run in the logfile, in columns, once built.
+        submissions (dict): Each student's runs for each lab, as views into `store`, once built.
+        solution_code (str | None): The solution code, once downloaded.
+        testcases (dict[float, set[tuple]] | None): The testcases for each selected lab, once loaded.
+        pipelined (dict[str, dict]): Output of tools that `run_pipeline()` already ran, used in place of running them.
+    """
+
+    def __init__(
+        self,
+        logfile_path: str,
+        catalog,
+        selected_labs: list[float],
+        solution_url: str | None,
+        downloader,
+        output_dir: str = 'output',
+        prefetcher=None,
+    ) -> None:
+        self.logfile_path = logfile_path
+        self.catalog = catalog
+        self.logfile = catalog.logfile
+        self.selected_labs = selected_labs
+        self.solution_url = solution_url
+        self.downloader = downloader
+        self.output_dir = output_dir
+        self.prefetcher = prefetcher
+        self.downloaded = {}
+        self.store = None
+        self.submissions = {}
+        self.solution_code = None
+        self.testcases = None
+        self.pipelined = {}
+        self._timestamps_ready = prefetcher is None
+
+    def prepare(self, needs: set[str]) -> None:
+        """Downloads or loads everything in `needs` that isn't already, highest-scoring code first.
+
+        Args:
+            needs (set[str]): What a tool reads, from `TOOL_NEEDS`.
+        """
+        self._wait_for_timestamps()
+        if MAX_SCORE_CODE in needs:
+            self.load_submissions(self.selected_labs)
+        if ALL_CODE in needs:
+            self.load_submissions()
+        if SOLUTION in needs:
+            self.load_solution()
+        if TESTCASES in needs:
+            self.load_testcases()
+
+    def prefetch(self, tool_names: Iterable[str]) -> None:
+        """Queues the code that some tools will read to download in the background, highest-scoring code first.
+
+        Does nothing without a prefetcher.
+
+        Args:
+            tool_names (Iterable[str]): Names of tools in `TOOLS` that may run.
+        """
+        from tools.prefetch import HIGH, LOW
+
+        if self.prefetcher is None:
+            return
+        needs = set().union(*(TOOL_NEEDS[name] for name in tool_names))
+        if MAX_SCORE_CODE in needs:
+            self._wait_for_timestamps()  # Equal scores go to the oldest run
+        if SOLUTION in needs and self.solution_url is not None:
+            self.prefetcher.download([self.solution_url], HIGH)
+        if MAX_SCORE_CODE in needs:
+            self.prefetcher.download(util.max_score_runs(self.logfile, self.selected_labs)['zip_location'], HIGH)
+        if ALL_CODE in needs:
+            self.prefetcher.download(self.logfile['zip_location'], LOW)
+
+    def run_pipeline(self, tool_names: list[str], num_processes: int | None = None, executor=None) -> None:
+        """Downloads the code that some tools read and analyzes each student's code on a process pool as it arrives.
+
+        Tools that can't be pipelined are left to run as usual. See `Pipeline`.
+
+        Args:
+            tool_names (list[str]): Names of tools in `TOOLS` that will run.
+            num_processes (int | None): The number of worker processes. Defaults to the number of CPUs.
+            executor (ProcessPoolExecutor | None): The process pool to use, from `pipeline.create_executor()`.
+                Defaults to a new pool for this run.
+        """
+        from tools.pipeline import Pipeline
+
+        self._wait_for_timestamps()
+        self.pipelined.update(Pipeline(self, tool_names, num_processes, executor=executor).run())
+
+    def load_submissions(self, labs: list[float] | None = None) -> dict:
+        """Downloads the code that a tool reads, then returns the submissions data structure.
+
+        Every student's runs are in the data structure, but runs whose code isn't needed yet have no code.
+
+        Args:
+            labs (list[float] | None): Only download the highest-scoring code of each student for these labs,
+                which is all that `get_code_with_max_score` reads. None downloads the code of every run.
+
+        Returns:
+            dict: All Submission objects for each student.
+        """
+        self.build_submissions()
+        if labs is None:
+            self._fetch(self.logfile['zip_location'])
+        else:
+            while True:  # Until no run to read failed to download, falling back to the next best run
+                missing = {url for url, downloaded in self.downloaded.items() if not downloaded}
+                if not self._fetch(util.max_score_runs(self.logfile, labs, missing)['zip_location']):
+                    break
+        return self.submissions
+
+    def build_submissions(self) -> dict:
+        """Builds the submission store and its data structure without downloading any code, if not done already.
+
+        Returns:
+            dict: All runs for each student, with whatever code was downloaded so far.
+        """
+        if self.store is None:
+            from tools.store import SubmissionStore
+
+            self.store = SubmissionStore(self.logfile)
+            self.submissions = self.store.nested()
+        return self.submissions
+
+    def stream_code(self, urls: Iterable[str]) -> Iterator[tuple[str, str | None]]:
+        """Downloads code into the submissions, yielding each URL and its code as soon as it's in.
+
+        URLs that were already fetched, and missing (NaN) URLs, are skipped. Call `build_submissions()` first.
+
+        Args:
+            urls (Iterable[str]): URLs from which to download code.
+
+        Yields:
+            tuple[str, str | None]: Each URL and its code, or None if it couldn't be downloaded.
+        """
+        urls = [url for url in urls if isinstance(url, str) and url not in self.downloaded]
+        if not urls:
+            return
+        # Background downloads would compete for the same connections, so they wait
+        with self.prefetcher.paused() if self.prefetcher else contextlib.nullcontext():
+            for url, code in self.downloader.stream(urls):  # Code goes straight into the submissions
+                self.store.set_code(url, code)
+                self.downloaded[url] = code is not None
+                yield url, code
+
+    def load_solution(self) -> str | None:
+        """Downloads the solution code, if the logfile has one and it wasn't already downloaded.
+
+        Returns:
+            str | None: The solution code, or None if there's none or it couldn't be downloaded.
+        """
+        if self.solution_url is not None and self.solution_url not in self.downloaded:
+            self.solution_code = self.downloader.fetch(self.solution_url)[1]
+            self.downloaded[self.solution_url] = self.solution_code is not None
+        return self.solution_code
+
+    def load_testcases(self) -> dict[float, set[tuple]]:
+        """Reads the selected labs' testcases from the logfile, if not done already.
+
+        Returns:
+            dict[float, set[tuple]]: The testcases for each selected lab, as from `util.get_testcases()`.
+        """
+        if self.testcases is None:
+            import tools.loader as loader
+
+            # The `result` column is large, so it's only read when testcases are needed
+            results = loader.read_column(self.logfile_path, 'result')
+            self.testcases = util.get_testcases(self.logfile.assign(result=results), self.selected_labs)
+        return self.testcases
+
+    def _fetch(self, urls: Iterable[str]) -> bool:
+        """Downloads the URLs that weren't fetched yet into the submissions. Returns True if there were any."""
+        fetched = False
+        for _ in self.stream_code(urls):
+            fetched = True
+        return fetched
+
+    def _wait_for_timestamps(self) -> None:
+        """Puts the timestamps that the prefetcher parsed into the logfile, waiting for them if needed."""
+        if self._timestamps_ready:
+            return
+        timestamps = self.prefetcher.timestamps()
+        if timestamps is not None:
+            self.catalog.logfile = self.catalog.logfile.assign(date_submitted=timestamps)
+            self.logfile = self.catalog.logfile
+        self._timestamps_ready = True
+
+
+def add_student_columns(tool_result: dict, user_id: int, students: dict, columns: dict) -> None:
+    """Adds a tool's columns to a student's row in `tool_result`, creating the row if needed.
+
+    New rows start with the student's ID, name, email and role, from the `students` dimension table.
+    """
+    if user_id in tool_result:
+        tool_result[user_id].update(columns)
+    else:
+        student = students[user_id]
+        tool_result[user_id] = {
+            'User ID': user_id,
+            'Last Name': student.last_name,
+            'First Name': student.first_name,
+            'Email': student.email,
+            'Role': 'Student',
+            **columns,
+        }
+
+
+def run_quick_analysis(context: ToolContext, tool_result: dict) -> str:
+    """Quick analysis for every lab. Writes its own output file."""
+    from tools.quickanalysis import quick_analysis
+
+    quick_analysis(context.catalog, context.output_dir)  # TODO: this should return something
+    return 'quickanalysis.csv'
+
+
+def run_roster(context: ToolContext, tool_result: dict) -> str:
+    """Roster for selected labs."""
+    from tools.roster import roster
+
+    tool_result.clear()
+    tool_result.update(roster(context.catalog, context.selected_labs))
+    return 'roster.csv'
+
+
+def run_anomaly(context: ToolContext, tool_result: dict) -> str:
+    """Anomalies for selected labs."""
+    from tools.anomaly import anomaly
+
+    submissions = context.load_submissions(context.selected_labs)
+    anomaly_detection_output = context.pipelined.pop('anomaly', None)
+    if anomaly_detection_output is None:  # Not pipelined. An empty dict is a result too.
+        anomaly_detection_output = anomaly(submissions, context.selected_labs)
+    for user_id in anomaly_detection_output:
+        for lab in anomaly_detection_output[user_id]:
+            anomalies_found = anomaly_detection_output[user_id][lab][0]
+            anomaly_score = anomaly_detection_output[user_id][lab][1]
+            columns = {
+                f'Lab {lab} anomalies found': anomalies_found,
+                f'Lab {lab} anomaly score': anomaly_score,
+                f'{lab} Student code': anomaly_detection_output[user_id][lab][2],
+            }
+            add_student_columns(tool_result, user_id, context.store.students, columns)
+    return 'anomalies.csv'
+
+
+# TODO: Clean this up
+def run_auto_anomaly(context: ToolContext, tool_result: dict) -> str:
+    """Automatic anomaly detection for selected labs. Writes its own output file."""
+    from tools.auto_anomaly import auto_anomaly
+
+    submissions = context.load_submissions(context.selected_labs)
+    tool_result.clear()  # TODO: reset roster, fix later
+    # Count of anomaly instances per-user, per-lab, per-anomaly, @ index 0
+    anomaly_detection_output = context.pipelined.pop('auto_anomaly', None)
+    if anomaly_detection_output is None:
+        anomaly_detection_output = auto_anomaly(submissions, context.selected_labs)
+
+    # Populate anomaly counts for every user, for each lab
+    for user_id in anomaly_detection_output:
+        if user_id not in tool_result:
+            tool_result[user_id] = {'User ID': user_id}  # Populate column of user IDs
+        for lab in anomaly_detection_output[user_id]:
+            # Instance count of every anomaly for [user_id][lab]
+            anomalies_found = anomaly_detection_output[user_id][lab][0]
+            # Create a column for each anomaly with the anomaly's count
+            for found_anomaly in anomalies_found:
+                tool_result[user_id][f'Lab {str(lab)} {found_anomaly}'] = anomalies_found[found_anomaly]
+
+    # Count of users that use each anomaly, per-lab
+    num_users_per_anomaly = {}
+    for found_anomaly in anomalies_found:
+        num_users_per_anomaly[found_anomaly] = {}
+
+    # Count the *number of students* that used each anomaly, per-lab
+    for user_id in tool_result:
+        for lab in anomaly_detection_output[user_id]:
+            for found_anomaly in num_users_per_anomaly:
+                # Need to consider anomalies from every lab
+                if lab not in num_users_per_anomaly[found_anomaly]:
+                    num_users_per_anomaly[found_anomaly][lab] = 0
+                anomaly_count = tool_result[user_id][f'Lab {str(lab)} {found_anomaly}']
+                if anomaly_count > 0:
+                    num_users_per_anomaly[found_anomaly][lab] += 1
+
+    # Append a row at bottom for "totals"
+    tool_result['Status'] = {}
+    tool_result['Status']['User ID'] = 'Is Anomaly?'
+    for found_anomaly in num_users_per_anomaly:
+        for lab in num_users_per_anomaly[found_anomaly]:
+            anomaly_count = num_users_per_anomaly[found_anomaly][lab]
+            total_users = len(submissions)
+            # If a clear majority uses an "anomaly", it's not anomalous
+            if anomaly_count / total_users >= 0.8:
+                tool_result['Status'][f'Lab {str(lab)} {found_anomaly}'] = 'No'
+            else:
+                tool_result['Status'][f'Lab {str(lab)} {found_anomaly}'] = 'Yes'
+
+    # Outputs to its own file for now
+    util.write_output_to_csv(tool_result, 'anomaly_counts.csv', context.output_dir)
+    return 'auto_anomaly.csv'
+
+
+def run_incdev(context: ToolContext, tool_result: dict) -> str:
+    """Inc. development coding trails for all labs."""
+    from tools.incdev import run
+
+    submissions = context.load_submissions()
+    # Generate nested dict of IncDev results
+    incdev_output = context.pipelined.pop('incdev', None)
+    if incdev_output is None:
+        incdev_output = run(submissions)
+    for user_id in incdev_output:
+        for lab_id in incdev_output[user_id]:
+            lid = str(lab_id)
+            columns = {
+                lid + ' incdev_score': incdev_output[user_id][lab_id]['incdev_score'],
+                lid + ' incdev_score_trail': incdev_output[user_id][lab_id]['incdev_score_trail'],
+                lid + ' loc_trail': incdev_output[user_id][lab_id]['loc_trail'],
+                lid + ' time_trail': incdev_output[user_id][lab_id]['time_trail'],
+                lid + ' Student code': incdev_output[user_id][lab_id]['Highest_code'],
+            }
+            add_student_columns(tool_result, user_id, context.store.students, columns)
+    return 'incdev.csv'
+
+
+def run_hardcoding(context: ToolContext, tool_result: dict) -> str:
+    """Hardcode detection for selected labs."""
+    import tools.hardcoding
+
+    submissions = context.load_submissions(context.selected_labs)
+    selected_labs = context.selected_labs
+    solution_code = context.load_solution()
+
+    # Dictionary of testcases, e.g. `lab_id : [('in1', 'out1'), ('in2', 'out2')]`
+    testcases = context.load_testcases()
+
+    try:
+        if testcases and solution_code:
+            print('Case 1: testcases and solution')
+            hardcoding_results = context.pipelined.pop('hardcoding', None)
+            if hardcoding_results is None:
+                hardcoding_results = tools.hardcoding.hardcoding_analysis_1(
+                    submissions, selected_labs, testcases, solution_code
+                )
+        elif testcases and not solution_code:
+            print('Case 2: testcases, no solution')
+            hardcoding_results = tools.hardcoding.hardcoding_analysis_2(submissions, selected_labs, testcases)
+        elif not testcases and not solution_code:
+            print('Case 3: no testcases or solution')
+            hardcoding_results = tools.hardcoding.hardcoding_analysis_3(submissions, selected_labs)
+        else:
+            raise Exception('Unexpected input during hardcode analysis')
+    except Exception as e:
+        logger.error(f'Error: {e}')
+        exit(1)
+
+    for user_id in hardcoding_results:
+        for lab in hardcoding_results[user_id]:
+            columns = {
+                'Lab ' + str(lab) + ' hardcoding score': hardcoding_results[user_id][lab][0],
+                str(lab) + ' Student code': hardcoding_results[user_id][lab][1],
+            }
+            add_student_columns(tool_result, user_id, context.store.students, columns)
+    return 'hardcoding.csv'
+
+
+def run_hardcoding_test(context: ToolContext, tool_result: dict) -> str:
+    """Manually label hardcoding for selected labs. Interactive, for evaluating the hardcoding tool."""
+    import tools.devtools.eval_hardcoding
+
+    submissions = context.load_submissions(context.selected_labs)
+    test_results = tools.devtools.eval_hardcoding.manual_test(submissions, context.selected_labs)
+    for user_id in test_results:
+        for lab in test_results[user_id]:
+            columns = {
+                'Lab ' + str(lab) + ' hardcoded?': test_results[user_id][lab][0],
+                str(lab) + ' Student code': test_results[user_id][lab][1],
+            }
+            add_student_columns(tool_result, user_id, context.store.students, columns)
+    return 'hardcoding-test.csv'
+
+
+def run_stylechecker(context: ToolContext, tool_result: dict) -> str:
+    """Style anomalies for selected labs using cpplint."""
+    from tools.stylechecker import stylechecker
+
+    submissions = context.load_submissions(context.selected_labs)
+    stylechecker_output = stylechecker(submissions, context.selected_labs)
+    for user_id in stylechecker_output:
+        for lab_id in stylechecker_output[user_id]:
+            columns = {
+                f'{lab_id} Style score': stylechecker_output[user_id][lab_id][0],
+                f'{lab_id} Style output': stylechecker_output[user_id][lab_id][1],
+                f'{lab_id} Student code': stylechecker_output[user_id][lab_id][2],
+            }
+            add_student_columns(tool_result, user_id, context.store.students, columns)
+    return 'cpp_style.csv'
+
+
+# Every tool that can be run on a logfile, by name
+TOOLS = {
+    'quick_analysis': run_quick_analysis,
+    'roster': run_roster,
+    'anomaly': run_anomaly,
+    'auto_anomaly': run_auto_anomaly,
+    'incdev': run_incdev,
+    'hardcoding': run_hardcoding,
+    'hardcoding_test': run_hardcoding_test,
+    'stylechecker': run_stylechecker,
+}
+
+# Tools that prompt the user for input, so can't run in batch mode
+INTERACTIVE_TOOLS = {'hardcoding_test'}
+
+# What each tool reads. Tools that only read the logfile's metadata, like the roster, download nothing.
+TOOL_NEEDS = {
+    'quick_analysis': set(),
+    'roster': set(),
+    'anomaly': {MAX_SCORE_CODE},
+    'auto_anomaly': {MAX_SCORE_CODE},
+    'incdev': {ALL_CODE},
+    'hardcoding': {MAX_SCORE_CODE, SOLUTION, TESTCASES},
+    'hardcoding_test': {MAX_SCORE_CODE},
+    'stylechecker': {MAX_SCORE_CODE},
+}
+
+
+def run_tool(name: str, context: ToolContext, tool_result: dict) -> str:
+    """Downloads or loads what a tool needs, then runs the tool.
+
+    Args:
+        name (str): The name of a tool in `TOOLS`.
+        context (ToolContext): The logfile and data shared by every tool.
+        tool_result (dict): The output rows that the tool adds its columns to.
+
+    Returns:
+        str: The name of the tool's output file.
+    """
+    context.prepare(TOOL_NEEDS[name])
+    return TOOLS[name](context, tool_result)
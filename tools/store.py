@@ -0,0 +1,300 @@
+"""Columnar store of every run in a logfile, grouped by student and lab."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator, Sequence
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from tools.submission import Student, Submission, line_fingerprints
+
+# pandas is slow to import, so it's imported by the functions that use it
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+NO_CODE = -1  # URL handle of a run without a URL, or body ID of a URL whose code isn't downloaded
+
+
+class SubmissionStore:
+    """Every run in a logfile, one array per field instead of one `Submission` object per run.
+
+    Rows are grouped by (student, lab): students in the order they first appear in the logfile,
+    each student's labs in the order they first appear, and each group's runs oldest first
+    (in logfile order if the timestamps weren't parsed, with missing timestamps last).
+    `nested()` returns the groups as the nested dict that tools read. Fast paths can read the arrays directly.
+
+    Everything tools keep asking about a group is indexed once, when the store is built: its runs in the order
+    `util.get_code_with_max_score` prefers them (`best_order`), its first and last timestamps and its counts.
+
+    Code is interned: each distinct code body is kept once in `bodies`, however many runs, URLs or students
+    share it (students often run identical code several times in a row, and hand in identical final versions).
+    A run's URL handle (`url_handle[row]`) indexes `url_body`, which indexes `bodies`, so setting a URL's code
+    sets it for every run with that URL. Tools can key work on `body_id` to analyze each distinct body once.
+    Each body's `line_fingerprints` are computed the first time they're asked for, then kept with the body.
+    Student details are kept once per student in `students`, and lab details once per lab in the
+    `LabCatalog`, rather than on every run.
+
+    Attributes:
+        user_id (ndarray): Each run's student ID (int64).
+        lab_id (ndarray): Each run's lab ID, e.g. 3.12 (float64).
+        time (ExtensionArray | ndarray): Each run's submission time. Indexing a parsed column gives Timestamps.
+        type (ndarray): 1 for a submission, 0 for a development run (float32).
+        score (ndarray): Each run's score (float32).
+        zip_location (ndarray): Each run's code URL, or NaN (object).
+        url_handle (ndarray): Each run's index into `url_body`, or `NO_CODE` if it has no URL (int32).
+        url_body (ndarray): Each unique URL's index into `bodies`, or `NO_CODE` if its code isn't downloaded (int32).
+        urls (dict[str, int]): Each unique URL's handle.
+        bodies (list[str]): Each distinct code body, once.
+        students (dict[int, Student]): Each student's name and email, by student ID, in order of first appearance.
+        group_user (ndarray): Each (student, lab) group's student ID.
+        group_lab (ndarray): Each (student, lab) group's lab ID.
+        starts (ndarray): The first row of each group.
+        ends (ndarray): One past the last row of each group.
+        best_order (ndarray): Each group's rows in order of preference for its highest-scoring code, at the same
+            offsets as the group: scored runs from the highest score down, oldest first among equal scores,
+            then unscored runs newest first. The first of them with code is the highest-scoring code.
+        group_first_time (ExtensionArray | None): Each group's first timestamp, if the timestamps were parsed.
+        group_last_time (ExtensionArray | None): Each group's last timestamp, if the timestamps were parsed.
+        group_num_runs (ndarray): The number of runs in each group.
+        group_num_submissions (ndarray): The number of runs in each group that were submitted for points.
+    """
+
+    def __init__(self, logfile: DataFrame) -> None:
+        import pandas as pd
+
+        num_runs = len(logfile)
+        users = logfile['user_id'].to_numpy(dtype=np.int64)
+        # A (student, lab) pair's group number is the order it first appears in. Sorting by the student's first
+        # appearance, then the pair's, then time keeps each student's labs together in order. lexsort is stable.
+        pairs = logfile.groupby(['user_id', 'content_section'], sort=False, observed=True, dropna=False).ngroup()
+        times = logfile['date_submitted']
+        has_times = pd.api.types.is_datetime64_any_dtype(times)
+        if has_times:
+            time_key = np.where(times.isna(), np.iinfo(np.int64).max, times.array.asi8)
+        else:
+            time_key = np.zeros(num_runs, dtype=np.int64)
+        order = np.lexsort((time_key, pairs.to_numpy(), pd.factorize(users)[0]))
+
+        self.user_id = users[order]
+        self.lab_id = logfile['content_section'].to_numpy(dtype=np.float64)[order]
+        self.time = logfile['date_submitted'].array.take(order)
+        self.type = logfile['is_submission'].to_numpy(dtype=np.float32)[order]
+        self.score = logfile['score'].to_numpy(dtype=np.float32)[order]
+        self.zip_location = logfile['zip_location'].to_numpy(dtype=object)[order]
+
+        handles, unique_urls = pd.factorize(self.zip_location)
+        self.url_handle = handles.astype(np.int32)
+        self.url_body = np.full(len(unique_urls), NO_CODE, dtype=np.int32)
+        self.urls = {url: handle for handle, url in enumerate(unique_urls)}
+        self.bodies = []
+        self._body_ids = {}  # Code body -> its index in `bodies`. Dict lookup hashes the content.
+        self._fingerprints = []  # Each body's line fingerprints, or None until they're asked for
+        if 'student_code' in logfile:
+            for handle, code in zip(self.url_handle, logfile['student_code'].to_numpy(dtype=object)[order]):
+                if handle != NO_CODE and isinstance(code, str):
+                    self.url_body[handle] = self.intern(code)
+
+        firsts = logfile.drop_duplicates('user_id')  # Each student's first row
+        self.students = {
+            user_id: Student(user_id, first_name, last_name, email)
+            for user_id, first_name, last_name, email in zip(
+                firsts['user_id'].tolist(),
+                firsts['first_name'].tolist(),
+                firsts['last_name'].tolist(),
+                firsts['email'].tolist(),
+            )
+        }
+
+        sorted_pairs = pairs.to_numpy()[order]
+        boundaries = np.flatnonzero(sorted_pairs[1:] != sorted_pairs[:-1]) + 1
+        self.starts = np.concatenate(([0], boundaries)) if num_runs else np.array([], dtype=np.int64)
+        self.ends = np.concatenate((boundaries, [num_runs])) if num_runs else np.array([], dtype=np.int64)
+        self.group_user = self.user_id[self.starts]
+        self.group_lab = self.lab_id[self.starts]
+
+        self.group_num_runs = self.ends - self.starts
+        group_number = np.repeat(np.arange(len(self.starts)), self.group_num_runs)
+        self.group_num_submissions = np.bincount(group_number, weights=self.type == 1, minlength=len(self.starts))
+        self.group_num_submissions = self.group_num_submissions.astype(np.int64)
+        self.group_first_time = self.group_last_time = None
+        if has_times:
+            by_group = pd.Series(self.time).groupby(group_number)
+            self.group_first_time = by_group.min().array
+            self.group_last_time = by_group.max().array
+        positions = np.arange(num_runs)
+        scored = self.score > 0  # NaN scores never count
+        self.best_order = np.lexsort(
+            (
+                np.where(scored, positions, -positions),
+                np.where(scored, -self.score, 0),
+                ~scored,
+                group_number,
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.user_id)
+
+    def groups(self) -> Iterator[tuple[int, float, int, int]]:
+        """Yields each (student, lab) group's student ID, lab ID, first row and one past its last row, in order."""
+        yield from zip(self.group_user.tolist(), self.group_lab.tolist(), self.starts.tolist(), self.ends.tolist())
+
+    def nested(self) -> dict[int, dict[float, RunsView]]:
+        """Returns the runs in the nested dict that tools read: `data[user_id][lab_id]` is a student's runs for a lab.
+
+        The runs are views into the store, so the dict is cheap to build and code set on the store shows up in it.
+        """
+        data = {}
+        for user_id, lab_id, start, end in self.groups():
+            data.setdefault(user_id, {})[lab_id] = RunsView(self, start, end)
+        return data
+
+    def max_score_row(self, start: int, end: int) -> int | None:
+        """Returns the row of the first highest-scoring run with code in a group, the same run that
+        `util.get_code_with_max_score` reads, or None if no run's code was downloaded.
+
+        Args:
+            start (int): The group's first row.
+            end (int): One past the group's last row.
+        """
+        for row in self.best_order[start:end].tolist():
+            if self.code(row) is not None:
+                return row
+        return None
+
+    def body_id(self, row: int) -> int:
+        """Returns the index of a run's code in `bodies`, or `NO_CODE` if it isn't downloaded."""
+        handle = self.url_handle[row]
+        return NO_CODE if handle == NO_CODE else int(self.url_body[handle])
+
+    def code(self, row: int) -> str | None:
+        """Returns a run's code, or None if it isn't downloaded."""
+        body_id = self.body_id(row)
+        return None if body_id == NO_CODE else self.bodies[body_id]
+
+    def fingerprints(self, row: int) -> np.ndarray | None:
+        """Returns the `line_fingerprints` of a run's code, or None if it isn't downloaded."""
+        body_id = self.body_id(row)
+        if body_id == NO_CODE:
+            return None
+        if self._fingerprints[body_id] is None:
+            self._fingerprints[body_id] = line_fingerprints(self.bodies[body_id])
+        return self._fingerprints[body_id]
+
+    def set_code(self, url: str, code: str | None) -> None:
+        """Sets the code of every run with `url`. URLs that aren't in the logfile are ignored."""
+        handle = self.urls.get(url)
+        if handle is not None:
+            self.url_body[handle] = NO_CODE if code is None else self.intern(code)
+
+    def intern(self, code: str) -> int:
+        """Returns the index of `code` in `bodies`, adding it if it's the first copy of that body."""
+        body_id = self._body_ids.get(code)
+        if body_id is None:
+            body_id = self._body_ids[code] = len(self.bodies)
+            self.bodies.append(code)
+            self._fingerprints.append(None)
+        return body_id
+
+
+class SubmissionView:
+    """One run in a `SubmissionStore`, read through the same attributes as a `Submission`.
+
+    Pickled as a plain `Submission`, so sending runs to another process doesn't send the whole store.
+    """
+
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store: SubmissionStore, row: int) -> None:
+        self.store = store
+        self.row = row
+
+    def __reduce__(self) -> tuple:
+        return (Submission, self._fields())
+
+    def __repr__(self) -> str:
+        return f'SubmissionView(row={self.row}, zip_location={self.zip_location!r})'
+
+    @property
+    def student_id(self) -> int:
+        return self.store.user_id[self.row].item()
+
+    @property
+    def lab_id(self) -> float:
+        return self.store.lab_id[self.row].item()
+
+    @property
+    def submission_id(self) -> str:
+        return self.store.zip_location[self.row].split('/')[-1]
+
+    @property
+    def type(self) -> float:
+        return self.store.type[self.row].item()
+
+    @property
+    def code(self) -> str | None:
+        return self.store.code(self.row)
+
+    @code.setter
+    def code(self, code: str | None) -> None:
+        self.store.set_code(self.store.zip_location[self.row], code)
+
+    @property
+    def fingerprints(self) -> np.ndarray | None:
+        return self.store.fingerprints(self.row)
+
+    @property
+    def sub_time(self):
+        return self.store.time[self.row]
+
+    @property
+    def zip_location(self) -> str:
+        return self.store.zip_location[self.row]
+
+    @property
+    def max_score(self) -> float:
+        return self.store.score[self.row].item()
+
+    def to_submission(self) -> Submission:
+        """Returns a standalone copy of the run."""
+        return Submission(*self._fields())
+
+    def _fields(self) -> tuple:
+        """Returns the arguments to `Submission()` for this run."""
+        return (self.student_id, self.lab_id, self.type, self.code, self.sub_time, self.zip_location, self.max_score)
+
+
+class RunsView(Sequence):
+    """A student's runs for a lab: rows `start` to `end` of a `SubmissionStore`, as `SubmissionView`s.
+
+    Pickled as a list of plain `Submission`s.
+    """
+
+    __slots__ = ('store', 'start', 'end')
+
+    def __init__(self, store: SubmissionStore, start: int, end: int) -> None:
+        self.store = store
+        self.start = start
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __getitem__(self, index):
+        rows = range(self.start, self.end)[index]
+        if isinstance(index, slice):
+            return [SubmissionView(self.store, row) for row in rows]
+        return SubmissionView(self.store, rows)
+
+    def __iter__(self) -> Iterator[SubmissionView]:
+        for row in range(self.start, self.end):
+            yield SubmissionView(self.store, row)
+
+    def __reduce__(self) -> tuple:
+        return (list, ([view.to_submission() for view in self],))
+
+    def max_score_code(self) -> str | None:
+        """Returns the first highest-scoring code among the runs, from the store's index. See `max_score_row`."""
+        row = self.store.max_score_row(self.start, self.end)
+        return None if row is None else self.store.code(row)
@@ -1,6 +1,8 @@
 import os
 import subprocess
 
+from tools.utilities import get_code_with_max_score
+
 cpplint_file = 'output/code.cpp'
 
 
@@ -27,22 +29,24 @@ def stylechecker(data: dict, selected_labs: list[float]) -> dict:
         TODO: Modify it to instead directly use the student's code from the logfile.
     """
     output = {}
+    results = {}  # Code -> its style score and cpplint output, so cpplint runs once per distinct code
     for lab in selected_labs:
         for user_id in data:
             if lab in data[user_id]:
-                max_score = 0
-                for sub in data[user_id][lab]:
-                    if sub.max_score > max_score:
-                        max_score = sub.max_score
-                        code = sub.code
-                with open(cpplint_file, 'w') as file:
-                    file.write(code)
-                command = 'cpplint ' + cpplint_file
-                output1 = subprocess.getoutput(command)
-                style_score = 0
-                if output1 != 'Done processing ' + cpplint_file:
-                    lines = output1.splitlines()
-                    style_score = lines[-1].split(':')[1].strip()
-                os.remove(cpplint_file)
+                code = get_code_with_max_score(user_id, lab, data)
+                if code is None:  # Code couldn't be downloaded
+                    continue
+                if code not in results:
+                    with open(cpplint_file, 'w') as file:
+                        file.write(code)
+                    command = 'cpplint ' + cpplint_file
+                    output1 = subprocess.getoutput(command)
+                    style_score = 0
+                    if output1 != 'Done processing ' + cpplint_file:
+                        lines = output1.splitlines()
+                        style_score = lines[-1].split(':')[1].strip()
+                    os.remove(cpplint_file)
+                    results[code] = (style_score, output1)
+                style_score, output1 = results[code]
                 output[user_id] = {lab: [style_score, output1, code]}
     return output
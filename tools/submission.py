@@ -1,60 +1,91 @@
 from datetime import datetime
 
+import numpy as np
+
 
-# TODO: Remove redundant attributes and improve naming.
 class Submission:
     """
-    Represents a submission made by a student.
+    Represents one run of a student's code for a lab.
+
+    Only per-run fields are kept here. Student details are kept once per student in a `Student`
+    (see `SubmissionStore.students`), and lab details once per lab in the `LabCatalog`.
 
     Attributes:
         student_id (int): The ID of the student.
-        crid (int): The ID of the content resource on zyBooks.
-        lab_id (float): The ID of the lab.
-        submission_id (int): The ID of the file containing the submission code.
-            Example: '63880560-9d25-4ea2-8321-df9cbb0dd278.zip'
+        lab_id (float): The ID of the lab, e.g. 3.12.
         type (int): The type of the submission (1 for submission, 0 for development run).
-        code (str): The code submitted.
-        sub_time (str): The submission datetime.
-        caption (str): The caption (title) of the assignment.
-        first_name (str): The first name of the student.
-        last_name (str): The last name of the student.
-        email (int): The email of the student.
+        code (str | None): The code submitted, or None if it couldn't be downloaded.
+        sub_time (datetime): The submission datetime.
         zip_location (str): The URL of the zip file containing the student code.
-        submission (int): The type of the submission (1 for submission, 0 for development run).
-        max_score (int): The highest score achieved as of a particular submission.
-        anomaly_dict (dict, optional): A dictionary containing any anomalies in the submission.
+        max_score (float): The score of the run.
     """
 
+    __slots__ = ('student_id', 'lab_id', 'type', 'code', 'sub_time', 'zip_location', 'max_score', '_fingerprints')
+
     def __init__(
         self,
         student_id: int,
-        crid: int,
         lab_id: float,
-        submission_id: int,
         type: int,
-        code: str,
+        code: str | None,
         sub_time: datetime,
-        caption: str,
-        first_name: str,
-        last_name: str,
-        email: int,
         zip_location: str,
-        submission: int,
-        max_score: int,
-        anomaly_dict: dict = None,
-    ):
+        max_score: float,
+    ) -> None:
         self.student_id = student_id
-        self.crid = crid
         self.lab_id = lab_id
-        self.submission_id = submission_id
         self.type = type
         self.code = code
         self.sub_time = sub_time
-        self.anomaly_dict = anomaly_dict
-        self.caption = (caption,)
-        self.first_name = (first_name,)
-        self.last_name = (last_name,)
-        self.email = (email,)
-        self.zip_location = (zip_location,)
-        self.submission = (submission,)
+        self.zip_location = zip_location
         self.max_score = max_score
+        self._fingerprints = None  # (code, its fingerprints)
+
+    @property
+    def submission_id(self) -> str:
+        """The name of the file containing the submission code, e.g. '63880560-9d25-4ea2-8321-df9cbb0dd278.zip'."""
+        return self.zip_location.split('/')[-1]
+
+    @property
+    def fingerprints(self) -> np.ndarray:
+        """The `line_fingerprints` of the code, computed once per code."""
+        if self._fingerprints is None or self._fingerprints[0] is not self.code:
+            self._fingerprints = (self.code, line_fingerprints(self.code))
+        return self._fingerprints[1]
+
+
+class Student:
+    """
+    Represents a student, once for all of their runs.
+
+    Attributes:
+        student_id (int): The ID of the student.
+        first_name (str): The first name of the student.
+        last_name (str): The last name of the student.
+        email (str): The email of the student.
+    """
+
+    __slots__ = ('student_id', 'first_name', 'last_name', 'email')
+
+    def __init__(self, student_id: int, first_name: str, last_name: str, email: str) -> None:
+        self.student_id = student_id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+
+
+def line_fingerprints(code: str) -> np.ndarray:
+    """Returns a 64-bit hash of each non-blank line of code, in order.
+
+    Equal lines have equal fingerprints, so the number of lines of code is the array's length, and runs can be
+    compared and diffed line by line on integers instead of strings. Fingerprints are only comparable within
+    one process, since string hashes are salted per process.
+
+    Args:
+        code (str): A run's code.
+
+    Returns:
+        ndarray: The fingerprints (int64).
+    """
+    lines = [line for line in code.splitlines() if line.strip()]
+    return np.fromiter(map(hash, lines), dtype=np.int64, count=len(lines))
@@ -0,0 +1,201 @@
+import bisect
+import json
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from tools.codestore import format_size
+from tools.manifest import write_atomic
+
+# Upper bounds of the latency histogram's buckets, in seconds. Slower requests go in a last, unbounded bucket.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKET_LABELS = [f'<={bound:g}s' for bound in LATENCY_BUCKETS] + [f'>{LATENCY_BUCKETS[-1]:g}s']
+# Upper bounds of the finer buckets that percentiles are read from: 1 ms to 5 minutes, each 10% wider than the last
+PERCENTILE_BUCKETS = tuple(0.001 * 1.1**i for i in range(133))
+
+
+class DownloadTelemetry:
+    """Records what the downloader did in one run: request latencies, bytes, retries, errors and cache hits.
+
+    Tells whether a slow run comes from the server (latency, errors), our concurrency (throughput)
+    or cache misses. Thread-safe: every download thread records into the same instance.
+
+    Each code store key counts once per run, as a hit, a miss or a skip, however many times it's fetched:
+    code that the prefetcher downloads is a miss, not a miss and then a hit when a tool reads it.
+    Latencies are counted in fixed buckets, so memory stays flat however many requests there are,
+    and percentiles are accurate to within 10%.
+
+    Attributes:
+        requests (int): HTTP requests sent, including retries.
+        retries (int): Requests sent again because the server throttled the one before.
+        bytes (int): Bytes of response bodies received.
+        cache_hits (int): Keys whose code was in the code store when first fetched.
+        cache_misses (int): Keys whose code had to be downloaded, by this process or another.
+        skipped (int): Keys that weren't downloaded because they failed recently.
+        statuses (Counter): Responses by HTTP status code.
+        errors (Counter): Failed requests and downloads by error class, e.g. 'HTTP 429', 'empty' or 'ReadTimeout'.
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.retries = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.skipped = 0
+        self.statuses = Counter()
+        self.errors = Counter()
+        self._histogram = [0] * len(BUCKET_LABELS)
+        self._percentile_counts = [0] * (len(PERCENTILE_BUCKETS) + 1)
+        self._latency_sum = 0.0
+        self._latency_max = None
+        self._keys = set()  # Keys already counted as a hit, miss or skip
+        self._started_at = datetime.now(timezone.utc)
+        self._first_request = None  # time.monotonic() when the first request was sent
+        self._last_response = None  # time.monotonic() when the last response arrived
+        self._lock = threading.Lock()
+
+    def record_request(self, start: float, status: int | None, num_bytes: int = 0, retry: bool = False) -> None:
+        """Records a request that started at `start` (from `time.monotonic()`) and just finished.
+
+        Args:
+            start (float): When the request was sent.
+            status (int | None): The response's HTTP status code, or None if the request raised.
+            num_bytes (int): The size of the response body.
+            retry (bool): The request retried a throttled one.
+        """
+        end = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            self.retries += retry
+            self._first_request = start if self._first_request is None else min(self._first_request, start)
+            if status is None:
+                return
+            self._last_response = end if self._last_response is None else max(self._last_response, end)
+            latency = end - start
+            self._histogram[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            self._percentile_counts[bisect.bisect_left(PERCENTILE_BUCKETS, latency)] += 1
+            self._latency_sum += latency
+            self._latency_max = latency if self._latency_max is None else max(self._latency_max, latency)
+            self.statuses[status] += 1
+            self.bytes += num_bytes
+
+    def record_error(self, error_class: str) -> None:
+        """Counts a failed request or download under a short name for what went wrong."""
+        with self._lock:
+            self.errors[error_class] += 1
+
+    def record_fetch(self, key: str, hit: bool) -> None:
+        """Counts a key's fetch as a cache hit or miss, unless the key was already counted this run."""
+        with self._lock:
+            if key in self._keys:
+                return
+            self._keys.add(key)
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def record_skip(self, key: str) -> None:
+        """Counts a key that wasn't downloaded because it failed recently, unless it was already counted."""
+        with self._lock:
+            if key in self._keys:
+                return
+            self._keys.add(key)
+            self.skipped += 1
+
+    def report(self) -> dict:
+        """Returns everything recorded so far, for the JSON report."""
+        with self._lock:
+            num_latencies = sum(self._histogram)
+            elapsed = (
+                self._last_response - self._first_request
+                if self._first_request is not None and self._last_response is not None
+                else 0.0
+            )
+            fetches = self.cache_hits + self.cache_misses
+            return {
+                'started_at': self._started_at.isoformat(),
+                'finished_at': datetime.now(timezone.utc).isoformat(),
+                'requests': self.requests,
+                'retries': self.retries,
+                'bytes': self.bytes,
+                'elapsed_seconds': elapsed,
+                'throughput': {
+                    'bytes_per_second': self.bytes / elapsed if elapsed else None,
+                    'requests_per_second': num_latencies / elapsed if elapsed else None,
+                },
+                'latency_seconds': {
+                    'mean': self._latency_sum / num_latencies if num_latencies else None,
+                    'p50': self._percentile(0.5),
+                    'p90': self._percentile(0.9),
+                    'p99': self._percentile(0.99),
+                    'max': self._latency_max,
+                    'histogram': dict(zip(BUCKET_LABELS, self._histogram)),
+                },
+                'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+                'errors': dict(self.errors.most_common()),
+                'cache': {
+                    'hits': self.cache_hits,
+                    'misses': self.cache_misses,
+                    'hit_ratio': self.cache_hits / fetches if fetches else None,
+                    'skipped': self.skipped,
+                },
+            }
+
+    def summary(self) -> str:
+        """Returns a short human-readable report of the run."""
+        report = self.report()
+        latency = report['latency_seconds']
+        cache = report['cache']
+        hit_ratio = 'n/a' if cache['hit_ratio'] is None else f'{cache["hit_ratio"]:.1%}'
+        lines = [f'Cache: {hit_ratio} hit ratio ({cache["hits"]} hits, {cache["misses"]} misses)']
+        if cache['skipped']:
+            lines[0] += f', {cache["skipped"]} skipped as recently failed'
+        if report['requests']:
+            throughput = report['throughput']['bytes_per_second']
+            rate = 'n/a' if throughput is None else f'{format_size(int(throughput))}/s'
+            lines.append(
+                f'Requests: {report["requests"]} ({report["retries"]} retries), '
+                f'{format_size(report["bytes"])} received at {rate}'
+            )
+        if latency['p50'] is not None:
+            lines.append(
+                f'Latency: p50 {latency["p50"]:.3f}s, p90 {latency["p90"]:.3f}s, '
+                f'p99 {latency["p99"]:.3f}s, max {latency["max"]:.3f}s'
+            )
+        if report['errors']:
+            lines.append('Errors: ' + ', '.join(f'{count} {name}' for name, count in report['errors'].items()))
+        return '\n'.join(lines)
+
+    def write(self, path: str, **extra) -> None:
+        """Writes the JSON report to `path`, with any `extra` top-level fields (e.g. the limiter's concurrency)."""
+        write_atomic(path, json.dumps({**self.report(), **extra}, indent=2) + '\n')
+
+    def _percentile(self, fraction: float) -> float | None:
+        """Returns a latency percentile from the buckets, at most the slowest latency. Call with the lock held."""
+        value = percentile(self._percentile_counts, PERCENTILE_BUCKETS, fraction)
+        return value if value is None else min(value, self._latency_max)
+
+
+def percentile(counts: list[int], bounds: tuple[float, ...], fraction: float) -> float | None:
+    """Returns the upper bound of the bucket that the nearest-rank `fraction` percentile falls in.
+
+    Args:
+        counts (list[int]): How many values fall in each bucket, with one more bucket than `bounds` for larger values.
+        bounds (tuple[float, ...]): Each bucket's upper bound, in ascending order.
+        fraction (float): The percentile, e.g. 0.9.
+
+    Returns:
+        float | None: The bucket's upper bound (infinity for the last bucket), or None if there are no values.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = min(total, max(1, math.ceil(fraction * total)))
+    for bucket, count in enumerate(counts):
+        rank -= count
+        if rank <= 0:
+            return bounds[bucket] if bucket < len(bounds) else math.inf
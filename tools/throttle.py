@@ -0,0 +1,128 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Responses that mean the server is overloaded or rate limiting us
+THROTTLE_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Returns the number of seconds to wait from a `Retry-After` header, or None if it's missing or invalid.
+
+    Args:
+        value (str | None): The header, either a number of seconds or an HTTP date.
+
+    Returns:
+        float | None: Seconds to wait, never negative.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """Limits how many requests are in flight, adapting the limit to how the server responds.
+
+    Works like TCP congestion control (AIMD):
+    - The limit grows by one after a full round of successful requests, as long as latency stays flat.
+    - The limit halves (at most once per round) when the server throttles us with a 429 or 5xx.
+    - A `Retry-After` header pauses every new request until that time has passed.
+
+    Attributes:
+        limit (int): The number of requests currently allowed in flight.
+        min_limit (int): The limit never drops below this.
+        max_limit (int): The limit never grows above this.
+        tolerance (float): Latency may grow by this factor over the fastest seen before the limit stops growing.
+        max_pause (float): The longest `Retry-After` pause to honor, in seconds.
+        in_flight (int): The number of requests currently in flight.
+        peak (int): The highest limit reached.
+        throttled (int): The number of throttled responses seen.
+        latency (float | None): Moving average of request latency, in seconds.
+        baseline (float | None): The lowest moving average latency seen, in seconds.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        max_limit: int,
+        min_limit: int = 1,
+        tolerance: float = 1.5,
+        max_pause: float = 60.0,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = min(max(initial, min_limit), self.max_limit)
+        self.tolerance = tolerance
+        self.max_pause = max_pause
+        self.in_flight = 0
+        self.peak = self.limit
+        self.throttled = 0
+        self.latency = None
+        self.baseline = None
+        self._successes = 0  # Successful requests since the limit last changed
+        self._since_decrease = self.limit  # Requests finished since the limit last halved
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Blocks until a request may be sent, then counts it as in flight."""
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._condition.wait(pause)
+                elif self.in_flight >= self.limit:
+                    self._condition.wait()
+                else:
+                    break
+            self.in_flight += 1
+
+    def release(
+        self, latency: float | None = None, status: int | None = None, retry_after: float | None = None
+    ) -> None:
+        """Marks a request as finished and adapts the limit to how it went.
+
+        Args:
+            latency (float | None): How long the request took, in seconds. None if it failed without a response.
+            status (int | None): The HTTP status code of the response, if any.
+            retry_after (float | None): Seconds the server asked us to wait, from its `Retry-After` header.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._since_decrease += 1
+            if status in THROTTLE_STATUSES:
+                self._on_throttled(retry_after)
+            elif latency is not None:
+                self._on_success(latency)
+            self._condition.notify_all()
+
+    def _on_throttled(self, retry_after: float | None) -> None:
+        self.throttled += 1
+        if retry_after is not None:
+            self._paused_until = max(self._paused_until, time.monotonic() + min(retry_after, self.max_pause))
+        if self._since_decrease >= self.limit:  # Requests sent before the last decrease don't count again
+            self.limit = max(self.min_limit, self.limit // 2)
+            self._since_decrease = 0
+            self._successes = 0
+
+    def _on_success(self, latency: float) -> None:
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        self.baseline = self.latency if self.baseline is None else min(self.baseline, self.latency)
+        self._successes += 1
+        if self._successes < self.limit:
+            return
+        self._successes = 0
+        if self.latency <= self.baseline * self.tolerance and self.limit < self.max_limit:
+            self.limit += 1
+            self.peak = max(self.peak, self.limit)
+
+    def summary(self) -> str:
+        """Returns a one-line report of the concurrency the limiter settled on."""
+        return f'Settled on {self.limit} concurrent downloads (peak {self.peak}, {self.throttled} throttled responses)'
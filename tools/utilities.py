@@ -1,27 +1,18 @@
+from __future__ import annotations
+
 import csv
-import io
 import json
 import logging
-import os
-import zipfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
+from collections.abc import Container
 from logging import Logger
+from typing import TYPE_CHECKING
 
-import pandas as pd
-import requests
-from dateutil import parser
-from pandas import DataFrame
-from tqdm import tqdm
-from urllib3 import Retry
-
-from tools.submission import Submission
-
-
-class Not200Error(Exception):
-    """Raise this custom exception if we receive a "valid" response from the server, but no data is present"""
+# pandas is slow to import, so it's imported by the functions that use it
+if TYPE_CHECKING:
+    from pandas import DataFrame
 
-    pass
+    from tools.catalog import LabCatalog
+    from tools.downloader import Downloader
 
 
 def setup_logger(name: str, log_level=logging.DEBUG, log_format='%(name)s : %(message)s') -> Logger:
@@ -89,10 +80,11 @@ def get_list_of_int_choices(min: int, max: int) -> list[int]:
     return input_list
 
 
-def get_code_with_max_score(user_id: int, lab: float, submissions: dict) -> str:
+def get_code_with_max_score(user_id: int, lab: float, submissions: dict) -> str | None:
     """Returns the first highest-scoring code submission for a student for a lab.
 
     The "first" highest-scoring submission means the oldest submission with the highest score.
+    Submissions whose code couldn't be downloaded are ignored.
 
     Args:
         user_id (int): Find the highest-scoring submission for the student with this ID.
@@ -100,172 +92,108 @@ def get_code_with_max_score(user_id: int, lab: float, submissions: dict) -> str:
         submissions (dict): All of the student's submissions for this lab.
 
     Returns:
-        str: The code for the first highest-scoring submission.
+        str | None: The code for the first highest-scoring submission,
+            or None if no code was downloaded for any of the student's submissions.
     """
+    if hasattr(submissions[user_id][lab], 'max_score_code'):  # Runs in a SubmissionStore, which indexed this already
+        return submissions[user_id][lab].max_score_code()
+    runs = [sub for sub in submissions[user_id][lab] if sub.code is not None]
+    if not runs:
+        return None
     max_score = 0
-    code = submissions[user_id][lab][-1].code  # Choose a default submission
-    for sub in submissions[user_id][lab]:
+    code = runs[-1].code  # Choose a default submission
+    for sub in runs:
         if sub.max_score > max_score:
             max_score = sub.max_score
             code = sub.code
     return code
 
 
-def standardize_columns(logfile: DataFrame) -> DataFrame:
-    """Standardizes the column names in a zyBooks logfile (Pandas DataFrame).
+def max_score_runs(logfile: DataFrame, labs: list[float], missing: Container[str] = ()) -> DataFrame:
+    """Returns the runs whose code `get_code_with_max_score` reads, one per student for each lab.
 
-    Changes the following column names:
-    - date_submitted(UTC) etc. -> date_submitted
-    - submission -> is_submission
-    - content_resource_id -> lab_id
+    For each student and lab, that's the first run with the highest score, or the last run if no run scored.
+    Only the code of these runs needs to be downloaded for tools that read the highest-scoring code.
 
     Args:
         logfile (DataFrame): The log of all student submissions.
+        labs (list[float]): The lab IDs to find runs for.
+        missing (Container[str]): URLs whose code couldn't be downloaded. Their runs are ignored,
+            the same as `get_code_with_max_score` ignores them.
 
     Returns:
-        DataFrame: The DataFrame for the logfile, edited in-place.
+        DataFrame: The rows of `logfile` whose code is read.
     """
-    for column in logfile.columns:
-        if 'date_submitted' in column:
-            logfile.rename(columns={column: 'date_submitted'}, inplace=True)
-        elif 'submission' in column:
-            logfile.rename(columns={column: 'is_submission'}, inplace=True)
-        elif 'content_resource_id' in column:
-            logfile.rename(columns={column: 'lab_id'}, inplace=True)
-    return logfile
-
-
-def get_valid_datetime(timestamp: str) -> datetime:
-    """Returns a datetime object for a submission timestamp.
-
-    Uses the dateutil.parser module to handle many common datetime formats.
-
-    Args:
-        timestamp (str): A timestamp, e.g. 'YYYY-MM-DD HH:MM:SS'.
-
-    Returns:
-        datetime: A datetime object representing the given timestamp.
-
-    Raises:
-        ParserError: If the datetime format cannot be recognized.
-    """
-    try:
-        return parser.parse(timestamp)
-    except parser.ParserError:
-        raise parser.ParserError(f'Cannot recognize datetime format: {timestamp}')
-
-
-def download_solution(logfile: DataFrame) -> str | None:
-    """Return the solution code from a logfile, if present.
+    import pandas as pd
+
+    runs = logfile[
+        logfile['content_section'].isin(labs) & logfile['zip_location'].notna() & ~logfile['zip_location'].isin(missing)
+    ]
+    if 'date_submitted' in runs and pd.api.types.is_datetime64_any_dtype(runs['date_submitted']):
+        # Oldest first, the same order as SubmissionStore
+        runs = runs.sort_values('date_submitted', kind='stable')
+    keys = ['user_id', 'content_section']
+    max_score = runs.groupby(keys, observed=True, sort=False)['score'].transform('max')
+    is_best = runs['score'].eq(max_score) & max_score.gt(0)  # NaN scores never count, like in the loop above
+    has_best = is_best.groupby([runs[key] for key in keys], observed=True, sort=False).transform('any')
+    best = runs[is_best].groupby(keys, observed=True, sort=False).head(1)
+    fallback = runs[~has_best].groupby(keys, observed=True, sort=False).tail(1)
+    return pd.concat([best, fallback])
+
+
+def get_solution_url(logfile: DataFrame) -> str | None:
+    """Returns the URL of the solution code in a logfile, if present.
 
     Args:
         logfile (DataFrame): The logfile containing submissions.
 
     Returns:
-        str | None: The solution code, or None if not found.
+        str | None: The URL of the solution's zip file, or None if not found.
     """
-    solution = None
-    for row in logfile.itertuples():
-        if row.user_id == -1:
-            solution = row
-            break
-    if solution and not pd.isnull(solution.zip_location):
-        solution_code = download_code_helper(solution.zip_location)[1]
-        return solution_code
-    return None
-
+    import pandas as pd
 
-def download_code_helper(url: str) -> tuple[str, str]:
-    """Downloads student code from a given URL and returns the code with the URL.
+    solutions = logfile.loc[logfile['user_id'] == -1, 'zip_location']
+    if solutions.empty or pd.isnull(solutions.iloc[0]):
+        return None
+    return solutions.iloc[0]
 
-    Args:
-        url (str): The URL from which to download the code.
-
-    Returns:
-        tuple[str, str]: A tuple containing the URL and the downloaded code.
 
-    Raises:
-        Not200Error: If the response status code is not 200 (no data received).
-        ConnectionError: If the maximum number of retries is reached and the code cannot be retrieved.
-    """
-    retry_strategy = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-    adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
-    session = requests.Session()
-    session.mount('https://', adapter)
-    session.mount('http://', adapter)
-    file_name = url.split('/')[-1].strip('.zip')
-    path = 'downloads/' + file_name + '.cpp'
-    if not os.path.isfile(path):
-        try:
-            response = session.get(url)
-            if response.status_code > 200 and response.status_code < 300:
-                raise Not200Error
-            zfile = zipfile.ZipFile(io.BytesIO(response.content))
-            filenames = zfile.namelist()
-            content = zfile.open(filenames[0], 'r').read()
-            result = content.decode('utf-8')
-            with open(path, 'w', encoding='utf-8') as file:
-                file.write(result)
-            return (url, result)
-        except Not200Error:
-            return (url, 'Retrieved a response, but no data was received.')
-        except ConnectionError:
-            return (url, 'Max number of retries met while retrieving student code.')
-    else:
-        with open(path, 'r', errors='replace') as file:
-            result = file.read()
-        return (url, result)
-
-
-def download_code(logfile: DataFrame) -> DataFrame:
+def download_code(logfile: DataFrame, downloader: Downloader) -> DataFrame:
     """Downloads the code for each submission and appends a new column to a logfile for the code.
 
+    Each unique URL is fetched once, and cached code isn't downloaded again.
+
     Args:
         logfile (DataFrame): The log of all student submissions.
+        downloader (Downloader): The downloader to fetch code with, shared by every download thread.
 
     Returns:
         DataFrame: The updated logfile with a new column for the downloaded code.
-
-    Note:
-        This is the fastest way to download code submissions that we found.
-        We tried AsyncIO but it turned out to be slower than multithreading.
+            Rows and row labels are the same as `logfile`.
     """
-    urls = logfile.zip_location.to_list()
-    threads = []
-    with ThreadPoolExecutor() as executor:
-        for url in urls:
-            threads.append(executor.submit(download_code_helper, url))
-        student_code = []
-        with tqdm(total=len(threads), desc='Downloading student code') as pbar:
-            for task in as_completed(threads):
-                student_code.append(task.result())
-                pbar.update(1)
-    df = pd.DataFrame(student_code, columns=['zip_location', 'student_code'])
-    logfile = pd.merge(left=logfile, right=df, on=['zip_location'])
-    return logfile
-
-
-def get_selected_labs(logfile: DataFrame) -> list[str]:
+    student_code = downloader.fetch_all(logfile['zip_location'])
+    return logfile.assign(student_code=logfile['zip_location'].map(student_code))
+
+
+def get_selected_labs(catalog: LabCatalog) -> list[str]:
     """Gets a list of labs specified by user input.
 
     Args:
-        logfile (DataFrame): The log of all student submissions.
+        catalog (LabCatalog): The lab catalog for the log of all student submissions.
 
     Returns:
         list[str]: A list of selected lab IDs
     """
     i = 0
     labs_list = []
-    lab_ids = logfile.content_section.unique()
     welcome_msg = 'Select the labs to evaluate, separated by a space: (Ex: 1 or 1 2 3 or 2 3)'
     print()
     print(welcome_msg)
     print('-' * len(welcome_msg))
     print(f'{i}) All labs')
     i += 1
-    for lab_id in lab_ids:
-        lab_caption = logfile.query('content_section ==' + str(lab_id))['caption'].iloc[0]
-        print(f'{i}) {lab_id:.2f}: {lab_caption}')
+    for lab_id in catalog:
+        print(f'{i}) {lab_id:.2f}: {catalog[lab_id].caption}')
         labs_list.append(lab_id)
         i += 1
     selected_options = get_list_of_int_choices(min=0, max=i - 1)
@@ -279,12 +207,43 @@ def get_selected_labs(logfile: DataFrame) -> list[str]:
     return selected_labs
 
 
-def write_output_to_csv(final_roster: dict, file_name: str = 'roster.csv') -> None:
+def resolve_lab_selection(catalog: LabCatalog, selection: list[str]) -> list[float]:
+    """Gets a list of lab IDs from lab IDs or captions given on the command line.
+
+    Args:
+        catalog (LabCatalog): The lab catalog for the log of all student submissions.
+        selection (list[str]): Lab IDs (e.g. '3.12'), lab captions (e.g. 'Mad Lib'), or 'all' for every lab.
+
+    Returns:
+        list[float]: A list of selected lab IDs, in the order they were given.
+
+    Raises:
+        ValueError: If a lab ID or caption isn't in the logfile.
+    """
+    lab_ids = list(catalog)
+    if [lab.lower() for lab in selection] == ['all']:
+        return lab_ids
+    lab_id_by_caption = {str(lab.caption).lower(): lab.lab_id for lab in reversed(catalog.labs.values())}
+
+    selected_labs = []
+    for lab in selection:
+        try:
+            lab_id = float(lab)
+        except ValueError:
+            lab_id = lab_id_by_caption.get(lab.lower())
+        if lab_id not in lab_ids:
+            raise ValueError(f'No lab with ID or caption: {lab}')
+        selected_labs.append(lab_id)
+    return selected_labs
+
+
+def write_output_to_csv(final_roster: dict, file_name: str = 'roster.csv', output_dir: str = 'output') -> None:
     """Saves the final roster (result) dictionary as a CSV file.
 
     Args:
         final_roster (dict): A dictionary containing the final roster data.
         file_name (str): The name of the output CSV file. Default is 'roster.csv'.
+        output_dir (str): The folder to write the CSV file to. Default is 'output'.
 
     Returns: None
 
@@ -297,7 +256,7 @@ def write_output_to_csv(final_roster: dict, file_name: str = 'roster.csv') -> No
             if column not in csv_columns:
                 csv_columns.append(column)
     try:
-        csv_file = f'output/{file_name}'
+        csv_file = f'{output_dir}/{file_name}'
         with open(csv_file, 'w', newline='', encoding='utf-8') as f1:
             writer = csv.DictWriter(f1, fieldnames=csv_columns)
             writer.writeheader()
@@ -309,13 +268,16 @@ def write_output_to_csv(final_roster: dict, file_name: str = 'roster.csv') -> No
 
 def create_data_structure(logfile: DataFrame) -> dict:
     """
-    Returns a data structure which stores all Submission objects for each student.
+    Returns a data structure which stores all submissions for each student.
+
+    The submissions are views into a columnar `SubmissionStore`, with the same attributes as `Submission` objects.
+    Code is read from the logfile's `student_code` column, if it has one.
 
     Args:
         logfile (DataFrame): The log of all student submissions.
 
     Returns:
-        dict: A data structure that stores all Submission objects for each student.
+        dict: A data structure that stores all submissions for each student.
 
     Example:
         data = {
@@ -330,31 +292,9 @@ def create_data_structure(logfile: DataFrame) -> dict:
             ...
         }
     """
-    data = {}
-    for row in logfile.itertuples():
-        if row.user_id not in data:
-            data[int(row.user_id)] = {}
-        if row.content_section not in data[row.user_id]:
-            data[row.user_id][row.content_section] = []
-        sub = Submission(
-            student_id=row.user_id,
-            crid=row.lab_id,
-            caption=row.caption,
-            first_name=row.first_name,
-            last_name=row.last_name,
-            email=row.email,
-            zip_location=row.zip_location,
-            submission=row.is_submission,
-            max_score=row.score,
-            lab_id=row.content_section,
-            submission_id=row.zip_location.split('/')[-1],
-            type=row.is_submission,
-            code=row.student_code,
-            sub_time=get_valid_datetime(row.date_submitted),
-            anomaly_dict=None,
-        )
-        data[row.user_id][row.content_section].append(sub)
-    return data
+    from tools.store import SubmissionStore
+
+    return SubmissionStore(logfile).nested()
 
 
 def get_testcases(logfile: DataFrame, selected_labs: list[float]) -> dict[float, set[tuple]]:
@@ -380,12 +320,15 @@ def get_testcases(logfile: DataFrame, selected_labs: list[float]) -> dict[float,
             }
         }
     """
+    import pandas as pd
+
     testcases_per_lab = dict()
     submissions = logfile[logfile['is_submission'] == 1]
+    submissions_per_lab = dict(list(submissions.groupby('content_section', observed=True, sort=False)))
 
     for lab_id in selected_labs:
         testcases = set()
-        lab_submissions = submissions[submissions['content_section'] == lab_id]
+        lab_submissions = submissions_per_lab.get(lab_id, submissions.iloc[:0])
         for row in lab_submissions.itertuples():  # Pick first student submission in logfile
             if pd.isnull(row.result):  # Check that 'results' column isn't empty
                 continue
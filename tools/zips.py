@@ -0,0 +1,38 @@
+"""Read the code in a submission's zip file, whether it was downloaded or found locally."""
+
+import io
+import os
+import zipfile
+
+# Files that archivers add next to the code, e.g. macOS resource forks
+IGNORED_PREFIXES = ('__MACOSX/',)
+IGNORED_NAMES = ('.DS_Store', 'Thumbs.db')
+
+
+def extract_code(content: bytes) -> str | None:
+    """Returns the code in a submission's zip file.
+
+    Code with one file is returned as is. Code with several files (e.g. `main.cpp` and a header) is returned
+    as one string, each file in name order under a `// <name>` comment, so tools read every file.
+
+    Args:
+        content (bytes): The zip file's contents.
+
+    Returns:
+        str | None: The code, or None if the zip has no files.
+    """
+    with zipfile.ZipFile(io.BytesIO(content)) as zfile:
+        names = sorted(info.filename for info in zfile.infolist() if is_code_file(info))
+        if len(names) == 1:
+            return zfile.read(names[0]).decode('utf-8')
+        files = []
+        for name in names:
+            code = zfile.read(name).decode('utf-8')
+            files.append(f'// {name}\n{code}' if code.endswith('\n') else f'// {name}\n{code}\n')
+        return ''.join(files) if files else None
+
+
+def is_code_file(info: zipfile.ZipInfo) -> bool:
+    """Returns True if a zip entry is a file from the student, not a folder or an archiver's metadata."""
+    name = info.filename
+    return not info.is_dir() and not name.startswith(IGNORED_PREFIXES) and os.path.basename(name) not in IGNORED_NAMES